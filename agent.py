@@ -0,0 +1,196 @@
+import typing
+from uuid import UUID
+
+from langchain.agents import AgentExecutor, load_tools
+from langchain.agents.structured_chat.base import StructuredChatAgent
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.callbacks.human import HumanRejectedException
+from langchain.chat_models import ChatOpenAI
+from langchain.tools import StructuredTool
+
+from app_class import MessageProcessor
+from llm import LLM_VERBOSE, get_llm
+from streaming import STREAM_REPLIES, MessageStream, final_answer_text
+
+AGENT_PROMPT = (
+    'System: Когда ты общаешься с пользователем, представь, что ты - надежный финансовый помощник в их мире. Ты оборудован '
+    'различными тулсами (инструментами), которые помогут пользователю эффективно управлять своими финансами.'
+    'Один из твоих ключевых инструментов - это функция, которая вытаскивает из сообщений пользователя важные '
+    'сущности, такие как названия товаров, количество, цены и общие суммы. Когда пользователь делится информацией '
+    'о своих финансовых операциях, ты можешь использовать этот тулс, чтобы автоматически распознавать и '
+    'анализировать эти детали. Например, если пользователь сообщает "Купил 2 билета в кино по 300 рублей каждый", '
+    'ты можешь извлечь информацию о количестве (2 билета), цена за билет (300 рублей) и общей сумме покупки.'
+    'Ты также обладаешь знаниями о финансовых темах и можешь предоставлять пользователю советы по бюджетированию, '
+    'инвестированию, управлению долгами и многим другим аспектам финансов. Твоя цель - помогать пользователю '
+    'сделать осознанные решения, связанные с их финансами, и обеспечивать им поддержку в финансовом планировании '
+    'и учете операций.'
+    'Не забывай использовать свои инструменты максимально эффективно, чтобы сделать опыт пользователя с финансами '
+    'более простым и удобным. Чем точнее и полнее ты сможешь обрабатывать информацию, тем лучше ты сможешь помочь '
+    'пользователю в их финансовых запросах.'
+)
+
+
+class ToolSpec(typing.NamedTuple):
+    name: str
+    description: str
+    args_schema: typing.Type
+
+
+def _unbound_tool(*args, **kwargs):
+    raise RuntimeError('Tool templates are only used to render the agent prompt')
+
+
+class AgentFactory:
+    """Builds the structured chat agent once and hands out cheap per-message executors.
+
+    The agent prompt depends only on tool names, descriptions and schemas, so it is
+    rendered from ``tool_specs`` a single time. Per-message state is bound by passing
+    the processor's methods to :meth:`build`.
+    """
+
+    def __init__(self, tool_specs: typing.Sequence[ToolSpec], llm: ChatOpenAI | None = None, streaming: bool = False):
+        self.tool_specs = list(tool_specs)
+        self._llm = llm
+        self.streaming = streaming
+        self._agent = None
+        self._shared_tools = None
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        return self._llm or get_llm(verbose=LLM_VERBOSE, streaming=self.streaming)
+
+    def _build_agent(self):
+        self._shared_tools = load_tools(['llm-math'], llm=self.llm)
+        templates = [
+            StructuredTool(
+                name=spec.name,
+                description=spec.description,
+                args_schema=spec.args_schema,
+                func=_unbound_tool,
+            )
+            for spec in self.tool_specs
+        ]
+        self._agent = StructuredChatAgent.from_llm_and_tools(self.llm, self._shared_tools + templates)
+
+    def build(
+        self,
+        bindings: typing.Dict[str, typing.Callable],
+        coroutines: typing.Dict[str, typing.Callable[..., typing.Awaitable]] | None = None,
+        callbacks=None,
+    ) -> AgentExecutor:
+        if self._agent is None:
+            self._build_agent()
+
+        tools = self._shared_tools + [
+            StructuredTool(
+                name=spec.name,
+                description=spec.description,
+                args_schema=spec.args_schema,
+                func=bindings[spec.name],
+                coroutine=(coroutines or {}).get(spec.name),
+            )
+            for spec in self.tool_specs
+        ]
+        return AgentExecutor.from_agent_and_tools(
+            agent=self._agent,
+            tools=tools,
+            callbacks=callbacks,
+            verbose=LLM_VERBOSE,
+        )
+
+
+class HumanApprovalCallbackHandler(AsyncCallbackHandler):
+    """Callback for manually validating values."""
+
+    raise_error: bool = True
+
+    def __init__(
+        self,
+        approve,
+        should_check: typing.Callable[[typing.Dict[str, typing.Any]], bool],
+    ):
+        self._approve = approve
+        self._should_check = should_check
+
+    async def on_tool_start(
+        self,
+        serialized: typing.Dict[str, typing.Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: typing.Optional[UUID] = None,
+        **kwargs: typing.Any,
+    ) -> typing.Any:
+        if self._should_check(serialized) and not await self._approve(input_str):
+            raise HumanRejectedException(
+                f"Inputs {input_str} to tool {serialized} were rejected."
+            )
+
+
+class StreamingCallbackHandler(AsyncCallbackHandler):
+    """Mirrors agent progress into a ``MessageStream``: tool steps, then the final answer token by token.
+
+    ``open_stream`` returns the stream to write into; the processor opens a new one
+    after the previous stream was finished (e.g. by the approval message).
+    """
+
+    def __init__(self, open_stream: typing.Callable[[], typing.Awaitable[MessageStream]]):
+        self._open_stream = open_stream
+        self._output = ''
+        self._steps = []
+
+    async def _update(self, text: str):
+        (await self._open_stream()).update(text)
+
+    async def on_llm_new_token(self, token: str, **kwargs: typing.Any) -> None:
+        self._output += token
+        answer = final_answer_text(self._output)
+        if answer:
+            await self._update(answer)
+
+    async def on_llm_end(self, response, **kwargs: typing.Any) -> None:
+        self._output = ''
+
+    async def on_agent_action(self, action, **kwargs: typing.Any) -> None:
+        self._steps.append(f'🔧 {action.tool}…')
+        await self._update('\n'.join(self._steps))
+
+    async def on_tool_end(self, output: str, **kwargs: typing.Any) -> None:
+        if self._steps:
+            self._steps[-1] = self._steps[-1].replace('…', ' ✓')
+            await self._update('\n'.join(self._steps))
+
+
+agent_factory = AgentFactory([
+    ToolSpec(
+        name='create_record',
+        description="""Useful to transform raw string about financial operations into structured JSON""",
+        args_schema=MessageProcessor.CreateRecordSchema,
+    ),
+    ToolSpec(
+        name='save_record',
+        description="""Useful to save structured dict record into JSON file""",
+        args_schema=MessageProcessor.SaveRecordSchema,
+    ),
+], streaming=STREAM_REPLIES)
+
+
+async def run_agent(processor: MessageProcessor, streaming: bool = STREAM_REPLIES) -> str:
+    """Run the ReAct agent for a message the single request could not settle."""
+    callbacks = [HumanApprovalCallbackHandler(should_check=processor._should_check,
+                                              approve=processor._approve)]
+    if streaming:
+        await processor._stream()
+        callbacks.append(StreamingCallbackHandler(processor._stream))
+
+    agent = agent_factory.build(
+        bindings={
+            'create_record': processor.create_record,
+            'save_record': processor.save_record,
+        },
+        coroutines={
+            'create_record': processor.acreate_record,
+            'save_record': processor.asave_record,
+        },
+    )
+    return await agent.arun(f'{AGENT_PROMPT}User: {processor.text}', callbacks=callbacks)
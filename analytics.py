@@ -0,0 +1,151 @@
+import calendar
+import datetime
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import extract, func, select
+
+from models import FinancialRecord, LOCAL_TZ, MonthlySummary, month_range
+
+load_dotenv()
+
+ANALYTICS_MONTHS = int(os.getenv("ANALYTICS_MONTHS", 12))
+ANALYTICS_TOP = int(os.getenv("ANALYTICS_TOP", 10))
+ANALYTICS_ROLLING_MONTHS = int(os.getenv("ANALYTICS_ROLLING_MONTHS", 3))
+ANALYTICS_ROLLING_DAYS = int(os.getenv("ANALYTICS_ROLLING_DAYS", 7))
+
+STATUSES = ('Expenses', 'Income')
+DAY_SECONDS = 86400
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over ``window`` points; the first points average what is available."""
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def _month_number(month: datetime.date) -> int:
+    return month.year * 12 + month.month - 1
+
+
+def _month_from_number(number: int) -> datetime.date:
+    return datetime.date(number // 12, number % 12 + 1, 1)
+
+
+def _delta(current: float, previous: float) -> dict:
+    return {
+        'current': current,
+        'previous': previous,
+        'delta': current - previous,
+        'percent': round((current - previous) / previous * 100, 1) if previous else None,
+    }
+
+
+def _rounded(values: np.ndarray) -> list:
+    return np.round(values, 2).tolist()
+
+
+async def monthly_series(session, user_id, month: datetime.date, months: int = ANALYTICS_MONTHS,
+                         window: int = ANALYTICS_ROLLING_MONTHS) -> dict:
+    """Income/expenses per month up to ``month`` from ``monthly_summaries``, with rolling means."""
+    last = _month_number(month)
+    first = last - months + 1
+    rows = (await session.execute(
+        select(MonthlySummary.month, MonthlySummary.status, MonthlySummary.total)
+        .where(MonthlySummary.user_id == user_id,
+               MonthlySummary.month >= _month_from_number(first),
+               MonthlySummary.month <= month,
+               MonthlySummary.status.in_(STATUSES))
+    )).all()
+
+    totals = np.zeros((len(STATUSES), months))
+    if rows:
+        positions = np.fromiter((_month_number(row.month) - first for row in rows), dtype=np.int64, count=len(rows))
+        statuses = np.fromiter((STATUSES.index(row.status) for row in rows), dtype=np.int64, count=len(rows))
+        np.add.at(totals, (statuses, positions), np.fromiter((row.total for row in rows), dtype=np.float64))
+    expenses, income = totals
+
+    return {
+        'months': [_month_from_number(first + index).strftime('%Y-%m') for index in range(months)],
+        'expenses': _rounded(expenses),
+        'income': _rounded(income),
+        'net': _rounded(income - expenses),
+        f'expenses_avg_{window}m': _rounded(rolling_mean(expenses, window)),
+        f'income_avg_{window}m': _rounded(rolling_mean(income, window)),
+        'month_over_month': {
+            'expenses': _delta(float(expenses[-1]), float(expenses[-2]) if months > 1 else 0.0),
+            'income': _delta(float(income[-1]), float(income[-2]) if months > 1 else 0.0),
+        },
+    }
+
+
+async def daily_series(session, user_id, month: datetime.date, window: int = ANALYTICS_ROLLING_DAYS) -> dict:
+    """Per-day totals of one local month: grouped by day in SQL, laid out and smoothed with numpy."""
+    start, end = month_range(month.year, month.month)
+    days = calendar.monthrange(month.year, month.month)[1]
+    # номер дня считается в базе: наружу уходит не больше двух строк на день
+    day = func.floor((extract('epoch', FinancialRecord.ts) - start.timestamp()) / DAY_SECONDS).label('day')
+    rows = (await session.execute(
+        select(day, FinancialRecord.status, func.sum(FinancialRecord.amount))
+        .where(FinancialRecord.user_id == user_id,
+               FinancialRecord.ts >= start, FinancialRecord.ts < end,
+               FinancialRecord.status.in_(STATUSES))
+        .group_by(day, FinancialRecord.status)
+    )).all()
+
+    totals = np.zeros((len(STATUSES), days))
+    if rows:
+        columns = np.array([(row[0], STATUSES.index(row[1]), row[2] or 0) for row in rows], dtype=np.float64)
+        positions = np.clip(columns[:, 0].astype(np.int64), 0, days - 1)
+        np.add.at(totals, (columns[:, 1].astype(np.int64), positions), columns[:, 2])
+    expenses, income = totals
+
+    return {
+        'days': [datetime.date(month.year, month.month, index + 1).isoformat() for index in range(days)],
+        'expenses': _rounded(expenses),
+        'income': _rounded(income),
+        f'expenses_avg_{window}d': _rounded(rolling_mean(expenses, window)),
+    }
+
+
+async def top_products(session, user_id, month: datetime.date, limit: int = ANALYTICS_TOP) -> dict:
+    """Largest products per status in one local month; ``share`` is the part of the status total."""
+    start, end = month_range(month.year, month.month)
+    total = func.sum(FinancialRecord.amount).label('total')
+    rows = (await session.execute(
+        select(FinancialRecord.status, FinancialRecord.product, total, func.count().label('count'))
+        .where(FinancialRecord.user_id == user_id,
+               FinancialRecord.ts >= start, FinancialRecord.ts < end,
+               FinancialRecord.status.in_(STATUSES))
+        .group_by(FinancialRecord.status, FinancialRecord.product)
+        .order_by(total.desc())
+    )).all()
+
+    top = {}
+    for status in STATUSES:
+        products = [row for row in rows if row.status == status]
+        status_total = sum(row.total or 0 for row in products)
+        top[status.lower()] = [
+            {'product': row.product, 'total': row.total, 'count': row.count,
+             'share': round(row.total / status_total, 4) if status_total else None}
+            for row in products[:limit]
+        ]
+    return top
+
+
+def current_month() -> datetime.date:
+    return datetime.datetime.now(LOCAL_TZ).date().replace(day=1)
+
+
+async def user_analytics(session, user_id, month: datetime.date | None = None,
+                         months: int = ANALYTICS_MONTHS, limit: int = ANALYTICS_TOP) -> dict:
+    month = month or current_month()
+    return {
+        'month': month.strftime('%Y-%m'),
+        'monthly': await monthly_series(session, user_id, month, months),
+        'daily': await daily_series(session, user_id, month),
+        'top_products': await top_products(session, user_id, month, limit),
+    }
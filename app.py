@@ -1,10 +1,18 @@
 import asyncio
+import logging
 import os
+import signal
 import telebot.async_telebot
 from dotenv import load_dotenv
 from app_class import SendWelcome
 from routerV2 import Router
-from pdf_generator import PDFGenerator
+from importer import StatementImporter
+from report_jobs import ReportJobQueue
+from llm import configure_http_pool, open_async_http_pool, preload_langchain
+from models import init
+from sessions import callback_dispatcher
+from telemetry import configure_logging, register_stats, span, start_metrics_server
+from write_queue import record_write_queue
 
 
 load_dotenv()
@@ -12,6 +20,11 @@ load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
 bot = telebot.async_telebot.AsyncTeleBot(TELEGRAM_TOKEN)
+report_jobs = ReportJobQueue(bot)
+register_stats('report_jobs', report_jobs.metrics)
+statement_importer = StatementImporter(bot)
+
+logger = logging.getLogger(__name__)
 
 
 @bot.message_handler(commands=['start'])
@@ -29,23 +42,47 @@ async def send_record(message):
 
 @bot.message_handler(commands=['pdf'])
 async def send_report(message):
-    user_id = message.from_user.id
-    pdf_generator = PDFGenerator()
-    pdf_filename = pdf_generator.generate_pdf_report(user_id)
+    await report_jobs.submit(message)
+
+
+@bot.message_handler(commands=['import'])
+@bot.message_handler(content_types=['document'])
+async def import_statement(message):
+    await statement_importer.submit(message)
 
-    if pdf_filename:
-        with open(pdf_filename, "rb") as pdf_file:
-            await bot.send_document(message.chat.id, pdf_file, caption="Financial Report")
-        os.remove(pdf_filename)
-    else:
-        await bot.reply_to(message, "Unable to generate the report.")
+
+@bot.callback_query_handler(func=lambda call: True)
+async def handle_callback(call: telebot.types.CallbackQuery):
+    await callback_dispatcher.dispatch(call)
 
 
 @bot.message_handler(content_types=["text"])
 async def handle_text(message: telebot.types.Message):
     router = Router(bot=bot, user_message=message)
-    print(f'ETO MESSAGE V BOTE {message.text}')
-    asyncio.create_task(router.process())
+    logger.debug('Message %s from chat %s', message.message_id, message.chat.id)
+    # ждём классификацию и сохранение процессора: в режиме webhook на этом держится порядок сообщений чата
+    with span('telegram.handle_text', chat_id=message.chat.id):
+        await router.process()
+
+
+async def main():
+    configure_logging()
+    init()
+    start_metrics_server()
+    configure_http_pool()
+    http_pool = await open_async_http_pool()
+    record_write_queue.start()
+    polling = asyncio.create_task(bot.polling())
+    asyncio.get_running_loop().run_in_executor(None, preload_langchain)
+    # docker stop шлёт SIGTERM: останавливаем polling штатно, чтобы очередь записей успела сброситься
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, polling.cancel)
+    try:
+        await polling
+    finally:
+        await report_jobs.shutdown()
+        await record_write_queue.stop()
+        await http_pool.close()
 
 
-asyncio.run(bot.polling())
+if __name__ == '__main__':
+    asyncio.run(main())
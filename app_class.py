@@ -1,28 +1,28 @@
+import asyncio
 import functools
-import typing
 from asyncio import Event
-from uuid import UUID
-
-import _asyncio
-import asyncio
 
 import telebot.async_telebot
-import os
 import json
-from langchain.callbacks.base import AsyncCallbackHandler
-from langchain.callbacks.human import HumanRejectedException
-from models import Session, FinancialRecord
+from models import Session, FinancialRecord, utcnow
 from dotenv import load_dotenv
-from langchain.chat_models import ChatOpenAI
-from langchain.tools import StructuredTool
+from extractor import EXTRACTOR_MIN_CONFIDENCE, parse_transaction
+from llm import get_llm
+from llm_cache import llm_cache
+from pipeline import LLM_PIPELINE, message_analyzer
 from pydantic.v1 import BaseModel, Field
+from sessions import callback_dispatcher
+from streaming import STREAM_REPLIES, MessageStream
+from telemetry import span, traced
+from scheduler import chat_scheduler
+from summaries import upsert_summaries
+from write_queue import record_write_queue
 from telebot import types
-from langchain.prompts import PromptTemplate
-from langchain.agents import load_tools, initialize_agent, AgentType
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_background = set()
 
 
 class SendWelcome:
@@ -33,37 +33,7 @@ class SendWelcome:
         await self.bot.reply_to(message, f"Howdy, how are you doing {message.from_user.first_name}?")
 
 
-class HumanApprovalCallbackHandler(AsyncCallbackHandler):
-    """Callback for manually validating values."""
-
-    raise_error: bool = True
-
-    def __init__(
-        self,
-        approve,
-        should_check: typing.Callable[[typing.Dict[str, typing.Any]], bool],
-    ):
-        self._approve = approve
-        self._should_check = should_check
-
-    async def on_tool_start(
-        self,
-        serialized: typing.Dict[str, typing.Any],
-        input_str: str,
-        *,
-        run_id: UUID,
-        parent_run_id: typing.Optional[UUID] = None,
-        **kwargs: typing.Any,
-    ) -> typing.Any:
-        if self._should_check(serialized) and not await self._approve(input_str):
-            raise HumanRejectedException(
-                f"Inputs {input_str} to tool {serialized} were rejected."
-            )
-
-
 class MessageProcessor:
-    instances = {}
-
     class SaveRecordSchema(BaseModel):
         product: str = Field(description='entity')
         price: int = Field(description='price')
@@ -73,7 +43,6 @@ class MessageProcessor:
 
     class CreateRecordSchema(BaseModel):
         user_message_text: str = Field(description='user original message text and additional message text')
-        print(f'ETO SCHEMA {user_message_text}')
 
     def __init__(self, bot, user_message, additional_user_message: telebot.types.Message | None = None):
         self.spaced_text = '; '
@@ -82,9 +51,10 @@ class MessageProcessor:
             self.record = {}
             self.answerCall = True
             self._answer_recieved = Event()
-            self.build_answer_callback()
             self.user_message = user_message
             self.save_data_question_message = None
+            self.analyzed_record = None
+            self.stream = None
             self.additional_user_messages = []
             self.is_initialized = True
             self.text = self.user_message.text
@@ -97,78 +67,68 @@ class MessageProcessor:
             self.full_message.text += " "
             self.full_message.text += self.additional_user_message.text
 
-    def __getstate__(self):
-        state = self.__dict__.copy()
-        # Удаление объектов _asyncio.Future из состояния
-        for key, value in list(state.items()):
-            if isinstance(value, asyncio.Future):
-                del state[key]
-        for key in list(state.keys()):
-            if isinstance(state[key], _asyncio.Future):
-                del state[key]
-        if '_answer_recieved' in state:
-            del state['_answer_recieved']
-        return state
-
-    def __setstate__(self, state):
-        self.__dict__.update(state)
-        self._answer_recieved = asyncio.Event()
+    @property
+    def awaiting_approval(self) -> bool:
+        return self.save_data_question_message is not None and not self._answer_recieved.is_set()
 
     def cancel(self):
+        if self._answer_recieved.is_set():
+            # уже отвечен или отменён: повторная отмена ничего не меняет
+            return
         self.answerCall = False
         self._answer_recieved.set()
-
+        callback_dispatcher.unregister(self.save_data_question_message)
+        if self.stream is not None and not self.stream.closed:
+            task = asyncio.create_task(self.stream.finish('⏹ Обработка прервана'))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+    async def _stream(self) -> MessageStream:
+        """The progress message of this processor; a new one once the previous was finished."""
+        if self.stream is None or self.stream.closed:
+            self.stream = MessageStream(self.bot, self.user_message.chat.id, self.user_message.message_id)
+            await self.stream.start()
+        return self.stream
+
+    @traced('processor.process')
     async def process(self):
-
-        llm = ChatOpenAI(model_name="gpt-4-1106-preview", openai_api_key=OPENAI_API_KEY, temperature=0.8, verbose=True)
-
-        tools = load_tools(['llm-math'], llm=llm)
-
-        callbacks = [HumanApprovalCallbackHandler(should_check=self._should_check,
-                                                  approve=self._approve)]
-
-        agent = initialize_agent(
-            tools + [
-                StructuredTool.from_function(
-                    func=self.create_record,
-                    name='create_record',
-                    description="""Useful to transform raw string about financial operations into structured JSON""",
-                    args_schema=self.CreateRecordSchema,
-                ),
-                StructuredTool.from_function(
-                    func=self.save_record,
-                    name='save_record',
-                    description="""Useful to save structured dict record into JSON file""",
-                    args_schema=self.SaveRecordSchema,
-                ),
-        ], llm,
-            agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True
-        )
-
-        result = await agent.arun(
-            'System: Когда ты общаешься с пользователем, представь, что ты - надежный финансовый помощник в их мире. Ты оборудован '
-            'различными тулсами (инструментами), которые помогут пользователю эффективно управлять своими финансами.'
-            'Один из твоих ключевых инструментов - это функция, которая вытаскивает из сообщений пользователя важные '
-            'сущности, такие как названия товаров, количество, цены и общие суммы. Когда пользователь делится информацией '
-            'о своих финансовых операциях, ты можешь использовать этот тулс, чтобы автоматически распознавать и '
-            'анализировать эти детали. Например, если пользователь сообщает "Купил 2 билета в кино по 300 рублей каждый", '
-            'ты можешь извлечь информацию о количестве (2 билета), цена за билет (300 рублей) и общей сумме покупки.'
-            'Ты также обладаешь знаниями о финансовых темах и можешь предоставлять пользователю советы по бюджетированию, '
-            'инвестированию, управлению долгами и многим другим аспектам финансов. Твоя цель - помогать пользователю '
-            'сделать осознанные решения, связанные с их финансами, и обеспечивать им поддержку в финансовом планировании '
-            'и учете операций.'
-            'Не забывай использовать свои инструменты максимально эффективно, чтобы сделать опыт пользователя с финансами '
-            'более простым и удобным. Чем точнее и полнее ты сможешь обрабатывать информацию, тем лучше ты сможешь помочь '
-            f'пользователю в их финансовых запросах.'
-            f'User: {self.text}',
-            callbacks=callbacks
-        )
-        await self.bot.reply_to(self.user_message, result)
+        if self.additional_user_message is None:
+            record, confidence = parse_transaction(self.text)
+            if record is not None and confidence >= EXTRACTOR_MIN_CONFIDENCE:
+                await self.process_record(record)
+                return "Processed"
+
+        if LLM_PIPELINE == 'single':
+            record = self.analyzed_record
+            if record is None:
+                if STREAM_REPLIES:
+                    # дальше ждём LLM: сразу показываем, что сообщение принято
+                    await self._stream()
+                analysis = await message_analyzer.analyze(self.text)
+                record = analysis.record if analysis is not None else None
+            if record is not None:
+                await self.process_record(record)
+                return "Processed"
+
+        # langchain загружается только когда сообщение дошло до агента
+        from agent import run_agent
+
+        result = await run_agent(self, streaming=STREAM_REPLIES)
+        if self.stream is not None and not self.stream.closed:
+            await self.stream.finish(result)
+        else:
+            await self.bot.reply_to(self.user_message, result)
         return "Processed"
 
-    def create_record(self, *args, **kwargs):
-        """Useful to transform raw string about financial operations into structured JSON"""
+    async def process_record(self, record: dict):
+        """Approve and save a record extracted locally, without running the agent."""
+        self.record = json.dumps(record)
+        if await self._approve_record(record):
+            result = await self.asave_record(**record)
+            await self.bot.reply_to(self.user_message, result)
+
+    def _create_record_prompt(self):
+        from langchain.prompts import PromptTemplate
 
         prompt_template = PromptTemplate.from_template("""system" "Hello, in the end of this prompt you will get a message,
              "it's going contain text about user's budget. "
@@ -195,23 +155,26 @@ class MessageProcessor:
              values in all fields"
              'user message - {text}'""")
 
-        prompt = prompt_template.format(text=self.text)
-        llm = ChatOpenAI(model_name="gpt-4-1106-preview", openai_api_key=OPENAI_API_KEY, temperature=0.8)
-        record = llm.predict(prompt)
+        return prompt_template.format(text=self.text)
 
+    def _store_record(self, record):
         self.record = record
         record_dict = json.dumps(record)
         self.record = record_dict
         return record_dict
 
-    def save_record(self, callable_: functools.partial | None = None, **data_dict):
-
-        if callable_:
-            return callable_()
+    def create_record(self, *args, **kwargs):
+        """Useful to transform raw string about financial operations into structured JSON"""
+        return self._store_record(get_llm().predict(self._create_record_prompt()))
 
-        session = Session()
+    @traced('tool.create_record')
+    async def acreate_record(self, *args, **kwargs):
+        """Useful to transform raw string about financial operations into structured JSON"""
+        answer = await llm_cache.cached('extract', self.text, lambda: get_llm().apredict(self._create_record_prompt()))
+        return self._store_record(answer)
 
-        financial_record = FinancialRecord(
+    def _record_values(self, data_dict):
+        return dict(
                 user_id=self.full_message.from_user.id,
                 username=self.full_message.from_user.username,
                 user_message=self.full_message.text,
@@ -222,9 +185,28 @@ class MessageProcessor:
                 amount=data_dict.get("amount")
             )
 
-        session.add(financial_record)
-        session.commit()
-        session.close()
+    def save_record(self, callable_: functools.partial | None = None, **data_dict):
+
+        if callable_:
+            return callable_()
+
+        values = {**self._record_values(data_dict), 'ts': utcnow()}
+        with Session() as session:
+            session.add(FinancialRecord(**values))
+            summaries = upsert_summaries(session.bind.dialect.name, [values])
+            if summaries is not None:
+                session.execute(summaries)
+            session.commit()
+
+        return 'Structured JSON record saved successfully'
+
+    @traced('tool.save_record')
+    async def asave_record(self, callable_: functools.partial | None = None, **data_dict):
+
+        if callable_:
+            return callable_()
+
+        await record_write_queue.submit(self._record_values(data_dict))
 
         return 'Structured JSON record saved successfully'
 
@@ -238,13 +220,10 @@ class MessageProcessor:
             'If everything is correct press "yes", else tell me what i should change',
             reply_markup=markup_inline,
         )
+        callback_dispatcher.register(self.save_data_question_message, self.answer_wrapper, on_expire=self.cancel)
 
-    def filter_callbacks(self, call: telebot.types.CallbackQuery):
-        if self.save_data_question_message is None:
-            return False
-        return call.message.id == self.save_data_question_message.id
-
-    async def answer_wrapper(self, call):
+    async def answer_wrapper(self, call: telebot.types.CallbackQuery):
+        callback_dispatcher.unregister(call.message)
         if call.data == 'yes':
             await self.bot.edit_message_reply_markup(
                 chat_id=call.message.chat.id,
@@ -261,11 +240,6 @@ class MessageProcessor:
             self.answerCall = False
         self._answer_recieved.set()
 
-    def build_answer_callback(self):
-        @self.bot.callback_query_handler(func=self.filter_callbacks)
-        async def answer_wrapper(call):
-            await self.answer_wrapper(call)
-
     @staticmethod
     def _should_check(serialized_obj: dict) -> bool:
         return serialized_obj.get("name") == "save_record"
@@ -280,6 +254,9 @@ class MessageProcessor:
 
         msg += _input
 
+        return await self._approve_record(input_dict)
+
+    async def _approve_record(self, input_dict: dict) -> bool:
         formatted_message = (
             f"🛒 Product: {input_dict['product']}\n"
             f"🔢 Quantity: {input_dict['quantity']}\n"
@@ -289,7 +266,13 @@ class MessageProcessor:
         )
 
         chat_id = self.user_message.chat.id
-        await self.bot.send_message(chat_id, formatted_message)
+        if self.stream is not None and not self.stream.closed:
+            await self.stream.finish(formatted_message)
+        else:
+            await self.bot.send_message(chat_id, formatted_message)
         await self.send_save_buttons()
-        await self._answer_recieved.wait()
+        # дальше ждём только пользователя: следующее сообщение чата может обрабатываться
+        chat_scheduler.release(self.user_message.from_user.id)
+        with span('approval.wait'):
+            await self._answer_recieved.wait()
         return self.answerCall
@@ -0,0 +1,79 @@
+"""Per-message agent setup cost: rebuilding ChatOpenAI + tools + agent vs ``AgentFactory``.
+
+The LLM points at a local address that is never contacted, only construction is timed:
+
+    python -m benchmarks.bench_agent_setup --messages 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('OPENAI_API_BASE', 'http://127.0.0.1:9/v1')
+
+from langchain.agents import AgentType, initialize_agent, load_tools  # noqa: E402
+from langchain.chat_models import ChatOpenAI  # noqa: E402
+from langchain.tools import StructuredTool  # noqa: E402
+
+from agent import agent_factory  # noqa: E402
+from app_class import MessageProcessor  # noqa: E402
+
+
+def _create_record(user_message_text):
+    return '{}'
+
+
+def _save_record(**data):
+    return 'ok'
+
+
+def legacy_setup():
+    llm = ChatOpenAI(model_name='gpt-4-1106-preview', temperature=0.8, verbose=True)
+    tools = load_tools(['llm-math'], llm=llm)
+    return initialize_agent(
+        tools + [
+            StructuredTool.from_function(
+                func=_create_record,
+                name='create_record',
+                description='Useful to transform raw string about financial operations into structured JSON',
+                args_schema=MessageProcessor.CreateRecordSchema,
+            ),
+            StructuredTool.from_function(
+                func=_save_record,
+                name='save_record',
+                description='Useful to save structured dict record into JSON file',
+                args_schema=MessageProcessor.SaveRecordSchema,
+            ),
+        ], llm,
+        agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+    )
+
+
+def factory_setup():
+    return agent_factory.build({'create_record': _create_record, 'save_record': _save_record})
+
+
+def measure(setup, messages):
+    samples = []
+    for _ in range(messages):
+        started = time.perf_counter()
+        setup()
+        samples.append(time.perf_counter() - started)
+    return statistics.mean(samples) * 1000, statistics.quantiles(samples, n=100)[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+
+    factory_setup()  # первая сборка агента не входит в стоимость сообщения
+    for name, setup in (('legacy', legacy_setup), ('factory', factory_setup)):
+        mean, p99 = measure(setup, args.messages)
+        print(f'{name:>8}: mean {mean:.3f} ms, p99 {p99:.3f} ms per message')
+
+
+if __name__ == '__main__':
+    main()
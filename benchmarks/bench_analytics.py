@@ -0,0 +1,135 @@
+"""Latency of ``/api/analytics`` for a user with many records: cache miss, cache hit, and the ORM way.
+
+    python -m benchmarks.bench_analytics --records 100000 --months 24 --redis-url redis://localhost:6379/15
+
+Seeds ``--records`` records spread over ``--months`` months into ``DATABASE_URL``
+under a negative user id and rebuilds their monthly summaries. ``orm`` loads every
+record of the user as a ``FinancialRecord`` and aggregates in Python, which is
+roughly what the browser did with the full dump before. Target: miss p50 < 100 ms.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+import redis.asyncio as redis
+from sqlalchemy import delete, insert, select
+
+from cache import report_cache
+from models import FinancialRecord, LOCAL_TZ, MonthlySummary, Session, TIMESTAMP_FORMAT, engine, month_start
+from report_fastapi import app
+from summaries import rebuild
+
+BENCH_USER = -13_000_000
+PRODUCTS = ('Такси', 'Продукты', 'Кофе', 'Аптека', 'Кино', 'Связь', 'Одежда', 'Ресторан', 'Бензин', 'Подписки')
+
+
+def seed(records, months, seed_value):
+    rng = random.Random(seed_value)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    span_seconds = months * 30 * 86400
+    rows = []
+    for _ in range(records):
+        ts = now - datetime.timedelta(seconds=rng.randrange(span_seconds))
+        income = rng.random() < 0.05
+        amount = rng.randint(20, 200) * 1000 if income else rng.randint(100, 5000)
+        product = rng.choice(('Зарплата', 'Фриланс')) if income else rng.choice(PRODUCTS)
+        rows.append({
+            'message_id': uuid.uuid4(), 'user_id': BENCH_USER, 'username': 'bench',
+            'user_message': f'{product} {amount}', 'product': product, 'price': amount, 'quantity': 1,
+            'status': 'Income' if income else 'Expenses', 'amount': amount,
+            'timestamp': ts.astimezone(LOCAL_TZ).strftime(TIMESTAMP_FORMAT), 'ts': ts,
+        })
+    with engine.begin() as conn:
+        for offset in range(0, records, 10000):
+            conn.execute(insert(FinancialRecord), rows[offset:offset + 10000])
+    rebuild(BENCH_USER)
+
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(delete(FinancialRecord).where(FinancialRecord.user_id == BENCH_USER))
+        conn.execute(delete(MonthlySummary).where(MonthlySummary.user_id == BENCH_USER))
+
+
+def orm_analytics(month):
+    """Per-row ORM objects and Python loops: the approach the endpoint replaces."""
+    with Session() as session:
+        records = session.scalars(select(FinancialRecord).where(FinancialRecord.user_id == BENCH_USER)).all()
+    monthly = collections.Counter()
+    products = collections.Counter()
+    for record in records:
+        record_month = month_start(record.ts)
+        monthly[(record_month, record.status)] += record.amount or 0
+        if record_month == month:
+            products[(record.status, record.product)] += record.amount or 0
+    return monthly, products.most_common(10)
+
+
+def quantiles(samples):
+    cut = statistics.quantiles(samples, n=100, method='inclusive')
+    return cut[49] * 1000, cut[94] * 1000
+
+
+async def measure(args):
+    url = f'/api/analytics/{BENCH_USER}?months={args.months}'
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=300) as client:
+        miss, hit = [], []
+        response = None
+        for _ in range(args.repeat):
+            await report_cache.invalidate(BENCH_USER)
+            started = time.perf_counter()
+            response = await client.get(url)
+            miss.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await client.get(url)
+            hit.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+
+    body = response.json()
+    month = datetime.date.fromisoformat(body['month'] + '-01')
+    orm = []
+    for _ in range(max(1, args.repeat // 5)):
+        started = time.perf_counter()
+        orm_analytics(month)
+        orm.append(time.perf_counter() - started)
+
+    print(f"{'mode':>6} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, samples in (('miss', miss), ('hit', hit), ('orm', orm)):
+        p50, p95 = quantiles(samples) if len(samples) > 1 else (samples[0] * 1000,) * 2
+        print(f'{name:>6} {p50:>9.1f} {p95:>9.1f}')
+    print(f"{len(response.content)} bytes, month {body['month']}, "
+          f"expenses {body['monthly']['month_over_month']['expenses']}")
+    print('top expenses:', [item['product'] for item in body['top_products']['expenses'][:5]])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    if args.redis_url:
+        report_cache.client = redis.from_url(args.redis_url)
+
+    cleanup()
+    try:
+        started = time.perf_counter()
+        seed(args.records, args.months, args.seed)
+        print(f'seeded {args.records} records in {time.perf_counter() - started:.1f} s')
+        asyncio.run(measure(args))
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Rule tier of the new-vs-clarification pre-classifier on a labelled corpus.
+
+    python -m benchmarks.bench_classifier
+
+``benchmarks/data/classifier.jsonl`` has the format of ``CLASSIFIER_LOG_PATH``
+(``{"text": ..., "is_new": ...}``), so ``python classifier.py evaluate`` reads it
+too. Reports how many messages the rules settle without the LLM, how many of
+those are wrong (every wrong one is printed) and the rules' throughput.
+"""
+import argparse
+import json
+import pathlib
+import time
+
+from classifier import PreClassifier
+
+CORPUS = pathlib.Path(__file__).parent / 'data' / 'classifier.jsonl'
+
+
+def load_corpus(path=CORPUS):
+    with open(path, encoding='utf-8') as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    decided = wrong = 0
+    for row in corpus:
+        is_new = PreClassifier.classify_rules(row['text'])
+        if is_new is None:
+            continue
+        decided += 1
+        if is_new != row['is_new']:
+            wrong += 1
+            print(f"wrong: {row['text']!r} -> is_new={is_new}, expected {row['is_new']}")
+    print(f'coverage: {decided}/{len(corpus)} decided by rules, {wrong} wrong')
+
+    texts = [row['text'] for row in corpus] * args.repeat
+    started = time.perf_counter()
+    for text in texts:
+        PreClassifier.classify_rules(text)
+    print(f'rules: {len(texts) / (time.perf_counter() - started):,.0f} messages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Requests per second with blocking Session() vs the shared async engine.
+
+Start a scratch Postgres (``docker compose up -d postgres``), point ``DATABASE_URL``
+at it and run:
+
+    python -m benchmarks.bench_db_concurrency --requests 2000 --concurrency 50
+
+Both the report endpoints and the bot's ``save_record`` path are measured. Rows are
+written under negative user ids and removed afterwards.
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func
+
+from benchmarks.fakes import FakeBot, make_message
+from models import FinancialRecord, Session, engine
+from report_fastapi import app
+
+BENCH_USER = -3_000_000
+RECORD = {'product': 'Такси', 'price': 2000, 'quantity': 1, 'status': 'Expenses', 'amount': 2000}
+
+
+@app.get("/bench/legacy/sum/{user_id}")
+async def legacy_get_records_sum(user_id: int):
+    with Session() as session:
+        query = session.query(
+            func.sum(FinancialRecord.amount).label("total_amount"),
+            FinancialRecord.status
+        ).filter_by(user_id=user_id).group_by(FinancialRecord.status).all()
+    return JSONResponse(content={status: total_amount for total_amount, status in query})
+
+
+async def hammer(requests, concurrency, call):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def bench_saves(requests, concurrency):
+    from app_class import MessageProcessor
+
+    processor = MessageProcessor(FakeBot(), make_message('Такси за 2000', user_id=BENCH_USER))
+
+    async def legacy():
+        processor.save_record(**RECORD)
+
+    async def pooled():
+        await processor.asave_record(**RECORD)
+
+    print(f"save_record  blocking: {await hammer(requests, concurrency, legacy):>8.0f} rps")
+    print(f"save_record  async:    {await hammer(requests, concurrency, pooled):>8.0f} rps")
+
+
+async def bench_reports(requests, concurrency, port):
+    async with httpx.AsyncClient(
+        base_url=f'http://127.0.0.1:{port}',
+        limits=httpx.Limits(max_connections=concurrency),
+        timeout=60,
+    ) as client:
+        for name, url in (('blocking', f'/bench/legacy/sum/{BENCH_USER}'), ('async', f'/api/record/sum/{BENCH_USER}')):
+            rps = await hammer(requests, concurrency, lambda: client.get(url))
+            print(f'records/sum  {name + ":":<9} {rps:>8.0f} rps')
+
+
+async def run(args):
+    # один event loop на весь прогон: соединения asyncpg привязаны к циклу, в котором созданы
+    await bench_saves(args.requests, args.concurrency)
+    await bench_reports(args.requests, args.concurrency, args.port)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        server.should_exit = True
+        with engine.begin() as conn:
+            conn.execute(delete(FinancialRecord.__table__).where(FinancialRecord.user_id == BENCH_USER))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Local transaction parser vs the ``create_record`` LLM call.
+
+Reports parser coverage and accuracy on ``benchmarks/data/transactions.jsonl``
+(``expected: null`` means the message must be left to the LLM) and throughput of
+both paths, the LLM one against a fake OpenAI server:
+
+    python -m benchmarks.bench_extractor --latency 0.8 --concurrency 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from benchmarks.fakes import FakeBot, FakeOpenAIServer, make_message  # noqa: E402
+from extractor import EXTRACTOR_MIN_CONFIDENCE, parse_transaction  # noqa: E402
+
+CORPUS = pathlib.Path(__file__).parent / 'data' / 'transactions.jsonl'
+
+
+def load_corpus(path=CORPUS):
+    with open(path, encoding='utf-8') as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def evaluate(corpus):
+    handled = correct = deferred_ok = 0
+    for row in corpus:
+        record, confidence = parse_transaction(row['text'])
+        confident = record is not None and confidence >= EXTRACTOR_MIN_CONFIDENCE
+        if confident:
+            handled += 1
+            correct += record == row['expected']
+        else:
+            deferred_ok += row['expected'] is None
+    print(f'coverage: {handled}/{len(corpus)} handled locally')
+    print(f'accuracy: {correct}/{handled} local records match, '
+          f'{deferred_ok}/{len(corpus) - handled} deferrals expected')
+
+
+def parser_throughput(corpus, repeat):
+    texts = [row['text'] for row in corpus] * repeat
+    started = time.perf_counter()
+    for text in texts:
+        parse_transaction(text)
+    elapsed = time.perf_counter() - started
+    return len(texts) / elapsed
+
+
+async def llm_throughput(corpus, latency, concurrency):
+    from app_class import MessageProcessor
+    from llm import open_async_http_pool
+
+    server = await FakeOpenAIServer(
+        responder=lambda body: 'Product: Такси Quantity: 1 Price: 2000 Status: Expenses Amount: 2000',
+        latency=latency,
+    ).start()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+    http_pool = await open_async_http_pool(pool_size=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    bot = FakeBot()
+
+    async def extract(text):
+        async with semaphore:
+            await MessageProcessor(bot, make_message(text)).acreate_record(user_message_text=text)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(extract(row['text']) for row in corpus))
+        return len(corpus) / (time.perf_counter() - started)
+    finally:
+        await http_pool.close()
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.8, help='fake LLM round trip, seconds')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    evaluate(corpus)
+    print(f'parser: {parser_throughput(corpus, args.repeat):,.0f} messages/s')
+    llm = asyncio.run(llm_throughput(corpus, args.latency, args.concurrency))
+    print(f'llm:    {llm:,.1f} messages/s (latency {args.latency}s, concurrency {args.concurrency})')
+
+
+if __name__ == '__main__':
+    main()
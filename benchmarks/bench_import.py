@@ -0,0 +1,127 @@
+"""Throughput of ``/import`` for a large bank export against a stub LLM.
+
+    python -m benchmarks.bench_import --rows 50000 --llm-share 0.02 --latency 0.2 --concurrency 1 16
+
+Generates a CSV export (date;description;amount) where ``--llm-share`` of the
+rows have no amount and only a free-text description, so they go to
+``message_analyzer`` on a fake OpenAI server. Extraction is timed for every
+``--concurrency``. Then the records are written twice: in one bulk transaction
+(``COPY`` on PostgreSQL) and through ``record_write_queue``, as if every row had
+been confirmed as a separate message. Rows go to ``DATABASE_URL`` under a
+negative user id and are removed afterwards. On SQLite the bulk write is the
+chunked ``INSERT`` path; ``COPY`` is only exercised against PostgreSQL.
+"""
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import random
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from sqlalchemy import delete  # noqa: E402
+
+from benchmarks.bench_pipeline import responder  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer, PassthroughCache, use_sqlite_uuid  # noqa: E402
+
+BENCH_USER = -12_000_000
+MERCHANTS = ('Пятёрочка', 'Магнит', 'Яндекс Такси', 'Кофейня', 'Аптека', 'OZON', 'Wildberries', 'МТС')
+CORPUS = os.path.join(os.path.dirname(__file__), 'data', 'transactions.jsonl')
+
+
+def generate_csv(rows, llm_share, seed):
+    from extractor import EXTRACTOR_MIN_CONFIDENCE, parse_transaction
+
+    rng = random.Random(seed)
+    # описания, которые локальный разбор отдаёт LLM
+    with open(CORPUS, encoding='utf-8') as corpus:
+        texts = [json.loads(line)['text'] for line in corpus if line.strip()]
+    texts = [text for text in texts if parse_transaction(text).confidence < EXTRACTOR_MIN_CONFIDENCE]
+    start = datetime.date(2024, 1, 1)
+    lines = ['Дата операции;Описание;Сумма']
+    for i in range(rows):
+        day = (start + datetime.timedelta(days=i % 365)).strftime('%d.%m.%Y')
+        if rng.random() < llm_share:
+            lines.append(f'{day};{rng.choice(texts)};')
+        elif rng.random() < 0.05:
+            lines.append(f'{day};Зарплата;{rng.randint(50, 200) * 1000}')
+        else:
+            lines.append(f'{day};{rng.choice(MERCHANTS)};-{rng.randint(100, 5000)},{rng.randint(0, 99):02d}')
+    return '\n'.join(lines).encode('utf-8')
+
+
+async def run(args):
+    import pipeline
+    from importer import extract_statement, write_records
+    from llm import open_async_http_pool
+    from models import AsyncSession, FinancialRecord, MonthlySummary, init
+    from write_queue import record_write_queue
+
+    server = FakeOpenAIServer(responder, latency=args.latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+    init()
+    # каждая неразобранная строка идёт в LLM, кэш не подмешивается
+    pipeline.llm_cache = PassthroughCache()
+    data = generate_csv(args.rows, args.llm_share, args.seed)
+    http_pool = await open_async_http_pool(pool_size=max(args.concurrency) * 2)
+
+    async def cleanup():
+        async with AsyncSession() as session:
+            for table in (FinancialRecord, MonthlySummary):
+                await session.execute(delete(table).where(table.user_id == BENCH_USER))
+            await session.commit()
+
+    print(f'{args.rows} rows, {len(data) / 1e6:.1f} MB')
+    print(f"{'concurrency':>11} {'rows/s':>9} {'seconds':>8} {'local':>7} {'LLM':>6} {'unrecognized':>12}")
+    statement = None
+    try:
+        for concurrency in args.concurrency:
+            calls_before = server.calls
+            started = time.perf_counter()
+            statement = await extract_statement(io.BytesIO(data), 'export.csv', BENCH_USER, 'bench',
+                                                 concurrency=concurrency, max_rows=args.rows)
+            elapsed = time.perf_counter() - started
+            assert server.calls - calls_before == statement.llm
+            print(f'{concurrency:>11} {args.rows / elapsed:>9.0f} {elapsed:>8.2f} {statement.local:>7} '
+                  f'{statement.llm:>6} {len(statement.unrecognized):>12}')
+
+        print(f"\n{'write':>11} {'records/s':>9} {'seconds':>8}")
+        records = statement.records
+        started = time.perf_counter()
+        await write_records(records)
+        elapsed = time.perf_counter() - started
+        print(f'{"bulk":>11} {len(records) / elapsed:>9.0f} {elapsed:>8.2f}')
+        await cleanup()
+
+        queued = [{key: value for key, value in record.items() if key not in ('message_id', 'timestamp')}
+                  for record in records[:args.queue_rows]]
+        record_write_queue.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(record_write_queue.submit(values) for values in queued))
+        elapsed = time.perf_counter() - started
+        await record_write_queue.stop()
+        print(f'{"queue":>11} {len(queued) / elapsed:>9.0f} {elapsed:>8.2f}  ({len(queued)} records)')
+    finally:
+        await cleanup()
+        await http_pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--llm-share', type=float, default=0.02)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--queue-rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if os.getenv('DATABASE_URL', '').startswith('sqlite'):
+        use_sqlite_uuid()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Offline replay of logged messages through the LLM classification and extraction calls, with and without ``LLMCache``.
+
+    python -m benchmarks.bench_llm_cache --messages 500 --latency 0.3 --redis-url redis://localhost:6379/15
+
+Texts come from ``--log`` (any jsonl with a ``text`` field: the classifier log
+``CLASSIFIER_LOG_PATH`` or ``benchmarks/data/transactions.jsonl``). Popular texts
+repeat, as in real chats, with small surface changes (case, punctuation, a
+trailing "руб"). Every message goes through ``Router.classify_llm`` and
+``MessageProcessor.acreate_record`` against a fake OpenAI server. ``off`` calls
+the LLM every time, ``exact`` uses the Redis tier, ``semantic`` adds the
+embedding tier. Keys are written under a separate prefix and removed afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+import redis.asyncio as redis  # noqa: E402
+
+from benchmarks.fakes import FakeOpenAIServer, PassthroughCache, make_message  # noqa: E402
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), 'data', 'transactions.jsonl')
+VARIANTS = (
+    lambda text: text,
+    lambda text: text.lower(),
+    lambda text: text + '!',
+    lambda text: text + '.',
+    lambda text: text + ' руб',
+)
+
+
+def load_texts(path):
+    with open(path, encoding='utf-8') as log:
+        return list(dict.fromkeys(json.loads(line)['text'] for line in log if line.strip()))
+
+
+def replay_stream(texts, messages, skew, seed):
+    rng = random.Random(seed)
+    texts = texts[:]
+    rng.shuffle(texts)
+    weights = [1 / (rank + 1) ** skew for rank in range(len(texts))]
+    return [rng.choice(VARIANTS)(text) for text in rng.choices(texts, weights, k=messages)]
+
+
+async def replay(stream, concurrency):
+    from app_class import MessageProcessor
+    from routerV2 import Router
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(text):
+        async with semaphore:
+            started = time.perf_counter()
+            await Router.classify_llm(text)
+            await MessageProcessor(None, make_message(text)).acreate_record()
+            latencies.append(time.perf_counter() - started)
+
+    # по порядку пачками: повтор может попасть в кэш только после первого ответа
+    for offset in range(0, len(stream), concurrency):
+        await asyncio.gather(*(one(text) for text in stream[offset:offset + concurrency]))
+    return latencies
+
+
+async def run(args):
+    import app_class
+    import routerV2
+    from llm import open_async_http_pool
+    from llm_cache import LLMCache
+
+    server = FakeOpenAIServer(latency=args.latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+    client = redis.from_url(args.redis_url) if args.redis_url else app_class.llm_cache.client
+    stream = replay_stream(load_texts(args.log), args.messages, args.skew, args.seed)
+    prefix = f'llm-bench-{uuid.uuid4().hex}:'
+    http_pool = await open_async_http_pool(pool_size=args.concurrency)
+
+    print(f'{len(stream)} messages, {len(set(stream))} distinct')
+    print(f"{'mode':>9} {'LLM calls':>10} {'saved':>7} {'seconds':>8} {'p50 ms':>8} {'p95 ms':>8} {'hit ratio':>10}")
+    baseline = None
+    try:
+        for mode in ('off', 'exact', 'semantic'):
+            if mode == 'off':
+                cache = PassthroughCache()
+            else:
+                cache = LLMCache(client, semantic=mode == 'semantic', threshold=args.threshold,
+                                 prefix=f'{prefix}{mode}:')
+            routerV2.llm_cache = app_class.llm_cache = cache
+            calls_before = server.calls
+            started = time.perf_counter()
+            latencies = await replay(stream, args.concurrency)
+            elapsed = time.perf_counter() - started
+            calls = server.calls - calls_before
+            baseline = calls if baseline is None else baseline
+            quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+            metrics = cache.metrics()
+            print(f'{mode:>9} {calls:>10} {baseline - calls:>7} {elapsed:>8.2f} {quantiles[49] * 1000:>8.1f} '
+                  f'{quantiles[94] * 1000:>8.1f} {metrics.get("hit_ratio", 0.0):>10.2f}')
+            if metrics:
+                print(f'{"":>9} {metrics}')
+    finally:
+        await http_pool.close()
+        keys = [key async for key in client.scan_iter(f'{prefix}*')]
+        if keys:
+            await client.delete(*keys)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', default=os.getenv('CLASSIFIER_LOG_PATH') or DEFAULT_LOG)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--threshold', type=float, default=0.85)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
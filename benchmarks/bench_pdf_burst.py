@@ -0,0 +1,122 @@
+"""Does the bot keep answering while a burst of /pdf requests is rendered?
+
+    python -m benchmarks.bench_pdf_burst --users 10 --requests 40 --records 5000
+
+Sends ``--requests`` /pdf commands from ``--users`` users at once while a text
+message arrives every ``--ping-interval`` seconds, and reports how long the
+text replies took. ``inline`` renders inside the handler as before, ``pool``
+goes through ``ReportJobQueue``. Seeds rows into ``DATABASE_URL`` under negative
+user ids and removes them afterwards.
+"""
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, insert
+
+from benchmarks.fakes import FakeBot, make_message
+from models import FinancialRecord, LOCAL_TZ, TIMESTAMP_FORMAT, engine
+from report_jobs import ReportJobQueue, render_report
+
+BENCH_USER_BASE = -8_000_000
+table = FinancialRecord.__table__
+
+
+def seed(users, records):
+    start = datetime.datetime(2022, 1, 1, tzinfo=LOCAL_TZ)
+    with engine.begin() as conn:
+        for user in range(users):
+            rows = []
+            for i in range(records):
+                ts = start + datetime.timedelta(minutes=i)
+                rows.append({
+                    'message_id': uuid.uuid4(), 'user_id': BENCH_USER_BASE - user, 'username': 'bench',
+                    'user_message': 'Такси за 2000', 'product': 'Такси', 'price': 2000, 'quantity': 1,
+                    'status': 'Expenses', 'amount': 2000, 'timestamp': ts.strftime(TIMESTAMP_FORMAT), 'ts': ts,
+                })
+            conn.execute(insert(table), rows)
+
+
+def cleanup(users):
+    with engine.begin() as conn:
+        conn.execute(delete(table).where(table.c.user_id <= BENCH_USER_BASE, table.c.user_id > BENCH_USER_BASE - users))
+
+
+async def inline_report(bot, message):
+    # прежний обработчик: рендер прямо в event loop
+    pdf = render_report(message.from_user.id)
+    await bot.send_document(message.chat.id, pdf)
+
+
+async def burst(mode, args):
+    bot = FakeBot()
+    jobs = ReportJobQueue(bot, workers=args.workers)
+    latencies = []
+    stop = asyncio.Event()
+
+    async def pings():
+        while not stop.is_set():
+            sent = time.perf_counter()
+            # ответ на текстовое сообщение: задержка = сколько обработчик ждал event loop
+            await asyncio.sleep(0)
+            await bot.reply_to(make_message('ping'), 'pong')
+            latencies.append(time.perf_counter() - sent)
+            await asyncio.sleep(args.ping_interval)
+
+    async def pdf_requests():
+        messages = [
+            make_message('/pdf', user_id=BENCH_USER_BASE - i % args.users, chat_id=i % args.users)
+            for i in range(args.requests)
+        ]
+        if mode == 'inline':
+            for message in messages:
+                asyncio.create_task(inline_report(bot, message))
+                await asyncio.sleep(0)
+            while sum(1 for _, method, _, _ in bot.sent if method == 'send_document') < len(messages):
+                await asyncio.sleep(0.05)
+        else:
+            for message in messages:
+                await jobs.submit(message)
+            await jobs.shutdown()
+
+    ping_task = asyncio.create_task(pings())
+    started = time.perf_counter()
+    await asyncio.sleep(args.ping_interval * 3)
+    await pdf_requests()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ping_task
+
+    documents = sum(1 for _, method, _, _ in bot.sent if method == 'send_document')
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    print(f'{mode:>7} {documents:>5} {elapsed:>9.2f} {len(latencies):>6} '
+          f'{quantiles[49] * 1000:>9.1f} {quantiles[98] * 1000:>9.1f} {max(latencies) * 1000:>9.1f}')
+    if mode == 'pool':
+        print('job stats:', dict(jobs.stats))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--ping-interval', type=float, default=0.02)
+    parser.add_argument('--modes', nargs='+', default=['inline', 'pool'])
+    args = parser.parse_args()
+
+    cleanup(args.users)
+    seed(args.users, args.records)
+    try:
+        print(f"{'mode':>7} {'pdfs':>5} {'seconds':>9} {'pings':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for mode in args.modes:
+            asyncio.run(burst(mode, args))
+    finally:
+        cleanup(args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Render time, peak Python heap (tracemalloc) and file size of the /pdf report against record count.
+
+    python -m benchmarks.bench_pdf_report --sizes 100 10000 100000 --legacy-max 10000
+
+Compares the previous matplotlib ``ax.table`` renderer with the streaming reportlab
+engine. Seeds rows into ``DATABASE_URL`` under negative user ids and removes them afterwards.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from sqlalchemy import delete, insert
+
+from models import FinancialRecord, LOCAL_TZ, Session, TIMESTAMP_FORMAT, engine
+from pdf_generator import PDFGenerator, register_fonts
+
+BENCH_USER_BASE = -7_000_000
+table = FinancialRecord.__table__
+
+
+def legacy_generate_pdf_report(user_id, directory):
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    with Session() as session:
+        financial_records = session.query(FinancialRecord).filter_by(user_id=user_id).all()
+    data = [[record.username, record.user_message, record.product, record.price,
+             record.quantity, record.status, record.amount, record.timestamp] for record in financial_records]
+    header = ["Username", "User Message", "Product", "Price", "Quantity", "Status", "Amount", "Timestamp"]
+    df = pd.DataFrame(data, columns=header)
+
+    pdf_filename = os.path.join(directory, f"financial_report_user_{user_id}.pdf")
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.axis('off')
+    table_ = ax.table(cellText=[header] + df.values.tolist(), colLabels=None, cellLoc='center', loc='top',
+                      colColours=['#f2f2f2'] * len(header),
+                      cellColours=[['#f2f2f2'] * len(header)] + [['#ffffff'] * len(header) for _ in range(len(df))])
+    table_.auto_set_font_size(False)
+    table_.set_fontsize(5)
+    table_.scale(1, 1.5)
+    plt.savefig(pdf_filename, format='pdf', bbox_inches='tight')
+    plt.close()
+    return os.path.getsize(pdf_filename)
+
+
+def seed(user_id, size):
+    start = datetime.datetime(2022, 1, 1, tzinfo=LOCAL_TZ)
+    with engine.begin() as conn:
+        for offset in range(0, size, 10000):
+            rows = []
+            for i in range(offset, min(offset + 10000, size)):
+                ts = start + datetime.timedelta(minutes=i)
+                rows.append({
+                    'message_id': uuid.uuid4(), 'user_id': user_id, 'username': 'bench',
+                    'user_message': 'Купил 2 билета в кино по 300 рублей каждый', 'product': 'Билет в кино',
+                    'price': 300, 'quantity': 2, 'status': 'Expenses', 'amount': 600,
+                    'timestamp': ts.strftime(TIMESTAMP_FORMAT), 'ts': ts,
+                })
+            conn.execute(insert(table), rows)
+
+
+def measure(func, *args):
+    # время без tracemalloc (он замедляет рендер в разы), пик памяти отдельным прогоном
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10_000, 100_000])
+    parser.add_argument('--legacy-max', type=int, default=10_000,
+                        help='skip the matplotlib renderer above this many records')
+    args = parser.parse_args()
+
+    register_fonts()
+    try:
+        print(f"{'records':>8} {'engine':>8} {'seconds':>9} {'heap MiB':>9} {'pdf KiB':>9}")
+        with tempfile.TemporaryDirectory() as directory:
+            for index, size in enumerate(args.sizes):
+                user_id = BENCH_USER_BASE - index
+                seed(user_id, size)
+                if size <= args.legacy_max:
+                    elapsed, peak, pdf_size = measure(legacy_generate_pdf_report, user_id, directory)
+                    print(f'{size:>8} {"legacy":>8} {elapsed:>9.2f} {peak:>9.1f} {pdf_size / 1024:>9.0f}')
+                elapsed, peak, buffer = measure(PDFGenerator.generate_pdf_report, user_id)
+                pdf_size = len(buffer.getbuffer())
+                print(f'{size:>8} {"stream":>8} {elapsed:>9.2f} {peak:>9.1f} {pdf_size / 1024:>9.0f}')
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id <= BENCH_USER_BASE, table.c.user_id > BENCH_USER_BASE - 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""LLM round trips and latency per new message: ReAct agent vs the single function-calling request.
+
+    python -m benchmarks.bench_pipeline --users 20 --latency 0.8
+
+Every user sends one message that the local tiers (pre-classifier and
+extractor) can't settle and presses "Yes" as soon as the confirmation appears.
+A fake OpenAI server plays the classification prompt, the structured chat agent,
+the nested ``create_record`` prompt and the ``record_transaction`` function call,
+and counts requests. Records are saved into ``DATABASE_URL`` under negative
+user ids and removed afterwards.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import re
+import statistics
+import time
+import types
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from sqlalchemy import delete  # noqa: E402
+
+from benchmarks.fakes import FakeBot, FakeOpenAIServer, PassthroughCache, make_message  # noqa: E402
+
+BENCH_USER_BASE = -10_000_000
+NUMBER = re.compile(r'\d+')
+FINAL_ANSWER = 'Готово: запись о покупке сохранена, посмотреть все операции за месяц можно в отчёте /report.'
+
+
+def _action(name, action_input):
+    return 'Action:\n```\n' + json.dumps({'action': name, 'action_input': action_input}, ensure_ascii=False) + '\n```'
+
+
+def responder(body):
+    prompt = '\n'.join(message.get('content') or '' for message in body['messages'])
+    price = int(NUMBER.findall(prompt)[-1]) if NUMBER.search(prompt) else 0
+    record = {'product': 'Хлеб', 'quantity': 1, 'price': price, 'status': 'Expenses', 'amount': price}
+    if body.get('functions'):
+        return {'content': None, 'function_call': {
+            'name': body['functions'][0]['name'], 'arguments': json.dumps({'is_new': True, **record}),
+        }}
+    if 'Проанализируй сообщение' in prompt:
+        return 'true'
+    if 'Hello, in the end of this prompt' in prompt:
+        return f'Product: Хлеб\nQuantity: 1\nPrice: {price}\nStatus: Expenses\nAmount: {price}'
+    # шаги агента: create_record, save_record, итоговый ответ
+    steps = prompt.count('Observation: ') - prompt.count('Observation: action result')
+    if steps == 0:
+        return _action('create_record', {'user_message_text': body['messages'][-1]['content'][-40:]})
+    if steps == 1:
+        return _action('save_record', record)
+    return _action('Final Answer', FINAL_ANSWER)
+
+
+class AutoApproveBot(FakeBot):
+    """Presses "Yes" under every confirmation and notes when it was shown and when the final answer came."""
+
+    def __init__(self):
+        super().__init__()
+        self.questions = {}
+        self.done = collections.defaultdict(asyncio.Event)
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        message = await super().send_message(chat_id, text)
+        if reply_markup is not None:
+            self.questions[chat_id] = time.perf_counter()
+            asyncio.create_task(self._press_yes(message))
+        return message
+
+    async def _press_yes(self, message):
+        from sessions import callback_dispatcher
+
+        await callback_dispatcher.dispatch(types.SimpleNamespace(data='yes', message=message))
+
+    async def reply_to(self, message, text, **kwargs):
+        result = await super().reply_to(message, text)
+        self.done[message.chat.id].set()
+        return result
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        # со стримингом итоговый ответ агента приходит правкой сообщения-заглушки
+        result = await super().edit_message_text(text, chat_id=chat_id, message_id=message_id)
+        if text == FINAL_ANSWER:
+            self.done[chat_id].set()
+        return result
+
+
+async def run(mode, args, server):
+    import app_class
+    import routerV2
+
+    routerV2.LLM_PIPELINE = app_class.LLM_PIPELINE = mode
+    bot = AutoApproveBot()
+    question_latency = []
+    total_latency = []
+
+    async def user(i):
+        user_id = BENCH_USER_BASE - i
+        started = time.perf_counter()
+        await routerV2.Router(bot, make_message(f'Хлебушек взял {100 + i}', user_id=user_id)).process()
+        await asyncio.wait_for(bot.done[user_id].wait(), args.timeout)
+        total_latency.append(time.perf_counter() - started)
+        question_latency.append(bot.questions[user_id] - started)
+
+    calls_before = server.calls
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    calls = server.calls - calls_before
+    print(f'{mode:>7} {calls / args.users:>10.1f} {statistics.median(question_latency) * 1000:>15.0f} '
+          f'{statistics.median(total_latency) * 1000:>13.0f}')
+
+
+async def main(args):
+    import agent  # noqa: F401  импорт langchain не входит в замер
+    import app_class
+    import pipeline
+    import routerV2
+    from classifier import Decision
+    from llm import open_async_http_pool
+    from models import init
+    from scheduler import chat_scheduler
+    from write_queue import record_write_queue
+
+    server = FakeOpenAIServer(responder, latency=args.latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+    init()
+    # меряем только путь через LLM: локальные уровни и кэш выключены, задержки планировщика нет
+    routerV2.pre_classifier.classify = lambda text: Decision(None, None)
+    app_class.parse_transaction = lambda text: (None, 0.0)
+    pipeline.llm_cache = routerV2.llm_cache = app_class.llm_cache = PassthroughCache()
+    chat_scheduler.debounce = 0
+
+    http_pool = await open_async_http_pool(pool_size=args.users * 2)
+    record_write_queue.start()
+    try:
+        print(f"{'mode':>7} {'LLM calls':>10} {'question p50 ms':>15} {'saved p50 ms':>13}")
+        for mode in ('agent', 'single'):
+            await run(mode, args, server)
+        print('analyzer:', pipeline.message_analyzer.metrics())
+    finally:
+        await record_write_queue.stop()
+        await http_pool.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.8)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    finally:
+        from models import FinancialRecord, MonthlySummary, engine
+
+        with engine.begin() as conn:
+            for table in (FinancialRecord, MonthlySummary):
+                conn.execute(delete(table).where(
+                    table.user_id <= BENCH_USER_BASE, table.user_id > BENCH_USER_BASE - args.users
+                ))
+
+
+if __name__ == '__main__':
+    cli()
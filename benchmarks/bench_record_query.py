@@ -0,0 +1,97 @@
+"""Monthly report query time against table size, legacy string filter vs ``ts`` range.
+
+Runs against ``DATABASE_URL`` (use a scratch Postgres, e.g. ``docker compose up -d postgres``):
+
+    python -m benchmarks.bench_record_query --sizes 10000 100000 1000000
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, extract, func, insert, select
+
+from models import FinancialRecord, LOCAL_TZ, TIMESTAMP_FORMAT, engine, month_range
+
+BENCH_USER_BASE = -1_000_000
+table = FinancialRecord.__table__
+
+
+def seed(conn, total, users=50, batch=10000):
+    conn.execute(delete(table).where(table.c.user_id <= BENCH_USER_BASE))
+    start = datetime.datetime(2022, 1, 1, tzinfo=LOCAL_TZ)
+    rows = []
+    for i in range(total):
+        ts = start + datetime.timedelta(minutes=random.randrange(0, 3 * 365 * 24 * 60))
+        rows.append({
+            'message_id': uuid.uuid4(),
+            'user_id': BENCH_USER_BASE - (i % users),
+            'username': 'bench',
+            'user_message': 'Такси за 2000',
+            'product': 'Такси',
+            'price': 2000,
+            'quantity': 1,
+            'status': random.choice(('Expenses', 'Income')),
+            'amount': 2000,
+            'timestamp': ts.strftime(TIMESTAMP_FORMAT),
+            'ts': ts,
+        })
+        if len(rows) == batch:
+            conn.execute(insert(table), rows)
+            rows = []
+    if rows:
+        conn.execute(insert(table), rows)
+    conn.exec_driver_sql('ANALYZE financial_records')
+
+
+def legacy_query(year, month):
+    return select(table).where(
+        table.c.user_id == BENCH_USER_BASE,
+        extract('year', func.to_date(table.c.timestamp, 'DD-MM-YY HH24:MI')) == year,
+        extract('month', func.to_date(table.c.timestamp, 'DD-MM-YY HH24:MI')) == month,
+        table.c.status.in_(['Expenses']),
+    )
+
+
+def range_query(year, month):
+    start, end = month_range(year, month)
+    return select(table).where(
+        table.c.user_id == BENCH_USER_BASE,
+        table.c.ts >= start,
+        table.c.ts < end,
+        table.c.status == 'Expenses',
+    ).order_by(table.c.ts)
+
+
+def timed(conn, stmt, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(stmt).all()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy ms':>12} {'range ms':>12}")
+    for size in args.sizes:
+        with engine.begin() as conn:
+            seed(conn, size)
+        with engine.connect() as conn:
+            legacy = timed(conn, legacy_query(2023, 6), args.repeat)
+            ranged = timed(conn, range_query(2023, 6), args.repeat)
+        print(f'{size:>10} {legacy:>12.2f} {ranged:>12.2f}')
+
+    with engine.begin() as conn:
+        conn.execute(delete(table).where(table.c.user_id <= BENCH_USER_BASE))
+
+
+if __name__ == '__main__':
+    main()
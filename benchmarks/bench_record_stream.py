@@ -0,0 +1,107 @@
+"""Peak Python heap (tracemalloc) and time-to-first-byte of /api/record/{user_id} against record count.
+
+Compares the previous handler (ORM objects + one JSONResponse) with the streaming
+mode. Seeds rows into ``DATABASE_URL`` under negative user ids and removes them afterwards:
+
+    python -m benchmarks.bench_record_stream --sizes 1000 10000 50000
+"""
+import argparse
+import asyncio
+import datetime
+import threading
+import time
+import tracemalloc
+import uuid
+
+import httpx
+import uvicorn
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert
+
+from models import FinancialRecord, LOCAL_TZ, Session, TIMESTAMP_FORMAT, engine
+from report_fastapi import app
+
+BENCH_USER_BASE = -2_000_000
+table = FinancialRecord.__table__
+
+
+@app.get("/bench/legacy/{user_id}")
+async def legacy_read_record_api(user_id: int):
+    with Session() as session:
+        financial_records = session.query(FinancialRecord).filter_by(user_id=user_id).all()
+    return JSONResponse(content=[
+        {
+            "username": record.username,
+            "user_message": record.user_message,
+            "product": record.product,
+            "price": record.price,
+            "quantity": record.quantity,
+            "status": record.status,
+            "amount": record.amount,
+            "timestamp": record.timestamp,
+        }
+        for record in financial_records
+    ])
+
+
+def seed(user_id, size):
+    start = datetime.datetime(2022, 1, 1, tzinfo=LOCAL_TZ)
+    rows = []
+    for i in range(size):
+        ts = start + datetime.timedelta(minutes=i)
+        rows.append({
+            'message_id': uuid.uuid4(), 'user_id': user_id, 'username': 'bench',
+            'user_message': 'Купил 2 билета в кино по 300 рублей каждый', 'product': 'Билет в кино',
+            'price': 300, 'quantity': 2, 'status': 'Expenses', 'amount': 600,
+            'timestamp': ts.strftime(TIMESTAMP_FORMAT), 'ts': ts,
+        })
+    with engine.begin() as conn:
+        for offset in range(0, size, 10000):
+            conn.execute(insert(table), rows[offset:offset + 10000])
+
+
+async def fetch(client, url):
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    first_byte = None
+    async with client.stream('GET', url) as response:
+        async for _ in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return first_byte * 1000, total * 1000, tracemalloc.get_traced_memory()[1] / 2 ** 20
+
+
+async def run(sizes, port):
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=300) as client:
+        print(f"{'rows':>8} {'mode':>8} {'ttfb ms':>9} {'total ms':>9} {'heap MiB':>9}")
+        for index, size in enumerate(sizes):
+            user_id = BENCH_USER_BASE - index
+            seed(user_id, size)
+            for mode, url in (('legacy', f'/bench/legacy/{user_id}'), ('stream', f'/api/record/{user_id}')):
+                ttfb, total, peak = await fetch(client, url)
+                print(f'{size:>8} {mode:>8} {ttfb:>9.1f} {total:>9.1f} {peak:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    tracemalloc.start()
+    try:
+        asyncio.run(run(args.sizes, args.port))
+    finally:
+        server.should_exit = True
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id <= BENCH_USER_BASE))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Latency of the report endpoints on a cache miss, a cache hit and an ``If-None-Match`` revalidation.
+
+    python -m benchmarks.bench_report_cache --records 5000 --redis-url redis://localhost:6379/15
+
+Seeds one month of records into ``DATABASE_URL`` under a negative user id, serves
+``report_fastapi`` with uvicorn and checks that a saved record invalidates the cache.
+"""
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+import uuid
+
+import httpx
+import redis.asyncio as redis
+import uvicorn
+from sqlalchemy import delete, insert
+
+from cache import report_cache
+from models import FinancialRecord, MonthlySummary, TIMESTAMP_FORMAT, engine, utcnow
+from report_fastapi import app
+from summaries import rebuild
+from write_queue import RecordWriteQueue
+
+BENCH_USER = -6_000_000
+
+
+def seed(records):
+    start = utcnow().replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    rows = []
+    for i in range(records):
+        ts = start + datetime.timedelta(seconds=i)
+        rows.append({
+            'message_id': uuid.uuid4(), 'user_id': BENCH_USER, 'username': 'bench',
+            'user_message': 'Такси за 2000', 'product': 'Такси', 'price': 2000, 'quantity': 1,
+            'status': 'Expenses', 'amount': 2000, 'timestamp': ts.strftime(TIMESTAMP_FORMAT), 'ts': ts,
+        })
+    with engine.begin() as conn:
+        for offset in range(0, records, 10000):
+            conn.execute(insert(FinancialRecord), rows[offset:offset + 10000])
+    rebuild(BENCH_USER)
+    return start.strftime('%Y-%m')
+
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(delete(FinancialRecord).where(FinancialRecord.user_id == BENCH_USER))
+        conn.execute(delete(MonthlySummary).where(MonthlySummary.user_id == BENCH_USER))
+
+
+async def timed(client, url, repeat, etag=None, invalidate=False):
+    samples = []
+    response = None
+    for _ in range(repeat):
+        if invalidate:
+            await report_cache.invalidate(BENCH_USER)
+        headers = {'If-None-Match': etag} if etag else {}
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, response
+
+
+async def run(args, month):
+    # сервер, клиент Redis и очередь записи живут в одном event loop
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level='warning'))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        await measure(args, month)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def measure(args, month):
+    urls = {
+        'month': f'/api/record/{BENCH_USER}?target_date={month}',
+        'sum': f'/api/record/sum/{BENCH_USER}',
+    }
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{args.port}', timeout=300) as client:
+        print(f"{'endpoint':>9} {'miss ms':>9} {'hit ms':>9} {'304 ms':>9} {'bytes':>9}")
+        for name, url in urls.items():
+            miss, response = await timed(client, url, args.repeat, invalidate=True)
+            await client.get(url)
+            hit, response = await timed(client, url, args.repeat)
+            revalidated, not_modified = await timed(client, url, args.repeat, etag=response.headers['etag'])
+            assert not_modified.status_code == 304
+            print(f'{name:>9} {miss:>9.2f} {hit:>9.2f} {revalidated:>9.2f} {len(response.content):>9}')
+
+        before = (await client.get(urls['sum'])).json()
+        queue = RecordWriteQueue()
+        await queue.submit({'user_id': BENCH_USER, 'status': 'Expenses', 'amount': 1, 'product': 'Такси'})
+        await queue.stop()
+        after = (await client.get(urls['sum'])).json()
+        print('invalidated on save:', after['Expenses'] == before['Expenses'] + 1)
+    print('cache metrics:', report_cache.metrics())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    if args.redis_url:
+        report_cache.client = redis.from_url(args.redis_url)
+
+    cleanup()
+    try:
+        asyncio.run(run(args, seed(args.records)))
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
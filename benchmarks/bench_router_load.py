@@ -0,0 +1,84 @@
+"""Handler latency under concurrent chats with blocking vs async LLM classification.
+
+Every chat sends one message that goes through ``Router.classify`` against a fake
+OpenAI server. At the same time a probe handler (the ``/report`` reply) runs every
+few milliseconds; its latency shows how long other users wait behind the LLM.
+
+    python -m benchmarks.bench_router_load --chats 1 10 50 100 --latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from benchmarks.fakes import FakeBot, FakeOpenAIServer, make_message  # noqa: E402
+
+
+def p99(samples):
+    return statistics.quantiles(samples, n=100)[98] * 1000 if len(samples) > 1 else samples[0] * 1000
+
+
+async def blocking_classify(router):
+    # поведение до перехода на apredict: синхронный вызов внутри корутины
+    from llm import get_llm
+    return 'true' in get_llm(verbose=True).predict(router.user_message.text)
+
+
+async def run(chats, mode, bot):
+    from routerV2 import Router
+
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0)
+            await bot.reply_to(make_message('/report'), 'report link')
+            probe_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    async def chat(user_id):
+        router = Router(bot=bot, user_message=make_message('Такси за 2000', user_id=user_id))
+        if mode == 'blocking':
+            await blocking_classify(router)
+        else:
+            await router.classify()
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(user_id) for user_id in range(chats)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    return elapsed, p99(probe_latencies)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chats', type=int, nargs='+', default=[1, 10, 50, 100])
+    parser.add_argument('--latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+
+    from llm import configure_http_pool, open_async_http_pool
+    configure_http_pool()
+    http_pool = await open_async_http_pool(pool_size=max(args.chats))
+    bot = FakeBot()
+    try:
+        print(f"{'mode':>9} {'chats':>6} {'wall s':>8} {'probe p99 ms':>13}")
+        for mode in ('blocking', 'async'):
+            for chats in args.chats:
+                elapsed, probe_p99 = await run(chats, mode, bot)
+                print(f'{mode:>9} {chats:>6} {elapsed:>8.2f} {probe_p99:>13.1f}')
+    finally:
+        await http_pool.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""Wasted LLM calls when users send quick clarifications, before and after ``ChatScheduler``.
+
+    python -m benchmarks.bench_scheduler --users 50 --followups 2 --gap 0.15 --steps 3 --latency 0.3
+
+Each user sends a message and then ``--followups`` clarifications ``--gap`` seconds
+apart. A processing run is an agent-like loop of ``--steps`` LLM calls against a
+fake OpenAI server. ``before`` starts a task per message and only flags the old
+processor as cancelled (the old Router behaviour); ``after`` goes through the
+scheduler. Only the run for the last message of each user is useful work.
+
+``approval`` checks that a run waiting for the Yes button stops blocking the chat
+when it waits inside the agent's ``HumanApprovalCallbackHandler``: langchain runs
+that callback in a task of its own. Reports how long the next message of each
+user waited to start; the question is never answered.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from benchmarks.fakes import FakeOpenAIServer  # noqa: E402
+
+
+class FakeAgentProcessor:
+    def __init__(self, steps, finished):
+        self.steps = steps
+        self.finished = finished
+        self.cancelled = False
+
+    def cancel(self):
+        # как MessageProcessor.cancel: флаг, который прогон агента не проверяет
+        self.cancelled = True
+
+    async def process(self):
+        from llm import get_llm
+
+        for step in range(self.steps):
+            await get_llm().apredict(f'step {step}')
+        self.finished.append(time.perf_counter())
+
+
+async def user(mode, scheduler, user_id, args, last_finished):
+    processor = None
+    for i in range(args.followups + 1):
+        if processor is not None:
+            processor.cancel()
+        finished = []
+        processor = FakeAgentProcessor(args.steps, finished)
+        if mode == 'before':
+            asyncio.create_task(processor.process())
+        else:
+            scheduler.schedule(user_id, processor.process, supersede=i > 0)
+        sent = time.perf_counter()
+        if i < args.followups:
+            await asyncio.sleep(args.gap)
+    while not finished:
+        await asyncio.sleep(0.01)
+    last_finished.append(finished[0] - sent)
+
+
+async def run(mode, args, server):
+    from scheduler import ChatScheduler
+
+    scheduler = ChatScheduler(debounce=args.debounce)
+    calls_before = server.calls
+    answers = []
+    await asyncio.gather(*(user(mode, scheduler, user_id, args, answers) for user_id in range(args.users)))
+    # дожидаемся хвоста: в режиме before устаревшие прогоны ещё дорабатывают
+    await asyncio.sleep(args.steps * args.latency + 0.5)
+    calls = server.calls - calls_before
+    useful = args.users * args.steps
+    print(f'{mode:>7} {calls:>7} {calls - useful:>7} {sum(answers) / len(answers) * 1000:>16.0f}')
+    if mode == 'after':
+        print('scheduler stats:', dict(scheduler.stats))
+
+
+async def approval(args):
+    from langchain.callbacks.manager import AsyncCallbackManager
+
+    from agent import HumanApprovalCallbackHandler
+    from scheduler import ChatScheduler
+
+    scheduler = ChatScheduler(debounce=args.debounce)
+    never_answered = asyncio.Event()
+    waits = []
+    stalled = 0
+
+    async def waiting_for_user(user_id):
+        async def approve(input_str):
+            # как MessageProcessor._approve_record: вопрос задан, дальше ждём только пользователя
+            scheduler.release(user_id)
+            await never_answered.wait()
+            return True
+
+        manager = AsyncCallbackManager(handlers=[HumanApprovalCallbackHandler(approve, lambda serialized: True)])
+        await manager.on_tool_start({'name': 'save_record'}, '{}')
+
+    async def next_message(user_id):
+        started = asyncio.Event()
+
+        async def process():
+            started.set()
+
+        scheduler.schedule(user_id, lambda: waiting_for_user(user_id))
+        await asyncio.sleep(args.debounce + 0.05)
+        sent = time.perf_counter()
+        scheduler.schedule(user_id, process)
+        try:
+            await asyncio.wait_for(started.wait(), args.debounce + 2)
+            waits.append(time.perf_counter() - sent - args.debounce)
+        except asyncio.TimeoutError:
+            nonlocal stalled
+            stalled += 1
+
+    await asyncio.gather(*(next_message(user_id) for user_id in range(args.users)))
+    never_answered.set()
+    for user_id in range(args.users):
+        scheduler.cancel(user_id)
+    waited = f'{max(waits) * 1000:.0f}' if waits else '-'
+    print(f'approval: {len(waits)} next messages started (max wait after debounce {waited} ms), {stalled} stalled')
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--followups', type=int, default=2)
+    parser.add_argument('--gap', type=float, default=0.15)
+    parser.add_argument('--steps', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--debounce', type=float, default=0.3)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+
+    from llm import open_async_http_pool
+    http_pool = await open_async_http_pool(pool_size=args.users * (args.followups + 1))
+    try:
+        print(f"{'mode':>7} {'calls':>7} {'wasted':>7} {'last answer ms':>16}")
+        for mode in ('before', 'after'):
+            await run(mode, args, server)
+        await approval(args)
+    finally:
+        await http_pool.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
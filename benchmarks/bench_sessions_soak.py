@@ -0,0 +1,104 @@
+"""Soak: memory and callback dispatch time stay flat as messages accumulate.
+
+Each simulated message creates a MessageProcessor, stores it in ``Router.processors``,
+sends the approval buttons and receives the "yes" callback through the single
+dispatcher. ``--unanswered`` of the questions are never answered: the processor
+keeps a task waiting for the answer until the user's next message replaces it.
+The legacy mode reproduces one ``callback_query_handler`` filter per message,
+scanned linearly by the bot.
+
+    python -m benchmarks.bench_sessions_soak --messages 100000 --users 5000 --unanswered 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+import types
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from benchmarks.fakes import FakeBot, make_message  # noqa: E402
+
+
+def make_call(question):
+    return types.SimpleNamespace(data='yes', message=question)
+
+
+async def soak(messages, users, window, unanswered):
+    from app_class import MessageProcessor
+    from routerV2 import Router
+    from sessions import callback_dispatcher
+
+    bot = FakeBot()
+    rng = random.Random(1)
+    waiting = set()
+    dispatch_time = 0.0
+    tracemalloc.start()
+    print(f"{'messages':>9} {'sessions':>9} {'handlers':>9} {'waiting':>9} {'mem KiB':>9} {'dispatch us':>12}")
+    for i in range(1, messages + 1):
+        message = make_message('Такси за 2000', user_id=i % users)
+        processor = MessageProcessor(bot, message)
+        Router.processors.put(message.from_user.id, processor)
+        await processor.send_save_buttons()
+
+        if rng.random() < unanswered:
+            # как _approve_record: прогон ждёт кнопку, которую так и не нажмут
+            task = asyncio.create_task(processor._answer_recieved.wait())
+            waiting.add(task)
+            task.add_done_callback(waiting.discard)
+            await asyncio.sleep(0)
+        else:
+            started = time.perf_counter()
+            await callback_dispatcher.dispatch(make_call(processor.save_data_question_message))
+            dispatch_time += time.perf_counter() - started
+
+        if i % window == 0:
+            await asyncio.sleep(0)
+            current, _ = tracemalloc.get_traced_memory()
+            print(f'{i:>9} {len(Router.processors):>9} {len(callback_dispatcher):>9} {len(waiting):>9} '
+                  f'{current / 1024:>9.0f} {dispatch_time / window * 1e6:>12.2f}')
+            dispatch_time = 0.0
+            bot.sent.clear()
+    tracemalloc.stop()
+
+
+async def legacy_soak(messages, window):
+    """One filter per message, checked in order like telebot's handler list."""
+    bot = FakeBot()
+    handlers = []
+    dispatch_time = 0.0
+    print(f"{'messages':>9} {'handlers':>9} {'dispatch us':>12}  (legacy)")
+    for i in range(1, messages + 1):
+        question = await bot.send_message(i, 'If everything is correct press "yes"')
+        handlers.append((lambda call, q=question: call.message.id == q.id, lambda call: None))
+
+        call = make_call(question)
+        started = time.perf_counter()
+        for check, handler in handlers:
+            if check(call):
+                handler(call)
+        dispatch_time += time.perf_counter() - started
+
+        if i % window == 0:
+            print(f'{i:>9} {len(handlers):>9} {dispatch_time / window * 1e6:>12.2f}')
+            dispatch_time = 0.0
+            bot.sent.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--window', type=int, default=10_000)
+    parser.add_argument('--legacy-messages', type=int, default=20_000)
+    parser.add_argument('--unanswered', type=float, default=0.3, help='share of questions nobody answers')
+    args = parser.parse_args()
+
+    asyncio.run(legacy_soak(args.legacy_messages, args.window // 2))
+    asyncio.run(soak(args.messages, args.users, args.window, args.unanswered))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Cold import time and memory of each service entry point.
+
+    python -m benchmarks.bench_startup --runs 3 --top 10
+
+Every run imports the entry point in a fresh interpreter under
+``python -X importtime`` and reads the cumulative time of the top-level module
+from its report, plus the peak RSS of that process. Nothing is started and the
+database is not contacted: ``models.init()`` runs only in ``main``/lifespan.
+Also checks that langchain is not imported at startup.
+"""
+import argparse
+import collections
+import os
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = ('app', 'webhook', 'report_fastapi')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHILD = (
+    # __import__, а не importlib.import_module: только он попадает в отчёт -X importtime
+    'import resource, sys; __import__(sys.argv[1]); '
+    'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+)
+
+
+def import_profile(module):
+    """(seconds, RSS in MiB, {module: cumulative seconds}) of one cold import."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, module],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", вложенность задаётся отступом имени
+        if not line.startswith('import time:'):
+            continue
+        _, total, name = line.removeprefix('import time:').split('|')
+        if total.strip().isdigit():
+            cumulative.setdefault(name.strip(), int(total) / 1e6)
+    rss_mib = int(result.stdout.strip().splitlines()[-1]) / 1024
+    return cumulative.get(module, 0.0), rss_mib, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    print(f"{'entry point':>15} {'import p50 s':>12} {'min s':>7} {'RSS MiB':>8} {'langchain':>10}")
+    heaviest = {}
+    for module in args.modules:
+        seconds, rss = [], []
+        modules = collections.defaultdict(list)
+        for _ in range(args.runs):
+            total, peak, cumulative = import_profile(module)
+            seconds.append(total)
+            rss.append(peak)
+            for name, value in cumulative.items():
+                modules[name].append(value)
+        langchain = any(name.split('.')[0] == 'langchain' for name in modules)
+        print(f'{module:>15} {statistics.median(seconds):>12.2f} {min(seconds):>7.2f} '
+              f'{statistics.median(rss):>8.0f} {"yes" if langchain else "no":>10}')
+        heaviest[module] = sorted(
+            ((statistics.median(values), name) for name, values in modules.items()
+             if '.' not in name and name != module),
+            reverse=True,
+        )[:args.top]
+
+    for module, top in heaviest.items():
+        print(f'\n{module}: heaviest top-level packages')
+        for value, name in top:
+            print(f'{name:>30} {value * 1000:>8.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Serialized size and round-trip time: dill-pickled MessageProcessor vs ConversationState.
+
+    python -m benchmarks.bench_state --iterations 2000
+    python -m benchmarks.bench_state --redis-url redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import dill
+import telebot.async_telebot
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from app_class import MessageProcessor  # noqa: E402
+from state import ConversationState, StateStore  # noqa: E402
+
+
+def make_processor():
+    bot = telebot.async_telebot.AsyncTeleBot('123456:bench-token')
+    message = ConversationState(
+        chat_id=42, user_id=42, username='bench', text='Купил 2 билета в кино по 300 рублей каждый',
+        message_ids=[1001],
+    ).to_message()
+    processor = MessageProcessor(bot, message)
+    processor.record = '"Product: Билет в кино Quantity: 2 Price: 300 Status: Expenses Amount: 600"'
+    return processor
+
+
+def dill_dumps(processor):
+    # MessageProcessor больше не определяет __getstate__, повторяем старую логику: без asyncio.Event
+    state = dict(processor.__dict__)
+    state.pop('_answer_recieved', None)
+    return dill.dumps(state)
+
+
+def time_it(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def redis_round_trip(url, processor, iterations):
+    import redis.asyncio as redis
+
+    client = redis.from_url(url)
+    store = StateStore(client, prefix='bench:conversation:')
+    blob = dill_dumps(processor)
+    state = ConversationState.from_processor(processor)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await client.setex('bench:dill', 600, blob)
+        dill.loads(await client.get('bench:dill'))
+    dill_us = (time.perf_counter() - started) / iterations * 1e6
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await store.save(state)
+        await store.load(state.user_id)
+    state_us = (time.perf_counter() - started) / iterations * 1e6
+
+    await client.delete('bench:dill', store.key(state.user_id))
+    await client.aclose()
+    return dill_us, state_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    processor = make_processor()
+    blob = dill_dumps(processor)
+    state = ConversationState.from_processor(processor)
+    mapping = state.to_mapping()
+    mapping_size = sum(len(key) + len(value.encode()) for key, value in mapping.items())
+
+    print(f"{'format':>8} {'bytes':>8} {'round trip us':>14}")
+    print(f"{'dill':>8} {len(blob):>8} {time_it(lambda: dill.loads(dill_dumps(processor)), args.iterations):>14.1f}")
+    print(f"{'state':>8} {mapping_size:>8} "
+          f"{time_it(lambda: ConversationState.from_mapping(state.to_mapping()), args.iterations):>14.1f}")
+
+    if args.redis_url:
+        dill_us, state_us = asyncio.run(redis_round_trip(args.redis_url, processor, args.iterations))
+        print(f'redis round trip: dill {dill_us:.1f} us, state {state_us:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
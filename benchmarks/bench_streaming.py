@@ -0,0 +1,127 @@
+"""Time to the first visible reply of the agent path, with and without streamed progress messages.
+
+    python -m benchmarks.bench_streaming --users 10 --latency 0.5 --token-latency 0.03
+
+Runs the ReAct agent fallback (``LLM_PIPELINE=agent``) against a fake OpenAI
+server that streams one word every ``--token-latency`` seconds. ``off`` is the
+old behaviour: nothing until the approval message and the final ``reply_to``.
+``on`` sends a placeholder at once and edits it as steps and tokens arrive.
+Also reports how often a chat was edited, to check the Telegram edit interval.
+Records are saved into ``DATABASE_URL`` under negative user ids and removed afterwards.
+"""
+import argparse
+import asyncio
+import collections
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+
+from sqlalchemy import delete  # noqa: E402
+
+from benchmarks.bench_pipeline import AutoApproveBot, responder  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer, PassthroughCache, make_message  # noqa: E402
+
+BENCH_USER_BASE = -11_000_000
+
+
+class StreamingBot(AutoApproveBot):
+    """Also notes when each chat was edited."""
+
+    def __init__(self):
+        super().__init__()
+        self.edits = collections.defaultdict(list)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edits[chat_id].append(time.perf_counter())
+        return await super().edit_message_text(text, chat_id=chat_id, message_id=message_id)
+
+
+async def run(mode, args):
+    import agent
+    import app_class
+    import routerV2
+    from streaming import stream_stats
+
+    app_class.STREAM_REPLIES = mode == 'on'
+    agent.agent_factory.streaming = mode == 'on'
+    agent.agent_factory._agent = None
+    bot = StreamingBot()
+    first_visible = []
+    question = []
+    done = []
+    stats_before = dict(stream_stats)
+
+    async def user(i):
+        user_id = BENCH_USER_BASE - i
+        started = time.perf_counter()
+        await routerV2.Router(bot, make_message(f'Хлебушек взял {100 + i}', user_id=user_id)).process()
+        await asyncio.wait_for(bot.done[user_id].wait(), args.timeout)
+        done.append(time.perf_counter() - started)
+        question.append(bot.questions[user_id] - started)
+        first_visible.append(min(sent for sent, _, chat_id, _ in bot.sent if chat_id == user_id) - started)
+
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    gaps = [later - earlier for edits in bot.edits.values() for earlier, later in zip(edits, edits[1:])]
+    print(f'{mode:>4} {statistics.median(first_visible) * 1000:>16.0f} {statistics.median(question) * 1000:>15.0f} '
+          f'{statistics.median(done) * 1000:>11.0f} {sum(map(len, bot.edits.values())) / args.users:>12.1f} '
+          f'{min(gaps, default=float("nan")) * 1000:>13.0f}')
+    if mode == 'on':
+        print('stream stats:', {key: value - stats_before.get(key, 0) for key, value in stream_stats.items()})
+
+
+async def main(args):
+    import app_class
+    import pipeline
+    import routerV2
+    from classifier import Decision
+    from llm import open_async_http_pool
+    from models import init
+    from scheduler import chat_scheduler
+    from write_queue import record_write_queue
+
+    server = FakeOpenAIServer(responder, latency=args.latency, token_latency=args.token_latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = server.api_base
+    init()
+    # только путь агента: локальные уровни, кэш и одиночный вызов выключены
+    routerV2.pre_classifier.classify = lambda text: Decision(None, None)
+    app_class.parse_transaction = lambda text: (None, 0.0)
+    pipeline.llm_cache = routerV2.llm_cache = app_class.llm_cache = PassthroughCache()
+    routerV2.LLM_PIPELINE = app_class.LLM_PIPELINE = 'agent'
+    chat_scheduler.debounce = 0
+
+    http_pool = await open_async_http_pool(pool_size=args.users * 2)
+    record_write_queue.start()
+    try:
+        print(f"{'mode':>4} {'first visible ms':>16} {'question p50 ms':>15} {'done p50 ms':>11} "
+              f"{'edits/message':>12} {'min edit gap':>13}")
+        for mode in ('off', 'on'):
+            await run(mode, args)
+    finally:
+        await record_write_queue.stop()
+        await http_pool.close()
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--token-latency', type=float, default=0.03)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    finally:
+        from models import FinancialRecord, MonthlySummary, engine
+
+        with engine.begin() as conn:
+            for table in (FinancialRecord, MonthlySummary):
+                conn.execute(delete(table).where(
+                    table.user_id <= BENCH_USER_BASE, table.user_id > BENCH_USER_BASE - args.users
+                ))
+
+
+if __name__ == '__main__':
+    cli()
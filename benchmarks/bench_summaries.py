@@ -0,0 +1,104 @@
+"""Totals for one user as their history grows: GROUP BY over records vs ``monthly_summaries``.
+
+    python -m benchmarks.bench_summaries --sizes 1000 10000 100000 1000000
+
+History is appended through the same summary upsert the write queue uses, so the
+run also checks that incremental maintenance matches a full recomputation.
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, func, insert, select
+
+from models import FinancialRecord, MonthlySummary, engine
+from summaries import compute_summaries, upsert_summaries
+
+BENCH_USER = -5_000_000
+
+
+def append_history(conn, count, batch=10000):
+    start = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+    for offset in range(0, count, batch):
+        rows = []
+        for _ in range(min(batch, count - offset)):
+            amount = random.randrange(100, 50000)
+            rows.append({
+                'message_id': uuid.uuid4(),
+                'user_id': BENCH_USER,
+                'username': 'bench',
+                'user_message': f'Такси за {amount}',
+                'product': 'Такси',
+                'price': amount,
+                'quantity': 1,
+                'status': random.choice(('Expenses', 'Income')),
+                'amount': amount,
+                'ts': start + datetime.timedelta(minutes=random.randrange(0, 10 * 365 * 24 * 60)),
+            })
+        conn.execute(insert(FinancialRecord), rows)
+        conn.execute(upsert_summaries(conn.dialect.name, rows))
+
+
+def records_query():
+    return select(func.sum(FinancialRecord.amount), FinancialRecord.status).where(
+        FinancialRecord.user_id == BENCH_USER
+    ).group_by(FinancialRecord.status)
+
+
+def summary_query():
+    return select(func.sum(MonthlySummary.total), MonthlySummary.status).where(
+        MonthlySummary.user_id == BENCH_USER
+    ).group_by(MonthlySummary.status)
+
+
+def timed(conn, stmt, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = dict((status, total) for total, status in conn.execute(stmt))
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(delete(FinancialRecord).where(FinancialRecord.user_id == BENCH_USER))
+        conn.execute(delete(MonthlySummary).where(MonthlySummary.user_id == BENCH_USER))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cleanup()
+    try:
+        print(f"{'rows':>10} {'records ms':>12} {'summary ms':>12} {'match':>6}")
+        seeded = 0
+        for size in sorted(args.sizes):
+            with engine.begin() as conn:
+                append_history(conn, size - seeded)
+            seeded = size
+            with engine.connect() as conn:
+                from_records, expected = timed(conn, records_query(), args.repeat)
+                from_summary, actual = timed(conn, summary_query(), args.repeat)
+            print(f'{size:>10} {from_records:>12.2f} {from_summary:>12.2f} {str(expected == actual):>6}')
+
+        with engine.connect() as conn:
+            recomputed = compute_summaries(conn, BENCH_USER)
+            stored = {
+                (row.user_id, row.month, row.status): [row.total, row.count]
+                for row in conn.execute(select(MonthlySummary).where(MonthlySummary.user_id == BENCH_USER))
+            }
+        print('summaries match full recomputation:', dict(recomputed) == stored)
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
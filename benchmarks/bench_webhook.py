@@ -0,0 +1,161 @@
+"""Load generator for webhook mode: synthetic Telegram updates against ``webhook.app``.
+
+    python -m benchmarks.bench_webhook --users 200 --messages 5 --openai-latency 0.5
+
+Serves the webhook app with uvicorn next to fake Telegram Bot API and OpenAI
+servers. Every simulated user sends transaction messages one after another and
+presses "Yes" under the confirmation, like a real chat. Reports webhook ack
+latency, time to the first bot reply, time to the saved record, throughput and
+429 backpressure. Uses ``DATABASE_URL`` and Redis from the environment; records
+are written under negative user ids and removed afterwards.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:bench-token')
+
+import aiohttp  # noqa: E402
+import telebot.asyncio_helper  # noqa: E402
+import uvicorn  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from benchmarks.fakes import FakeOpenAIServer, FakeTelegramServer, callback_update, message_update  # noqa: E402
+
+BENCH_USER_BASE = -9_000_000
+SAVED_TEXT = 'Structured JSON record saved successfully'
+
+
+def quantile_ms(samples, q):
+    if not samples:
+        return float('nan')
+    if len(samples) == 1:
+        return samples[0] * 1000
+    return statistics.quantiles(samples, n=100, method='inclusive')[q - 1] * 1000
+
+
+class LoadGenerator:
+    def __init__(self, client, telegram, path, retry_delay):
+        self.client = client
+        self.telegram = telegram
+        self.path = path
+        self.retry_delay = retry_delay
+        self.ack = []
+        self.first_reply = []
+        self.saved = []
+        self.throttled = 0
+        self.timeouts = 0
+
+    async def post(self, update):
+        # как Telegram: на 429 повторяем доставку позже
+        while True:
+            started = time.perf_counter()
+            async with self.client.post(self.path, json=update) as response:
+                await response.read()
+            self.ack.append(time.perf_counter() - started)
+            if response.status != 429:
+                response.raise_for_status()
+                return
+            self.throttled += 1
+            await asyncio.sleep(self.retry_delay)
+
+    @staticmethod
+    async def wait_for(queue, predicate, timeout):
+        deadline = time.perf_counter() + timeout
+        while True:
+            method, params, result = await asyncio.wait_for(queue.get(), deadline - time.perf_counter())
+            if predicate(method, params):
+                return result
+
+    async def user(self, user_id, messages, timeout):
+        replies = self.telegram.subscribe(user_id)
+        for i in range(messages):
+            started = time.perf_counter()
+            await self.post(message_update(f'Такси за {1000 + i}', user_id))
+            try:
+                question = await self.wait_for(
+                    replies, lambda method, params: method == 'sendMessage' and 'reply_markup' in params, timeout
+                )
+                self.first_reply.append(time.perf_counter() - started)
+                await self.post(callback_update(user_id, question))
+                await self.wait_for(
+                    replies, lambda method, params: params.get('text') == SAVED_TEXT, timeout
+                )
+                self.saved.append(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+
+
+async def run(args):
+    telegram = await FakeTelegramServer(latency=args.telegram_latency).start()
+    openai_server = FakeOpenAIServer(latency=args.openai_latency).start_in_thread()
+    os.environ['OPENAI_API_BASE'] = openai_server.api_base
+    telebot.asyncio_helper.API_URL = telegram.api_url
+
+    import webhook
+
+    server = uvicorn.Server(uvicorn.Config(webhook.app, port=args.port, log_level='warning'))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(f'http://127.0.0.1:{args.port}', connector=connector) as client:
+        generator = LoadGenerator(client, telegram, webhook.WEBHOOK_PATH, args.retry_delay)
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            generator.user(BENCH_USER_BASE - user, args.messages, args.timeout) for user in range(args.users)
+        ))
+        elapsed = time.perf_counter() - started
+        async with client.get('/telegram/metrics') as response:
+            metrics = await response.json()
+
+    server.should_exit = True
+    await serving
+    if telebot.asyncio_helper.session_manager.session is not None:
+        await telebot.asyncio_helper.session_manager.session.close()
+    await telegram.stop()
+
+    total = args.users * args.messages
+    print(f'users {args.users}, messages {total}, saved {len(generator.saved)}, '
+          f'timeouts {generator.timeouts}, 429 {generator.throttled}')
+    print(f'throughput: {len(generator.saved) / elapsed:.1f} records/s over {elapsed:.1f} s')
+    print(f"{'latency ms':>14} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, samples in (('webhook ack', generator.ack), ('first reply', generator.first_reply),
+                          ('record saved', generator.saved)):
+        print(f'{name:>14} {quantile_ms(samples, 50):>9.1f} {quantile_ms(samples, 95):>9.1f} '
+              f'{quantile_ms(samples, 99):>9.1f}')
+    print('lanes:', metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--openai-latency', type=float, default=0.5)
+    parser.add_argument('--telegram-latency', type=float, default=0.02)
+    parser.add_argument('--connections', type=int, default=100)
+    parser.add_argument('--retry-delay', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--port', type=int, default=8767)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        from models import FinancialRecord, MonthlySummary, engine
+
+        with engine.begin() as conn:
+            conn.execute(delete(FinancialRecord).where(
+                FinancialRecord.user_id <= BENCH_USER_BASE, FinancialRecord.user_id > BENCH_USER_BASE - args.users
+            ))
+            conn.execute(delete(MonthlySummary).where(
+                MonthlySummary.user_id <= BENCH_USER_BASE, MonthlySummary.user_id > BENCH_USER_BASE - args.users
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Burst of confirmed records: one transaction per record vs the write-behind queue.
+
+    python -m benchmarks.bench_write_queue --records 5000 --concurrency 500
+
+Reports throughput, per-record acknowledgement latency and the queue metrics. Rows
+are written to ``DATABASE_URL`` under a negative user id and removed afterwards.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete, insert
+
+from models import AsyncSession, FinancialRecord, async_engine
+from write_queue import RecordWriteQueue
+
+BENCH_USER = -4_000_000
+
+
+def values(i):
+    return {
+        'user_id': BENCH_USER, 'username': 'bench', 'user_message': f'Зарплата {i}',
+        'product': 'Зарплата', 'price': 500000, 'quantity': 1, 'status': 'Income', 'amount': 500000,
+    }
+
+
+async def one_per_transaction(i):
+    async with AsyncSession() as session:
+        await session.execute(insert(FinancialRecord), [values(i)])
+        await session.commit()
+
+
+async def burst(records, concurrency, save):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def confirm(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await save(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(confirm(i) for i in range(records)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100)
+    return records / elapsed, quantiles[49] * 1000, quantiles[98] * 1000
+
+
+async def run(args):
+    queue = RecordWriteQueue(batch_size=args.batch_size, flush_interval=args.flush_interval)
+    try:
+        print(f"{'mode':>12} {'records/s':>10} {'ack p50 ms':>11} {'ack p99 ms':>11}")
+        for name, save in (('per-record', one_per_transaction), ('queue', lambda i: queue.submit(values(i)))):
+            rps, p50, p99 = await burst(args.records, args.concurrency, save)
+            print(f'{name:>12} {rps:>10.0f} {p50:>11.1f} {p99:>11.1f}')
+        await queue.stop()
+        print('queue metrics:', queue.metrics())
+    finally:
+        async with async_engine.begin() as conn:
+            await conn.execute(delete(FinancialRecord.__table__).where(FinancialRecord.user_id == BENCH_USER))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""Local stand-ins used by the benchmark scripts."""
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+import types
+import urllib.parse
+
+from aiohttp import web
+
+TOKENS = re.compile(r'\s*\S+')
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible ``/v1/chat/completions`` endpoint with configurable latency.
+
+    ``responder`` receives the request body and returns the assistant message content.
+    """
+
+    def __init__(self, responder=None, latency=0.5, host='127.0.0.1', port=0, token_latency=0.0):
+        self.responder = responder or (lambda body: 'true')
+        self.latency = latency
+        self.token_latency = token_latency
+        self.host = host
+        self.port = port
+        self.calls = 0
+        self._runner = None
+
+    @property
+    def api_base(self):
+        return f'http://{self.host}:{self.port}/v1'
+
+    async def _chat_completions(self, request):
+        body = await request.json()
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = self.responder(body)
+        if body.get('stream') and isinstance(content, str):
+            return await self._stream(request, body, content)
+        if self.token_latency and isinstance(content, str):
+            # без стриминга ответ генерируется столько же, просто приходит целиком
+            await asyncio.sleep(self.token_latency * (len(TOKENS.findall(content)) + 1))
+        message = {'role': 'assistant', 'content': content}
+        if isinstance(content, dict):
+            message = {'role': 'assistant', **content}
+        return web.json_response({
+            'id': f'chatcmpl-{self.calls}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+    async def _stream(self, request, body, content):
+        """Server-sent events with one chunk per word, ``token_latency`` seconds apart."""
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        chunk = {'id': f'chatcmpl-{self.calls}', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': body.get('model', 'fake')}
+        deltas = [{'role': 'assistant', 'content': ''}] + [{'content': token} for token in TOKENS.findall(content)]
+        for delta in deltas:
+            await asyncio.sleep(self.token_latency)
+            choice = {'index': 0, 'delta': delta, 'finish_reason': None}
+            await response.write(f'data: {json.dumps({**chunk, "choices": [choice]})}\n\n'.encode())
+        choice = {'index': 0, 'delta': {}, 'finish_reason': 'stop'}
+        await response.write(f'data: {json.dumps({**chunk, "choices": [choice]})}\n\ndata: [DONE]\n\n'.encode())
+        await response.write_eof()
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self._chat_completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def start_in_thread(self):
+        """Serve from a separate event loop so blocking clients in the caller's loop can't stall it."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return self
+
+
+def use_sqlite_uuid():
+    """Render the PostgreSQL ``UUID`` columns as ``CHAR(32)`` so the schema can be created in SQLite."""
+    from sqlalchemy.dialects.postgresql import UUID
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(UUID, 'sqlite')
+    def compile_uuid(type_, compiler, **kwargs):
+        return 'CHAR(32)'
+
+
+_ids = itertools.count(1)
+
+
+def make_message(text, user_id=1, chat_id=None, reply_to=None):
+    """Minimal object with the attributes the bot code reads from ``telebot.types.Message``."""
+    chat_id = chat_id or user_id
+    return types.SimpleNamespace(
+        id=next(_ids),
+        message_id=None,
+        text=text,
+        chat=types.SimpleNamespace(id=chat_id),
+        from_user=types.SimpleNamespace(id=user_id, username=f'user{user_id}', first_name='Bench'),
+        reply_to_message=reply_to,
+    )
+
+
+class PassthroughCache:
+    """``LLMCache`` stand-in that always calls the LLM."""
+
+    async def cached(self, namespace, text, call):
+        return await call()
+
+    def metrics(self):
+        return {}
+
+
+class FakeBot:
+    """Records outgoing calls instead of talking to the Telegram Bot API."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+
+    async def _call(self, method, chat_id, text=None):
+        await asyncio.sleep(self.latency)
+        message = make_message(text, chat_id=chat_id)
+        message.message_id = message.id
+        self.sent.append((time.perf_counter(), method, chat_id, text))
+        return message
+
+    async def reply_to(self, message, text, **kwargs):
+        return await self._call('reply_to', message.chat.id, text)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._call('send_message', chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        return await self._call('edit_message_text', chat_id, text)
+
+    async def edit_message_reply_markup(self, chat_id=None, message_id=None, **kwargs):
+        return await self._call('edit_message_reply_markup', chat_id)
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        return await self._call('delete_message', chat_id)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._call('send_document', chat_id)
+
+    def callback_query_handler(self, *args, **kwargs):
+        return lambda handler: handler
+
+
+class FakeTelegramServer:
+    """Bot API stand-in at ``api_url``: answers every method with a plausible result.
+
+    Every call is appended to ``calls`` and pushed to the queues returned by
+    ``subscribe(chat_id)`` as ``(method, params, result)``.
+    """
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls = []
+        self._subscribers = {}
+        self._message_ids = itertools.count(1_000_000)
+        self._runner = None
+
+    @property
+    def api_url(self):
+        """Value for ``telebot.asyncio_helper.API_URL``."""
+        return f'http://{self.host}:{self.port}/bot{{0}}/{{1}}'
+
+    def subscribe(self, chat_id):
+        return self._subscribers.setdefault(int(chat_id), asyncio.Queue())
+
+    def _result(self, method, params):
+        chat_id = int(params.get('chat_id', 0))
+        if method in ('sendMessage', 'sendDocument', 'editMessageText', 'editMessageReplyMarkup'):
+            return {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': 'Jeeves'},
+                'text': params.get('text', ''),
+            }
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Jeeves', 'username': 'jeeves_bot'}
+        return True
+
+    @staticmethod
+    async def _params(request):
+        # request.post() читает тело только у POST, а telebot шлёт форму методом GET
+        if request.content_type != 'multipart/form-data':
+            return dict(urllib.parse.parse_qsl((await request.read()).decode()))
+        params = {}
+        async for part in await request.multipart():
+            if part.filename is None:
+                params[part.name] = await part.text()
+            else:
+                await part.read()
+        return params
+
+    async def _handle(self, request):
+        method = request.match_info['method']
+        params = await self._params(request)
+        await asyncio.sleep(self.latency)
+        result = self._result(method, params)
+        self.calls.append((time.perf_counter(), method, params))
+        if 'chat_id' in params:
+            self.subscribe(params['chat_id']).put_nowait((method, params, result))
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self):
+        app = web.Application()
+        # telebot шлёт запросы методом GET с телом формы
+        app.router.add_route('*', '/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+_update_ids = itertools.count(1)
+
+
+def message_update(text, user_id, chat_id=None, message_id=None, reply_to=None):
+    """Telegram ``Update`` JSON with a private text message."""
+    chat_id = chat_id or user_id
+    message = {
+        'message_id': message_id or next(_ids),
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f'user{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    if reply_to is not None:
+        message['reply_to_message'] = reply_to
+    return {'update_id': next(_update_ids), 'message': message}
+
+
+def callback_update(user_id, message, data='yes'):
+    """Telegram ``Update`` JSON for pressing an inline button under ``message``."""
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_ids)),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench'},
+            'message': message,
+            'chat_instance': str(user_id),
+            'data': data,
+        },
+    }
@@ -0,0 +1,136 @@
+import collections
+import hashlib
+import os
+import typing
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from sessions import SessionRegistry
+from telemetry import instrument_redis, register_stats
+
+load_dotenv()
+
+REDIS_HOST = os.getenv("REDIS_HOST")
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 300))
+REPORT_CACHE_LOCAL_SIZE = int(os.getenv("REPORT_CACHE_LOCAL_SIZE", 1024))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 1_000_000))
+
+
+class CachedResponse(typing.NamedTuple):
+    body: bytes
+    media_type: str
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+class ReportCache:
+    """Two-tier cache (in-process LRU, then Redis) for report API responses.
+
+    Keys carry a per-user version that ``invalidate`` increments, so one INCR drops
+    every cached response of the user in all processes at once; old entries are
+    never read again and expire by TTL. Redis errors only disable caching.
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl: int = REPORT_CACHE_TTL,
+        local_size: int = REPORT_CACHE_LOCAL_SIZE,
+        max_bytes: int = REPORT_CACHE_MAX_BYTES,
+        prefix: str = 'report:',
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.local = SessionRegistry(maxsize=local_size, ttl=ttl)
+        self.stats = collections.Counter(dict.fromkeys(
+            ('local_hits', 'redis_hits', 'misses', 'invalidations', 'errors'), 0
+        ))
+
+    def version_key(self, user_id) -> str:
+        return f'{self.prefix}version:{user_id}'
+
+    async def key(self, user_id, *parts) -> str | None:
+        """Cache key of one response, or None when Redis is unavailable."""
+        try:
+            version = await self.client.get(self.version_key(user_id))
+        except redis.RedisError:
+            self.stats['errors'] += 1
+            return None
+        version = int(version or 0)
+        return f'{self.prefix}{user_id}:{version}:' + '|'.join('' if part is None else str(part) for part in parts)
+
+    async def get(self, key: str | None) -> CachedResponse | None:
+        if key is None:
+            return None
+        entry = self.local.get(key)
+        if entry is not None:
+            self.stats['local_hits'] += 1
+            return entry
+
+        try:
+            mapping = await self.client.hgetall(key)
+        except redis.RedisError:
+            self.stats['errors'] += 1
+            mapping = None
+        if not mapping:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['redis_hits'] += 1
+        entry = CachedResponse(mapping[b'body'], mapping[b'media_type'].decode(), mapping[b'etag'].decode())
+        self.local.put(key, entry)
+        return entry
+
+    async def set(self, key: str | None, body: bytes, media_type: str) -> CachedResponse:
+        entry = CachedResponse(body, media_type, make_etag(body))
+        if key is None or len(body) > self.max_bytes:
+            return entry
+
+        self.local.put(key, entry)
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=entry._asdict())
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            self.stats['errors'] += 1
+        return entry
+
+    async def invalidate(self, *user_ids):
+        if not user_ids:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.incr(self.version_key(user_id))
+                await pipe.execute()
+        except redis.RedisError:
+            self.stats['errors'] += 1
+        else:
+            self.stats['invalidations'] += len(user_ids)
+
+    def metrics(self) -> dict:
+        hits = self.stats['local_hits'] + self.stats['redis_hits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'local_size': len(self.local),
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+report_cache = ReportCache(instrument_redis(redis.StrictRedis(host=REDIS_HOST, port=6379, db=0)))
+register_stats('report_cache', report_cache.metrics)
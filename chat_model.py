@@ -0,0 +1,15 @@
+from langchain.chat_models import ChatOpenAI
+
+from llm import llm_gate
+from telemetry import record_llm_usage, span
+
+
+class GatedChatOpenAI(ChatOpenAI):
+    """Async calls go through ``llm_gate``: agent steps, predictions and tools alike."""
+
+    async def _agenerate(self, *args, **kwargs):
+        with span('llm.request', model=self.model_name, streaming=self.streaming):
+            async with llm_gate:
+                result = await super()._agenerate(*args, **kwargs)
+            record_llm_usage(self.model_name, (result.llm_output or {}).get('token_usage'))
+            return result
@@ -0,0 +1,194 @@
+import argparse
+import collections
+import json
+import os
+import pickle
+import random
+import re
+import typing
+
+from dotenv import load_dotenv
+
+from telemetry import register_stats
+
+load_dotenv()
+
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", "classifier_model.pkl")
+CLASSIFIER_MODEL_THRESHOLD = float(os.getenv("CLASSIFIER_MODEL_THRESHOLD", 0.9))
+CLASSIFIER_LOG_PATH = os.getenv("CLASSIFIER_LOG_PATH")
+CLASSIFIER_SHADOW_RATE = float(os.getenv("CLASSIFIER_SHADOW_RATE", 0.02))
+
+# Слова-маркеры уточнений из промпта Router (нет, не, поменяй, измени) и типовые фразы уточнений
+CLARIFICATION_MARKERS = re.compile(
+    r'^\s*(нет|не)\b'
+    # только повелительные формы: "заменил масло за 5000" — новая операция, а не уточнение
+    r'|\b(поменяй|помеяй|измени|исправь|замени)(те)?\b'
+    r'|\bа\s+не\b'
+    r'|\bне\s+\d'
+    r'|\bобщая\s+(цена|сумма)\b'
+    r'|\bцена\s+за\s+(единицу|штуку)\b',
+    re.IGNORECASE,
+)
+# "5 бутылок", "8 бутылок", "20"
+QUANTITY_ONLY = re.compile(r'^\s*\d[\d\s]*\s*[a-zа-яё.]*\s*$', re.IGNORECASE)
+TRANSACTION_VERBS = re.compile(
+    r'\b(купил|купила|купили|продал|продала|продали|получил|получила|получили|потратил|потратила|потратили'
+    r'|оплатил|оплатила|оплатили|заплатил|заплатила|заплатили|заработал|заработала|выиграл|выиграла|выйграл'
+    r'|нашёл|нашел|нашла|подарил|подарила|подарили|украл|украла|заказал|заказала|перевёл|перевел|перевела'
+    r'|зарплат\w*|аванс|преми\w*)\b',
+    re.IGNORECASE,
+)
+# "Такси за 2000", "Заказ на 5к", "Погуляли на лям"
+AMOUNT_PHRASE = re.compile(r'\b(за|на)\s+(\d|лям|тыщ|косар)', re.IGNORECASE)
+
+
+class Decision(typing.NamedTuple):
+    is_new: bool | None
+    source: str | None
+
+
+class PreClassifier:
+    """Settles obvious new-vs-clarification cases locally; ``is_new=None`` means ask the LLM.
+
+    Tier one is a set of regular expressions built from the Router prompt. Tier two is an
+    optional pickled scikit-learn pipeline trained from logged LLM decisions
+    (``python classifier.py train``). A small share of local decisions is re-checked
+    against the LLM to track accuracy.
+    """
+
+    def __init__(
+        self,
+        model_path: str | None = CLASSIFIER_MODEL_PATH,
+        threshold: float = CLASSIFIER_MODEL_THRESHOLD,
+        shadow_rate: float = CLASSIFIER_SHADOW_RATE,
+        log_path: str | None = CLASSIFIER_LOG_PATH,
+    ):
+        self.model_path = model_path
+        self.threshold = threshold
+        self.shadow_rate = shadow_rate
+        self.log_path = log_path
+        self.stats = collections.Counter()
+        self._model = None
+        self._model_loaded = False
+
+    @property
+    def model(self):
+        if not self._model_loaded:
+            self._model_loaded = True
+            if self.model_path and os.path.exists(self.model_path):
+                with open(self.model_path, 'rb') as model_file:
+                    self._model = pickle.load(model_file)
+        return self._model
+
+    @staticmethod
+    def classify_rules(text: str) -> bool | None:
+        if CLARIFICATION_MARKERS.search(text):
+            return False
+        if QUANTITY_ONLY.match(text) and not TRANSACTION_VERBS.search(text):
+            return False
+        if TRANSACTION_VERBS.search(text) or AMOUNT_PHRASE.search(text):
+            return True
+        return None
+
+    def classify_model(self, text: str) -> bool | None:
+        if self.model is None:
+            return None
+        probabilities = self.model.predict_proba([text])[0]
+        best = probabilities.argmax()
+        if probabilities[best] < self.threshold:
+            return None
+        return bool(self.model.classes_[best])
+
+    def classify(self, text: str) -> Decision:
+        self.stats['total'] += 1
+
+        is_new = self.classify_rules(text)
+        if is_new is not None:
+            self.stats['rules'] += 1
+            return Decision(is_new, 'rules')
+
+        is_new = self.classify_model(text)
+        if is_new is not None:
+            self.stats['model'] += 1
+            return Decision(is_new, 'model')
+
+        self.stats['llm'] += 1
+        return Decision(None, None)
+
+    def should_shadow(self) -> bool:
+        return random.random() < self.shadow_rate
+
+    def record_llm(self, text: str, is_new: bool, decision: Decision | None = None):
+        """Store the LLM answer: compare it with a shadowed local decision and log it for training."""
+        if decision is not None and decision.is_new is not None:
+            self.stats[f'{decision.source}_checked'] += 1
+            if decision.is_new == is_new:
+                self.stats[f'{decision.source}_agreed'] += 1
+
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as log_file:
+                log_file.write(json.dumps({'text': text, 'is_new': is_new}, ensure_ascii=False) + '\n')
+
+    def metrics(self) -> dict:
+        total = self.stats['total'] or 1
+        metrics = dict(self.stats)
+        metrics['hit_rate'] = (self.stats['rules'] + self.stats['model']) / total
+        for source in ('rules', 'model'):
+            checked = self.stats[f'{source}_checked']
+            metrics[f'{source}_accuracy'] = self.stats[f'{source}_agreed'] / checked if checked else None
+        return metrics
+
+
+pre_classifier = PreClassifier()
+register_stats('pre_classifier', pre_classifier.metrics)
+
+
+def _load_decisions(path):
+    with open(path, encoding='utf-8') as log_file:
+        rows = [json.loads(line) for line in log_file if line.strip()]
+    return [row['text'] for row in rows], [row['is_new'] for row in rows]
+
+
+def train(log_path, model_path):
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+    except ImportError:
+        raise SystemExit('Training the classifier model requires scikit-learn: pip install scikit-learn')
+
+    texts, labels = _load_decisions(log_path)
+    model = make_pipeline(
+        TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), lowercase=True),
+        LogisticRegression(max_iter=1000),
+    )
+    model.fit(texts, labels)
+    with open(model_path, 'wb') as model_file:
+        pickle.dump(model, model_file)
+    print(f'Trained on {len(texts)} decisions, saved to {model_path}')
+
+
+def evaluate(log_path, model_path):
+    texts, labels = _load_decisions(log_path)
+    classifier = PreClassifier(model_path=model_path, shadow_rate=0, log_path=None)
+    for text, is_new in zip(texts, labels):
+        decision = classifier.classify(text)
+        classifier.record_llm(text, is_new, decision)
+    print(json.dumps(classifier.metrics(), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local new-vs-clarification pre-classifier')
+    parser.add_argument('command', choices=['train', 'evaluate'])
+    parser.add_argument('log_path', help='JSONL of logged LLM decisions ({"text": ..., "is_new": ...})')
+    parser.add_argument('--model-path', default=CLASSIFIER_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args.log_path, args.model_path)
+    else:
+        evaluate(args.log_path, args.model_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", 8))
+
+# Общий ограниченный пул для синхронной работы (БД, redis), чтобы не блокировать event loop бота
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='blocking')
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,227 @@
+import os
+import re
+import typing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EXTRACTOR_MIN_CONFIDENCE = float(os.getenv("EXTRACTOR_MIN_CONFIDENCE", 0.8))
+
+TOKEN = re.compile(r'\d+(?:[.,]\d+)?|[^\W\d_]+|[$€₽]')
+# "150 000" -> "150000"
+DIGIT_GROUPS = re.compile(r'(?<=\d)[  ](?=\d{3}\b)')
+
+UNITS = {
+    'ноль': 0, 'один': 1, 'одна': 1, 'одну': 1, 'два': 2, 'две': 2, 'три': 3, 'четыре': 4, 'пять': 5,
+    'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9, 'десять': 10, 'одиннадцать': 11, 'двенадцать': 12,
+    'тринадцать': 13, 'четырнадцать': 14, 'пятнадцать': 15, 'шестнадцать': 16, 'семнадцать': 17,
+    'восемнадцать': 18, 'девятнадцать': 19, 'двадцать': 20, 'тридцать': 30, 'сорок': 40, 'пятьдесят': 50,
+    'шестьдесят': 60, 'семьдесят': 70, 'восемьдесят': 80, 'девяносто': 90, 'сто': 100, 'двести': 200,
+    'триста': 300, 'четыреста': 400, 'пятьсот': 500, 'шестьсот': 600, 'семьсот': 700, 'восемьсот': 800,
+    'девятьсот': 900, 'полторы': 1.5, 'полтора': 1.5,
+}
+MULTIPLIERS = (
+    (re.compile(r'^(k|к|тыс\w*|тыщ\w*|тысяч\w*|косар\w*|косаря)$'), 1_000),
+    (re.compile(r'^(kk|кк|лям\w*|лимон\w*|млн|миллион\w*)$'), 1_000_000),
+    (re.compile(r'^(млрд|миллиард\w*)$'), 1_000_000_000),
+)
+# Множитель сам по себе тоже число: "погуляли на лям", "косарь на такси"
+STANDALONE_MULTIPLIER = re.compile(r'^(лям\w*|лимон\w*|косар\w*|тыщу|тысячу|миллион)$')
+CURRENCY = re.compile(
+    r'^(руб\w*|р|тенге|тг|kzt|rub|usd|eur|бакс\w*|доллар\w*|евро|\$|€|₽|сом\w*|грн|гривен\w*)$'
+)
+MONEY_PREPOSITIONS = {'за', 'на'}
+UNIT_PRICE_PREPOSITIONS = {'по'}
+STOPWORDS = {
+    'за', 'на', 'по', 'в', 'во', 'и', 'для', 'мне', 'я', 'у', 'с', 'со', 'шт', 'штук', 'штуки', 'каждый',
+    'каждая', 'каждое', 'каждую', 'всего', 'итого', 'сумму', 'сумма', 'общую', 'цене', 'цену', 'а',
+}
+NEGATIONS = {'не', 'нет'}
+INCOME_WORDS = re.compile(
+    r'^(получил\w*|заработал\w*|продал\w*|зарплат\w*|аванс\w*|преми\w*|доход\w*|выиграл\w*|выйграл\w*'
+    r'|нашёл|нашел|нашла|нашли|украл|украла|кэшбэк\w*|кешбек\w*|стипенди\w*|пенси\w*|дивиденд\w*)$'
+)
+EXPENSE_WORDS = re.compile(
+    r'^(купил\w*|потратил\w*|оплатил\w*|заплатил\w*|заказал\w*|отдал\w*|проиграл\w*|украли|штраф\w*)$'
+)
+# Направление подарка, перевода и возврата без контекста не определить: "подарила 100$" vs "подарил маме",
+# "вернули кэшбэк" vs "вернул долг"
+AMBIGUOUS_WORDS = re.compile(r'^(подар\w*|перев[её]л\w*|перевела|перевели|одолжил\w*|занял\w*|вернул\w*)$')
+PAST_VERB = re.compile(r'^[а-яё]{4,}(ил|ал|ял|ел|ил[аи]|ал[аи]|ял[аи]|ел[аи])(сь|ся)?$')
+VERB_ENDING = re.compile(r'(л|ла|ли|ло)$')
+
+
+class ParseResult(typing.NamedTuple):
+    record: dict | None
+    confidence: float
+
+
+class _Number(typing.NamedTuple):
+    start: int
+    end: int
+    value: float
+    has_multiplier: bool
+
+
+def _multiplier(token):
+    for pattern, value in MULTIPLIERS:
+        if pattern.match(token):
+            return value
+    return None
+
+
+def _scan_numbers(tokens):
+    """Find numbers written with digits, suffixes ("2k", "800к", "5 тыс") or Russian words."""
+    numbers = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        start = i
+
+        if token[0].isdigit():
+            value = float(token.replace(',', '.'))
+            i += 1
+            multiplier = _multiplier(tokens[i]) if i < len(tokens) else None
+            if multiplier:
+                value *= multiplier
+                i += 1
+            numbers.append(_Number(start, i, value, bool(multiplier)))
+            continue
+
+        if token in UNITS or STANDALONE_MULTIPLIER.match(token):
+            total = current = 0
+            has_multiplier = False
+            while i < len(tokens):
+                token = tokens[i]
+                if token in UNITS:
+                    current += UNITS[token]
+                elif _multiplier(token) and (current or STANDALONE_MULTIPLIER.match(token)):
+                    total += (current or 1) * _multiplier(token)
+                    current = 0
+                    has_multiplier = True
+                else:
+                    break
+                i += 1
+            numbers.append(_Number(start, i, total + current, has_multiplier))
+            continue
+
+        i += 1
+    return numbers
+
+
+def number_values(text: str) -> typing.Tuple[float, ...]:
+    """All numbers of a message as values, whether written with digits, suffixes or words."""
+    tokens = [word.lower() for word in TOKEN.findall(DIGIT_GROUPS.sub('', text))]
+    return tuple(number.value for number in _scan_numbers(tokens))
+
+
+def _status(tokens):
+    if any(AMBIGUOUS_WORDS.match(token) for token in tokens):
+        return None
+    if any(INCOME_WORDS.match(token) for token in tokens):
+        return 'Income'
+    return 'Expenses'
+
+
+def _product(words, tokens, used):
+    kept = [
+        word for index, (word, token) in enumerate(zip(words, tokens))
+        if index not in used
+        and not CURRENCY.match(token)
+        and not ((INCOME_WORDS.match(token) or EXPENSE_WORDS.match(token)) and VERB_ENDING.search(token))
+    ]
+    while kept and kept[0].lower() in STOPWORDS:
+        kept.pop(0)
+    while kept and kept[-1].lower() in STOPWORDS:
+        kept.pop()
+    if len(kept) > 1 and PAST_VERB.match(kept[0].lower()):
+        kept.pop(0)
+    product = ' '.join(kept)
+    return product[:1].upper() + product[1:]
+
+
+def parse_transaction(text: str) -> ParseResult:
+    """Extract a ``SaveRecordSchema``-compatible record from a short transaction message.
+
+    Follows the rules of the ``create_record`` prompt: quantity defaults to 1, "2k"/"2к"
+    means 2000 and amount = quantity * price. Returns ``record=None`` when there is no
+    amount at all; ``confidence`` is low when the message is ambiguous and should go to the LLM.
+    """
+    words = TOKEN.findall(DIGIT_GROUPS.sub('', text))
+    tokens = [word.lower() for word in words]
+    numbers = _scan_numbers(tokens)
+    if not numbers:
+        return ParseResult(None, 0.0)
+
+    used = set()
+    money, quantities = [], []
+    unit_price = False
+    counted_money = False
+    for number in numbers:
+        before = tokens[number.start - 1] if number.start > 0 else None
+        after = tokens[number.end] if number.end < len(tokens) else None
+        used.update(range(number.start, number.end))
+
+        if before in MONEY_PREPOSITIONS or before in UNIT_PRICE_PREPOSITIONS:
+            used.add(number.start - 1)
+            unit_price = unit_price or before in UNIT_PRICE_PREPOSITIONS
+            # "за 3 месяца": после предлога число, за которым идёт не валюта, а существительное
+            counted_money = counted_money or (
+                not number.has_multiplier and after is not None and not after[0].isdigit()
+                and after not in STOPWORDS and not CURRENCY.match(after)
+            )
+            money.append(number)
+        elif number.has_multiplier or (after is not None and CURRENCY.match(after)):
+            money.append(number)
+        elif after is not None and not after[0].isdigit() and after not in STOPWORDS:
+            quantities.append(number)
+        else:
+            money.append(number)
+
+    confidence = 0.95
+    if NEGATIONS.intersection(tokens):
+        confidence = 0.3
+    if counted_money:
+        confidence = min(confidence, 0.4)
+    if len(money) != 1 or len(quantities) > 1:
+        if not money and len(quantities) == 1:
+            # "Купил 5 яблок", "за 3 месяца": число перед существительным скорее количество, чем сумма
+            money, quantities = quantities, []
+            confidence = min(confidence, 0.4)
+        else:
+            confidence = min(confidence, 0.4)
+    if not money:
+        return ParseResult(None, 0.0)
+
+    value = money[0].value
+    quantity = quantities[0].value if quantities else 1
+    if quantity != int(quantity) or quantity <= 0:
+        confidence = min(confidence, 0.4)
+    quantity = int(quantity) or 1
+
+    if unit_price:
+        price, amount = value, value * quantity
+    else:
+        amount = value
+        price = value / quantity
+        if price != int(price):
+            confidence = min(confidence, 0.5)
+
+    status = _status(tokens)
+    if status is None:
+        confidence = min(confidence, 0.4)
+        status = 'Expenses'
+
+    product = _product(words, tokens, used)
+    if not product:
+        confidence = min(confidence, 0.3)
+
+    record = {
+        'product': product,
+        'price': int(round(price)),
+        'quantity': quantity,
+        'status': status,
+        'amount': int(round(amount)),
+    }
+    return ParseResult(record, confidence)
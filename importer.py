@@ -0,0 +1,465 @@
+import asyncio
+import codecs
+import collections
+import csv
+import datetime
+import functools
+import io
+import itertools
+import logging
+import os
+import typing
+import uuid
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+from telebot import types
+
+from cache import report_cache
+from executor import run_blocking
+from extractor import EXTRACTOR_MIN_CONFIDENCE, parse_transaction
+from models import AsyncSession, FinancialRecord, LOCAL_TZ, TIMESTAMP_FORMAT, utcnow
+from pipeline import message_analyzer
+from sessions import SessionRegistry, callback_dispatcher
+from summaries import upsert_summaries
+from telemetry import register_stats, span
+
+load_dotenv()
+
+# Сколько строк разбирается за один заход в пул потоков
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+# Сколько строк одной выписки одновременно ждут LLM (общий лимит всё равно держит llm_gate)
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", 8))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 100000))
+# Telegram отдаёт ботам файлы не больше 20 МБ
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 20 * 1024 * 1024))
+IMPORT_INSERT_CHUNK = int(os.getenv("IMPORT_INSERT_CHUNK", 5000))
+# Сколько разобранная выписка ждёт подтверждения
+IMPORT_PENDING_TTL = int(os.getenv("IMPORT_PENDING_TTL", 900))
+
+HELP_TEXT = ("Пришлите выписку файлом (CSV или XLSX с колонками даты, описания и суммы) "
+             "или вставьте список операций после команды: /import, затем по операции в строке.")
+PARSING_TEXT = "Разбираю выписку…"
+EMPTY_TEXT = "Не нашёл в файле ни одной операции."
+TOO_LARGE_TEXT = "Файл слишком большой, разбейте выписку на несколько частей."
+EXPIRED_TEXT = "Импорт устарел, пришлите выписку ещё раз."
+CANCELLED_TEXT = "Импорт отменён."
+FAILED_TEXT = "Не удалось сохранить операции, попробуйте позже."
+
+DATE_COLUMNS = ('дата', 'date', 'transaction date', 'posting date')
+TEXT_COLUMNS = ('описание', 'назначение', 'контрагент', 'категория', 'description', 'merchant', 'payee',
+                'category', 'details')
+AMOUNT_COLUMNS = ('сумма', 'amount', 'sum')
+DATE_FORMATS = ('%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y', '%d.%m.%y', '%Y-%m-%d %H:%M:%S',
+                '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%d/%m/%Y')
+SPACES = str.maketrans('', '', ' \u00a0\u202f')
+
+COPY_COLUMNS = ('message_id', 'user_id', 'username', 'user_message', 'product', 'price', 'quantity',
+                'status', 'amount', 'timestamp', 'ts')
+
+import_stats = collections.Counter(dict.fromkeys(
+    ('files', 'rows', 'local', 'llm', 'unrecognized', 'saved', 'cancelled', 'expired', 'failed'), 0
+))
+register_stats('imports', lambda: import_stats)
+
+logger = logging.getLogger(__name__)
+
+
+class StatementRow(typing.NamedTuple):
+    line: int
+    text: str
+    record: dict | None
+    ts: datetime.datetime | None
+
+
+def _column(header, names):
+    for index, cell in enumerate(header):
+        if any(cell.startswith(name) for name in names):
+            return index
+    return None
+
+
+def _parse_amount(value) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value or '').lower().translate(SPACES).replace('−', '-').replace(',', '.')
+    value = value.rstrip('₽$€').removesuffix('руб.').removesuffix('руб').removesuffix('rub')
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_date(value) -> datetime.datetime | None:
+    if isinstance(value, datetime.datetime):
+        ts = value
+    elif isinstance(value, datetime.date):
+        ts = datetime.datetime(value.year, value.month, value.day)
+    else:
+        value = str(value or '').strip()
+        for date_format in DATE_FORMATS:
+            try:
+                ts = datetime.datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    # в выписках время местное
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=LOCAL_TZ)
+
+
+def _text_encoding(fileobj) -> str:
+    sample = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample)
+    except UnicodeDecodeError:
+        # выгрузки российских банков часто в windows-1251
+        return 'cp1251'
+    return 'utf-8-sig'
+
+
+def _csv_rows(fileobj) -> typing.Iterator[list]:
+    text = io.TextIOWrapper(fileobj, encoding=_text_encoding(fileobj), newline='')
+    sample = text.read(16 * 1024)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _xlsx_rows(fileobj) -> typing.Iterator[list]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError('Для импорта XLSX нужен пакет openpyxl, пришлите выписку в CSV')
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ['' if cell is None else cell for cell in row]
+    finally:
+        workbook.close()
+
+
+def _text_rows(fileobj) -> typing.Iterator[list]:
+    for line in io.TextIOWrapper(fileobj, encoding=_text_encoding(fileobj)):
+        yield [line.strip()]
+
+
+def iter_table(fileobj, filename: str) -> typing.Iterator[list]:
+    """Rows of an uploaded file, read lazily: CSV, XLSX or a plain list with one operation per line."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return _xlsx_rows(fileobj)
+    if extension in ('.csv', '.tsv'):
+        return _csv_rows(fileobj)
+    return _text_rows(fileobj)
+
+
+def _cell(row, index):
+    return row[index] if index is not None and index < len(row) else ''
+
+
+def _local_row(line: int, text: str, ts=None) -> StatementRow:
+    record, confidence = parse_transaction(text)
+    if record is None or confidence < EXTRACTOR_MIN_CONFIDENCE:
+        record = None
+    return StatementRow(line, text, record, ts)
+
+
+def iter_statement(fileobj, filename: str) -> typing.Iterator[StatementRow]:
+    """Statement rows with the record already filled in when it can be read without the LLM.
+
+    A header with an amount column makes it a bank export: the sign of the amount
+    gives the status and the description becomes the product. Other rows, and
+    every line of a plain list, go through the local parser; ``record=None``
+    leaves the row to the LLM.
+    """
+    rows = iter_table(fileobj, filename)
+    first = next(rows, None)
+    if first is None:
+        return
+    header = [str(cell).strip().lower() for cell in first]
+    amount_column = _column(header, AMOUNT_COLUMNS)
+    if amount_column is None:
+        rows = itertools.chain([first], rows)
+        for line, row in enumerate(rows, 1):
+            text = ' '.join(str(cell).strip() for cell in row if str(cell).strip())
+            if text:
+                yield _local_row(line, text)
+        return
+
+    date_column = _column(header, DATE_COLUMNS)
+    text_column = _column(header, TEXT_COLUMNS)
+    for line, row in enumerate(rows, 2):
+        if not any(str(cell).strip() for cell in row):
+            continue
+        ts = _parse_date(_cell(row, date_column))
+        product = str(_cell(row, text_column)).strip()
+        amount = _parse_amount(_cell(row, amount_column))
+        text = ' '.join(str(value).strip() for index, value in enumerate(row)
+                        if index != date_column and str(value).strip())
+        if amount is None or not amount or not product:
+            yield _local_row(line, text, ts)
+            continue
+        value = round(abs(amount))
+        record = {'product': product[:200], 'quantity': 1, 'price': value,
+                  'status': 'Expenses' if amount < 0 else 'Income', 'amount': value}
+        yield StatementRow(line, text, record, ts)
+
+
+class StatementImport:
+    """An extracted statement waiting for one approval, then written in a single transaction."""
+
+    def __init__(self, user_id, username=None, source=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.username = username
+        self.source = source
+        self.records = []
+        self.unrecognized = []
+        self.local = 0
+        self.llm = 0
+
+    def add(self, row: StatementRow, record: dict):
+        # ts хранится в UTC, как у записей из чата
+        ts = row.ts.astimezone(datetime.timezone.utc) if row.ts is not None else utcnow()
+        self.records.append({
+            'message_id': uuid.uuid4(),
+            'user_id': self.user_id,
+            'username': self.username,
+            'user_message': row.text,
+            'product': record['product'],
+            'price': record['price'],
+            'quantity': record['quantity'],
+            'status': record['status'],
+            'amount': record['amount'],
+            'timestamp': ts.astimezone(LOCAL_TZ).strftime(TIMESTAMP_FORMAT),
+            'ts': ts,
+        })
+
+    def summary(self) -> dict:
+        totals = collections.Counter()
+        for record in self.records:
+            totals[record['status']] += record['amount'] or 0
+        dates = [record['ts'] for record in self.records]
+        return {
+            'import_id': self.id,
+            'records': len(self.records),
+            'expenses': totals['Expenses'],
+            'income': totals['Income'],
+            'first_date': min(dates).astimezone(LOCAL_TZ).date().isoformat() if dates else None,
+            'last_date': max(dates).astimezone(LOCAL_TZ).date().isoformat() if dates else None,
+            'local': self.local,
+            'llm': self.llm,
+            'unrecognized': len(self.unrecognized),
+            'unrecognized_lines': self.unrecognized[:20],
+        }
+
+    def summary_text(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"Найдено операций: {summary['records']}",
+            f"Расходы: {summary['expenses']:,}".replace(',', ' '),
+            f"Доходы: {summary['income']:,}".replace(',', ' '),
+        ]
+        if summary['first_date']:
+            lines.append(f"Период: {summary['first_date']} — {summary['last_date']}")
+        if summary['unrecognized']:
+            lines.append(f"Не распознаны строки: {', '.join(map(str, summary['unrecognized_lines']))}"
+                         + ('…' if summary['unrecognized'] > 20 else ''))
+        lines.append('Сохранить все операции?')
+        return '\n'.join(lines)
+
+
+async def extract_statement(
+    fileobj,
+    filename: str,
+    user_id,
+    username=None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    concurrency: int = IMPORT_CONCURRENCY,
+    max_rows: int = IMPORT_MAX_ROWS,
+) -> StatementImport:
+    """Parse the file in batches off the event loop; rows the local parser can't read go to
+    ``message_analyzer`` concurrently, at most ``concurrency`` at a time.
+
+    Raises ValueError for files that can't be imported (too many rows, XLSX without openpyxl).
+    """
+    statement = StatementImport(user_id, username, filename)
+    semaphore = asyncio.Semaphore(concurrency)
+    rows = iter_statement(fileobj, filename)
+    parsed = []
+    answers = {}
+
+    async def analyze(row):
+        try:
+            analysis = await message_analyzer.analyze(row.text)
+        finally:
+            semaphore.release()
+        return analysis.record if analysis is not None else None
+
+    with span('import.extract', source=filename) as current:
+        import_stats['files'] += 1
+        try:
+            while True:
+                batch = await run_blocking(list, itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                parsed.extend(batch)
+                if len(parsed) > max_rows:
+                    raise ValueError(f'В выписке больше {max_rows} строк, разбейте её на части')
+                for row in batch:
+                    if row.record is None:
+                        # не ждём конца пачки: разбор идёт дальше, пока LLM отвечает на прошлые строки
+                        await semaphore.acquire()
+                        answers[row.line] = asyncio.create_task(analyze(row))
+            await asyncio.gather(*answers.values())
+        finally:
+            for task in answers.values():
+                task.cancel()
+
+        for row in parsed:
+            record = row.record or (answers[row.line].result() if row.line in answers else None)
+            if record is None:
+                statement.unrecognized.append(row.line)
+                continue
+            statement.add(row, record)
+        statement.llm = len(answers)
+        statement.local = len(parsed) - statement.llm
+
+        import_stats['rows'] += len(parsed)
+        import_stats['local'] += statement.local
+        import_stats['llm'] += statement.llm
+        import_stats['unrecognized'] += len(statement.unrecognized)
+        current.set_attribute('rows', len(parsed))
+        current.set_attribute('llm', statement.llm)
+    return statement
+
+
+async def write_records(rows: list[dict], session_factory=AsyncSession, chunk: int = IMPORT_INSERT_CHUNK) -> int:
+    """All rows and their monthly summaries in one transaction; ``COPY`` on PostgreSQL (asyncpg)."""
+    if not rows:
+        return 0
+    with span('db.import_records', rows=len(rows)):
+        async with session_factory() as session:
+            connection = await session.connection()
+            dialect = connection.dialect
+            # сводки пишутся первыми: этот запрос открывает транзакцию, к которой присоединяется COPY
+            summaries = upsert_summaries(dialect.name, rows)
+            if summaries is not None:
+                await session.execute(summaries)
+            if dialect.name == 'postgresql' and dialect.driver == 'asyncpg':
+                raw = await connection.get_raw_connection()
+                await raw.driver_connection.copy_records_to_table(
+                    FinancialRecord.__tablename__,
+                    records=[tuple(row[column] for column in COPY_COLUMNS) for row in rows],
+                    columns=COPY_COLUMNS,
+                )
+            else:
+                for offset in range(0, len(rows), chunk):
+                    await session.execute(insert(FinancialRecord), rows[offset:offset + chunk])
+            await session.commit()
+    await report_cache.invalidate(*{row['user_id'] for row in rows})
+    return len(rows)
+
+
+def _on_expired(import_id, statement):
+    import_stats['expired'] += 1
+
+
+pending_imports = SessionRegistry(ttl=IMPORT_PENDING_TTL, on_evict=_on_expired)
+
+
+async def confirm_import(import_id: str) -> int | None:
+    """Write a pending import; None if it has expired."""
+    statement = pending_imports.get(import_id)
+    if statement is None:
+        return None
+    pending_imports.pop(import_id)
+    try:
+        saved = await write_records(statement.records)
+    except Exception:
+        import_stats['failed'] += 1
+        raise
+    import_stats['saved'] += saved
+    return saved
+
+
+def cancel_import(import_id: str) -> bool:
+    if pending_imports.get(import_id) is None:
+        return False
+    pending_imports.pop(import_id)
+    import_stats['cancelled'] += 1
+    return True
+
+
+class StatementImporter:
+    """``/import`` in Telegram: a document or a pasted list, one approval for the whole statement."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def _read(self, message) -> tuple[bytes, str] | None:
+        if message.document is not None:
+            if (message.document.file_size or 0) > IMPORT_MAX_BYTES:
+                await self.bot.reply_to(message, TOO_LARGE_TEXT)
+                return None
+            file_info = await self.bot.get_file(message.document.file_id)
+            return await self.bot.download_file(file_info.file_path), message.document.file_name
+        # /import и список операций в том же сообщении
+        _, _, text = (message.text or '').partition('\n')
+        if not text.strip():
+            _, _, text = (message.text or '').partition(' ')
+        if not text.strip():
+            await self.bot.reply_to(message, HELP_TEXT)
+            return None
+        return text.encode('utf-8'), 'import.txt'
+
+    async def submit(self, message):
+        upload = await self._read(message)
+        if upload is None:
+            return
+        data, filename = upload
+        await self.bot.reply_to(message, PARSING_TEXT)
+        try:
+            statement = await extract_statement(
+                io.BytesIO(data), filename, message.from_user.id, message.from_user.username
+            )
+        except ValueError as error:
+            await self.bot.reply_to(message, str(error))
+            return
+        if not statement.records:
+            await self.bot.reply_to(message, EMPTY_TEXT)
+            return
+
+        pending_imports.put(statement.id, statement)
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton(text='Yes', callback_data='yes'),
+                   types.InlineKeyboardButton(text='No', callback_data='no'))
+        question = await self.bot.send_message(message.chat.id, statement.summary_text(), reply_markup=markup)
+        callback_dispatcher.register(question, functools.partial(self._answer, statement.id),
+                                     on_expire=functools.partial(cancel_import, statement.id))
+
+    async def _answer(self, import_id, call):
+        callback_dispatcher.unregister(call.message)
+        chat_id = call.message.chat.id
+        await self.bot.edit_message_reply_markup(chat_id=chat_id, message_id=call.message.message_id,
+                                                 reply_markup=None)
+        if call.data != 'yes':
+            cancel_import(import_id)
+            await self.bot.send_message(chat_id, CANCELLED_TEXT)
+            return
+        try:
+            saved = await confirm_import(import_id)
+        except Exception as error:
+            logger.exception('Import %s failed: %r', import_id, error)
+            await self.bot.send_message(chat_id, FAILED_TEXT)
+            return
+        if saved is None:
+            await self.bot.send_message(chat_id, EXPIRED_TEXT)
+            return
+        await self.bot.send_message(chat_id, f'Сохранено операций: {saved}')
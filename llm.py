@@ -0,0 +1,99 @@
+import asyncio
+import functools
+import os
+import typing
+
+import aiohttp
+import openai
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from telemetry import register_stats, span
+
+if typing.TYPE_CHECKING:
+    from langchain.chat_models import ChatOpenAI
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-1106-preview")
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", 20))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 16))
+# Подробный вывод langchain (промпты и шаги агента) в stdout
+LLM_VERBOSE = os.getenv("LLM_VERBOSE", "false").lower() in ("1", "true", "yes")
+# langchain не импортируется при старте; после запуска его можно догрузить в фоне
+LLM_PRELOAD = os.getenv("LLM_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+
+def configure_http_pool(pool_size: int = OPENAI_POOL_SIZE) -> requests.Session:
+    """Make every sync OpenAI request reuse one pooled keep-alive session."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    openai.requestssession = session
+    return session
+
+
+async def open_async_http_pool(pool_size: int = OPENAI_POOL_SIZE) -> aiohttp.ClientSession:
+    """Same for async requests. Must run inside the event loop before tasks are spawned,
+    ``openai.aiosession`` is a ContextVar and tasks inherit it on creation."""
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+    )
+    openai.aiosession.set(session)
+    return session
+
+
+class LLMGate:
+    """Caps concurrent LLM requests; ``waiting`` tells how far behind the LLM is."""
+
+    def __init__(self, limit: int = LLM_CONCURRENCY):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            with span('llm.gate_wait'):
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> dict:
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting}
+
+
+llm_gate = LLMGate()
+register_stats('llm_gate', llm_gate.metrics)
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm(temperature: float = 0.8, verbose: bool = False, streaming: bool = False) -> 'ChatOpenAI':
+    # langchain грузится при первом обращении к LLM, а не при старте сервиса
+    from chat_model import GatedChatOpenAI
+
+    return GatedChatOpenAI(
+        model_name=OPENAI_MODEL,
+        openai_api_key=OPENAI_API_KEY,
+        temperature=temperature,
+        verbose=verbose,
+        streaming=streaming,
+    )
+
+
+def preload_langchain():
+    """Import langchain ahead of the first message; services run this in a thread after startup."""
+    if LLM_PRELOAD:
+        import chat_model  # noqa: F401
+        from langchain.prompts import PromptTemplate  # noqa: F401
+        from langchain.schema import HumanMessage  # noqa: F401
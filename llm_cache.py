@@ -0,0 +1,181 @@
+import collections
+import hashlib
+import os
+import re
+import typing
+
+import numpy as np
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from extractor import number_values
+from telemetry import instrument_redis, register_stats
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+load_dotenv()
+
+REDIS_HOST = os.getenv("REDIS_HOST")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_THRESHOLD = float(os.getenv("LLM_CACHE_THRESHOLD", 0.85))
+LLM_CACHE_SEMANTIC_SIZE = int(os.getenv("LLM_CACHE_SEMANTIC_SIZE", 20000))
+LLM_CACHE_DIM = 512
+
+PUNCTUATION = re.compile(r'[^\w\s]+')
+SPACES = re.compile(r'\s+')
+# "2 000" -> "2000", как в extractor
+DIGIT_GROUPS = re.compile(r'(?<=\d)\s(?=\d{3}\b)')
+
+
+def normalize(text: str) -> str:
+    text = DIGIT_GROUPS.sub('', text.lower().replace('ё', 'е'))
+    return SPACES.sub(' ', PUNCTUATION.sub(' ', text)).strip()
+
+
+def embed(text: str, dim: int = LLM_CACHE_DIM) -> np.ndarray:
+    """Hashed character 3-gram vector of a normalized text, L2-normalized."""
+    padded = f' {text} '
+    vector = np.zeros(dim, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        digest = hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, 'little') % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticIndex:
+    """In-process nearest-neighbour index over normalized texts of one namespace.
+
+    Uses faiss ``IndexFlatIP`` when faiss is installed and a numpy matrix otherwise;
+    vectors are normalized, so the inner product is the cosine similarity. A hit
+    also needs the same numbers as the cached text: "Такси за 2000" must never
+    reuse the answer for "Такси за 3000". When full, the older half is dropped.
+    """
+
+    def __init__(self, threshold: float = LLM_CACHE_THRESHOLD, maxsize: int = LLM_CACHE_SEMANTIC_SIZE,
+                 dim: int = LLM_CACHE_DIM):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.dim = dim
+        self._vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self._entries = []
+        self._faiss = faiss.IndexFlatIP(dim) if faiss is not None else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, text: str) -> str | None:
+        if not self._entries:
+            return None
+        query = embed(text, self.dim)
+        if self._faiss is not None:
+            scores, indices = self._faiss.search(query[None, :], 1)
+            score, index = float(scores[0][0]), int(indices[0][0])
+        else:
+            scores = self._vectors[:len(self._entries)] @ query
+            index = int(np.argmax(scores))
+            score = float(scores[index])
+        if score < self.threshold:
+            return None
+        numbers, value = self._entries[index]
+        return value if numbers == number_values(text) else None
+
+    def add(self, text: str, value: str):
+        if len(self._entries) >= self.maxsize:
+            keep = self.maxsize // 2
+            self._vectors[:keep] = self._vectors[-keep:]
+            self._entries = self._entries[-keep:]
+            if self._faiss is not None:
+                self._faiss.reset()
+                self._faiss.add(self._vectors[:keep])
+        vector = embed(text, self.dim)
+        self._vectors[len(self._entries)] = vector
+        self._entries.append((number_values(text), value))
+        if self._faiss is not None:
+            self._faiss.add(vector[None, :])
+
+
+class LLMCache:
+    """Cache of raw LLM answers keyed by the normalized user message.
+
+    The exact tier lives in Redis (``llm:{namespace}:{hash}`` with a TTL) and is
+    shared by all processes. The optional semantic tier is a per-process
+    ``SemanticIndex`` that catches near-duplicates with the same numbers.
+    Redis errors only disable the exact tier.
+    """
+
+    def __init__(self, client, ttl: int = LLM_CACHE_TTL, semantic: bool = LLM_CACHE_SEMANTIC,
+                 threshold: float = LLM_CACHE_THRESHOLD, prefix: str = 'llm:'):
+        self.client = client
+        self.ttl = ttl
+        self.semantic = semantic
+        self.threshold = threshold
+        self.prefix = prefix
+        self._indexes = {}
+        self.stats = collections.Counter(dict.fromkeys(
+            ('exact_hits', 'semantic_hits', 'misses', 'errors'), 0
+        ))
+
+    def key(self, namespace: str, text: str) -> str:
+        digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        return f'{self.prefix}{namespace}:{digest}'
+
+    def _index(self, namespace: str) -> SemanticIndex:
+        index = self._indexes.get(namespace)
+        if index is None:
+            index = self._indexes[namespace] = SemanticIndex(self.threshold)
+        return index
+
+    async def get(self, namespace: str, text: str) -> str | None:
+        text = normalize(text)
+        try:
+            value = await self.client.get(self.key(namespace, text))
+        except redis.RedisError:
+            self.stats['errors'] += 1
+            value = None
+        if value is not None:
+            self.stats['exact_hits'] += 1
+            return value.decode()
+
+        if self.semantic:
+            value = self._index(namespace).search(text)
+            if value is not None:
+                self.stats['semantic_hits'] += 1
+                return value
+
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, namespace: str, text: str, value: str):
+        text = normalize(text)
+        try:
+            await self.client.set(self.key(namespace, text), value, ex=self.ttl)
+        except redis.RedisError:
+            self.stats['errors'] += 1
+        if self.semantic:
+            self._index(namespace).add(text, value)
+
+    async def cached(self, namespace: str, text: str, call: typing.Callable[[], typing.Awaitable[str]]) -> str:
+        """Answer for ``text`` from the cache, or from ``call()`` stored for next time."""
+        value = await self.get(namespace, text)
+        if value is None:
+            value = await call()
+            await self.set(namespace, text, value)
+        return value
+
+    def metrics(self) -> dict:
+        hits = self.stats['exact_hits'] + self.stats['semantic_hits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'semantic_size': sum(len(index) for index in self._indexes.values()),
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+llm_cache = LLMCache(instrument_redis(redis.StrictRedis(host=REDIS_HOST, port=6379, db=0)))
+register_stats('llm_cache', llm_cache.metrics)
@@ -0,0 +1,83 @@
+import argparse
+
+from sqlalchemy import bindparam, select, text, update
+
+from models import FinancialRecord, MonthlySummary, init, parse_timestamp
+from summaries import rebuild
+
+
+def add_ts_column(conn):
+    """Add the ``ts`` column and the ``(user_id, ts)`` index to an existing table.
+
+    ``create_all`` only creates missing tables, so databases created before the
+    column existed have to be altered explicitly.
+    """
+    conn.execute(text("ALTER TABLE financial_records ADD COLUMN IF NOT EXISTS ts TIMESTAMP WITH TIME ZONE"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_financial_records_user_id_ts ON financial_records (user_id, ts)"
+    ))
+
+
+def backfill_ts(batch_size=5000):
+    """Fill ``ts`` from the legacy ``timestamp`` string in keyset-ordered batches.
+
+    Every batch is committed separately so the table is never locked for the
+    whole run and an interrupted backfill can simply be restarted.
+    """
+    table = FinancialRecord.__table__
+    stmt = (
+        update(table)
+        .where(table.c.message_id == bindparam('b_message_id'))
+        .values(ts=bindparam('b_ts'))
+    )
+    last_id = None
+    updated = skipped = 0
+
+    while True:
+        query = (
+            select(table.c.message_id, table.c.timestamp)
+            .where(table.c.ts.is_(None))
+            .order_by(table.c.message_id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(table.c.message_id > last_id)
+
+        with init(create_schema=False).begin() as conn:
+            rows = conn.execute(query).all()
+            if not rows:
+                break
+
+            params = []
+            for message_id, timestamp in rows:
+                try:
+                    params.append({'b_message_id': message_id, 'b_ts': parse_timestamp(timestamp)})
+                except (TypeError, ValueError):
+                    skipped += 1
+            if params:
+                conn.execute(stmt, params)
+
+        updated += len(params)
+        last_id = rows[-1].message_id
+        print(f'backfill_ts: {updated} rows updated, {skipped} skipped')
+
+    return updated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Schema migrations for financial_records')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--skip-summaries', action='store_true', help='do not rebuild monthly_summaries')
+    args = parser.parse_args()
+
+    with init(create_schema=False).begin() as conn:
+        add_ts_column(conn)
+        MonthlySummary.__table__.create(conn, checkfirst=True)
+    backfill_ts(batch_size=args.batch_size)
+    # итоги отчётов читаются только из monthly_summaries: без пересборки старые записи в них не попадут
+    if not args.skip_summaries:
+        rebuild()
+
+
+if __name__ == '__main__':
+    main()
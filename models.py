@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, BigInteger, Column, Date, Integer, String, DateTime, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
@@ -7,15 +9,59 @@ import os
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
+from telemetry import instrument_engine
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+# На проде схему ведут миграции, тогда create_all при старте можно выключить
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "true").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+# Пользователи бота живут в UTC+6, строковый timestamp всегда записывался в этом поясе
+LOCAL_TZ = datetime.timezone(datetime.timedelta(hours=6))
+TIMESTAMP_FORMAT = '%d-%m-%y %H:%M'
 
 Base = declarative_base()
 
 
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def month_range(year, month):
+    """Return [start, end) of a local calendar month as aware datetimes."""
+    start = datetime.datetime(year, month, 1, tzinfo=LOCAL_TZ)
+    if month == 12:
+        end = datetime.datetime(year + 1, 1, 1, tzinfo=LOCAL_TZ)
+    else:
+        end = datetime.datetime(year, month + 1, 1, tzinfo=LOCAL_TZ)
+    return start, end
+
+
+def month_start(ts):
+    """First day of the local calendar month ``ts`` falls into; naive values are UTC."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=datetime.timezone.utc)
+    return ts.astimezone(LOCAL_TZ).date().replace(day=1)
+
+
+def parse_timestamp(value):
+    """Parse the legacy ``timestamp`` string into an aware datetime."""
+    return datetime.datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=LOCAL_TZ)
+
+
 class FinancialRecord(Base):
     __tablename__ = 'financial_records'
+    __table_args__ = (
+        Index('ix_financial_records_user_id_ts', 'user_id', 'ts'),
+    )
 
     message_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     user_id = Column(Integer)
@@ -29,9 +75,74 @@ class FinancialRecord(Base):
     timestamp = Column(String, default=lambda: (
             datetime.datetime.utcnow() + datetime.timedelta(hours=6)
     ).strftime('%d-%m-%y %H:%M'))
+    ts = Column(DateTime(timezone=True), default=utcnow)
+
+
+class MonthlySummary(Base):
+    """Per user, local month and status totals, maintained incrementally by ``summaries.py``."""
+    __tablename__ = 'monthly_summaries'
+
+    user_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    total = Column(BigInteger, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def async_database_url(url):
+    """Same database, async driver: postgresql[+psycopg2]:// -> postgresql+asyncpg://."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    return url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+
+
+def pool_options(url):
+    # SQLite (локальные бенчмарки) работает без пула соединений
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+Session = sessionmaker()
+AsyncSession = async_sessionmaker(expire_on_commit=False)
+
+_engines = {}
+
+
+def init(create_schema: bool = DB_CREATE_SCHEMA):
+    """Create the engines and bind ``Session``/``AsyncSession`` to them; repeated calls are no-ops.
 
+    Importing this module does not touch the database: services call ``init`` on
+    startup, report workers before their first query. ``create_schema`` runs
+    ``create_all`` once per process.
+    """
+    if not _engines:
+        engine = instrument_engine(create_engine(DATABASE_URL, echo=SQL_ECHO, pool_pre_ping=True))
+        # Общий пул соединений для бота и сервиса отчётов, все запросы на горячем пути идут через него
+        async_engine = create_async_engine(
+            async_database_url(DATABASE_URL),
+            echo=SQL_ECHO,
+            pool_pre_ping=True,
+            **pool_options(DATABASE_URL),
+        )
+        instrument_engine(async_engine.sync_engine)
+        Session.configure(bind=engine)
+        AsyncSession.configure(bind=async_engine)
+        _engines.update(engine=engine, async_engine=async_engine, schema=False)
+    if create_schema and not _engines['schema']:
+        Base.metadata.create_all(bind=_engines['engine'])
+        _engines['schema'] = True
+    return _engines['engine']
 
-engine = create_engine(DATABASE_URL, echo=True)
-Base.metadata.create_all(bind=engine)
 
-Session = sessionmaker(bind=engine)
+def __getattr__(name):
+    # скрипты и бенчмарки по-прежнему пишут ``from models import engine``
+    if name in ('engine', 'async_engine'):
+        init()
+        return _engines[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
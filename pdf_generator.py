@@ -1,46 +1,168 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from models import FinancialRecord, Session
+import collections
+import io
+import itertools
+import os
 
+from dotenv import load_dotenv
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from sqlalchemy import select
+
+from models import FinancialRecord, LOCAL_TZ, Session
+
+load_dotenv()
+
+# Моноширинный шрифт с кириллицей; по умолчанию DejaVu Sans Mono из поставки matplotlib
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH")
+PDF_FONT_BOLD_PATH = os.getenv("PDF_FONT_BOLD_PATH")
+PDF_FETCH_SIZE = int(os.getenv("PDF_FETCH_SIZE", 2000))
+
+FONT = 'ReportMono'
+FONT_BOLD = 'ReportMono-Bold'
+FONT_SIZE = 7.5
+ROW_HEIGHT = 10
+MARGIN = 30
+PAGE_SIZE = landscape(A4)
+
+# (заголовок, ширина в символах, выравнивание по правому краю)
+COLUMNS = (
+    ('Username', 14, False),
+    ('User Message', 48, False),
+    ('Product', 28, False),
+    ('Price', 11, True),
+    ('Quantity', 8, True),
+    ('Status', 9, False),
+    ('Amount', 12, True),
+    ('Timestamp', 14, False),
+)
+
+
+def register_fonts():
+    if FONT in pdfmetrics.getRegisteredFontNames():
+        return
+    regular, bold = PDF_FONT_PATH, PDF_FONT_BOLD_PATH
+    if regular is None or bold is None:
+        import matplotlib
+
+        fonts = os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf')
+        regular = regular or os.path.join(fonts, 'DejaVuSansMono.ttf')
+        bold = bold or os.path.join(fonts, 'DejaVuSansMono-Bold.ttf')
+    pdfmetrics.registerFont(TTFont(FONT, regular))
+    pdfmetrics.registerFont(TTFont(FONT_BOLD, bold))
+
+
+class PDFReport:
+    """Streams table rows onto as many landscape A4 pages as they need.
+
+    With a monospaced font a table row is a single padded string, so each page is
+    one text object with a line per row and truncation is plain string slicing.
+    Only the current page is held in Python; finished pages are compressed as
+    they are closed.
+    """
+
+    def __init__(self, output, title):
+        register_fonts()
+        self.canvas = canvas.Canvas(output, pagesize=PAGE_SIZE, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.title = title
+        self.text = None
+        self.lines_left = 0
+        self.page = 0
+        self.rows = 0
+        self.totals = collections.Counter()
 
-class PDFGenerator:
     @staticmethod
-    def generate_pdf_report(user_id):
-        session = Session()
-        financial_records = session.query(FinancialRecord).filter_by(user_id=user_id).all()
+    def _line(values):
+        cells = []
+        for value, (_, width, right) in zip(values, COLUMNS):
+            text = '' if value is None else str(value).replace('\n', ' ')
+            if len(text) > width:
+                text = text[:width - 1] + '…'
+            cells.append(text.rjust(width) if right else text.ljust(width))
+        return ' '.join(cells)
+
+    def _end_page(self):
+        if self.text is not None:
+            self.canvas.drawText(self.text)
+            self.canvas.showPage()
+            self.text = None
+
+    def _start_page(self):
+        self._end_page()
+        self.page += 1
+        width, height = PAGE_SIZE
+        self.canvas.setFont(FONT_BOLD, FONT_SIZE + 2)
+        self.canvas.drawString(MARGIN, height - MARGIN, self.title)
+        self.canvas.setFont(FONT, FONT_SIZE)
+        self.canvas.drawRightString(width - MARGIN, MARGIN / 2, f'Страница {self.page}')
 
-        if not financial_records:
-            session.close()
-            return "No financial records found for the specified user."
+        top = height - MARGIN - 2 * ROW_HEIGHT
+        self.canvas.setFont(FONT_BOLD, FONT_SIZE)
+        self.canvas.drawString(MARGIN, top, self._line(header for header, _, _ in COLUMNS))
+        self.canvas.line(MARGIN, top - 3, width - MARGIN, top - 3)
 
-        data = []
-        for record in financial_records:
-            data.append([record.username, record.user_message, record.product, record.price,
-                         record.quantity, record.status, record.amount, record.timestamp])
+        self.text = self.canvas.beginText(MARGIN, top - ROW_HEIGHT)
+        self.text.setFont(FONT, FONT_SIZE, leading=ROW_HEIGHT)
+        self.lines_left = int((top - ROW_HEIGHT - MARGIN) // ROW_HEIGHT) + 1
 
-        df = pd.DataFrame(data, columns=["Username", "User Message", "Product", "Price",
-                                         "Quantity", "Status", "Amount", "Timestamp"])
+    def add_row(self, row):
+        if self.lines_left == 0:
+            self._start_page()
+        self.text.textLine(self._line(row))
+        self.lines_left -= 1
+        self.rows += 1
+        self.totals[row[5]] += row[6] or 0
 
-        pdf_filename = f"financial_report_user_{user_id}.pdf"
+    def finish(self):
+        if self.lines_left < 3:
+            self._start_page()
+        self.text.setFont(FONT_BOLD, FONT_SIZE, leading=ROW_HEIGHT)
+        self.text.textLine('')
+        self.text.textLine(f'Записей: {self.rows}')
+        for status, total in sorted(self.totals.items(), key=lambda item: str(item[0])):
+            self.text.textLine(f'{status}: {total}')
+        self.canvas.drawText(self.text)
+        self.canvas.save()
 
-        fig, ax = plt.subplots(figsize=(10, 6))
 
-        ax.axis('off')
+def render_pdf(rows, output, title='Financial Report'):
+    """Render an iterable of ``COLUMNS``-ordered tuples into ``output``; returns the row count."""
+    report = PDFReport(output, title)
+    for row in rows:
+        report.add_row(row)
+    report.finish()
+    return report.rows
 
-        header = ["Username", "User Message", "Product", "Price",
-                  "Quantity", "Status", "Amount", "Timestamp"]
 
-        table = ax.table(cellText=[header] + df.values.tolist(),
-                         colLabels=None, cellLoc='center', loc='top', colColours=['#f2f2f2'] * len(header),
-                         cellColours=[['#f2f2f2'] * len(header)] + [['#ffffff'] * len(header) for _ in range(len(df))])
+def _format_row(row):
+    timestamp = row.ts.astimezone(LOCAL_TZ).strftime('%d-%m-%y %H:%M') if row.ts is not None else row.timestamp
+    return (row.username, row.user_message, row.product, row.price, row.quantity, row.status, row.amount, timestamp)
+
+
+class PDFGenerator:
+    @staticmethod
+    def generate_pdf_report(user_id):
+        """Render the user's records into an in-memory PDF, or None if there are none.
 
-        table.auto_set_font_size(False)
-        table.set_fontsize(5)
-        table.scale(1, 1.5)
+        Rows are fetched from a server-side cursor in ``PDF_FETCH_SIZE`` batches.
+        """
+        query = select(
+            FinancialRecord.username, FinancialRecord.user_message, FinancialRecord.product,
+            FinancialRecord.price, FinancialRecord.quantity, FinancialRecord.status,
+            FinancialRecord.amount, FinancialRecord.timestamp, FinancialRecord.ts,
+        ).where(FinancialRecord.user_id == user_id).order_by(FinancialRecord.ts, FinancialRecord.message_id)
 
-        plt.savefig(pdf_filename, format='pdf', bbox_inches='tight')
+        with Session() as session:
+            result = session.execute(query.execution_options(yield_per=PDF_FETCH_SIZE))
+            rows = (_format_row(row) for partition in result.partitions() for row in partition)
+            first = next(rows, None)
+            if first is None:
+                return None
 
-        plt.close()
+            buffer = io.BytesIO()
+            render_pdf(itertools.chain([first], rows), buffer, title=f'Financial Report: user {user_id}')
 
-        session.close()
-        return pdf_filename
+        buffer.seek(0)
+        return buffer
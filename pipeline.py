@@ -0,0 +1,124 @@
+import collections
+import json
+import logging
+import os
+import typing
+
+from dotenv import load_dotenv
+
+from llm import get_llm
+from llm_cache import llm_cache
+from telemetry import register_stats, span
+
+load_dotenv()
+
+# single - один вызов LLM с function calling, agent - прежний ReAct-агент
+LLM_PIPELINE = os.getenv("LLM_PIPELINE", "single")
+
+logger = logging.getLogger(__name__)
+
+ANALYZE_FUNCTION = {
+    'name': 'record_transaction',
+    'description': 'Record the financial operation described by the user',
+    'parameters': {
+        'type': 'object',
+        'properties': {
+            'is_new': {
+                'type': 'boolean',
+                'description': 'true for a new operation, false for a clarification of the previous message',
+            },
+            'product': {'type': 'string', 'description': 'product or service, or the source of income'},
+            'quantity': {'type': 'integer', 'description': 'quantity, 1 if not mentioned'},
+            'price': {'type': 'integer', 'description': 'unit price, a number without currency; 2k and 2к mean 2000'},
+            'status': {'type': 'string', 'enum': ['Expenses', 'Income']},
+            'amount': {'type': 'integer', 'description': 'quantity multiplied by price'},
+        },
+        'required': ['is_new', 'product', 'quantity', 'price', 'status', 'amount'],
+    },
+}
+
+SYSTEM_PROMPT = (
+    'Ты финансовый помощник. Пользователь пишет о своих доходах и расходах, например: "Такси за 2000", '
+    '"Заказ на 5к", "Получил зарплату 800к", "Бабушка подарила 100$". Уточняющее сообщение меняет предыдущее: '
+    '"Не купил, а продал", "Не 15000 а 150000", "8 бутылок", "Это общая цена". '
+    'Вызови record_transaction: is_new=false, если сообщение уточняет предыдущее, иначе true. '
+    'Для уточнения верни итоговую запись с учётом предыдущего сообщения. '
+    'status - Expenses для трат и Income для доходов, amount = quantity * price.'
+)
+
+
+class Analysis(typing.NamedTuple):
+    is_new: bool
+    record: typing.Dict[str, typing.Any]
+
+
+def parse_analysis(arguments: str) -> Analysis | None:
+    """Validate the function call arguments; None means fall back to the agent."""
+    try:
+        data = json.loads(arguments)
+        record = {
+            'product': str(data['product']).strip(),
+            'quantity': int(data.get('quantity') or 1),
+            'price': int(float(data['price'])),
+            'status': data['status'],
+        }
+        record['amount'] = int(float(data.get('amount') or record['price'] * record['quantity']))
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not record['product'] or record['status'] not in ('Expenses', 'Income'):
+        return None
+    return Analysis(bool(data.get('is_new', True)), record)
+
+
+class MessageAnalyzer:
+    """Classification and extraction of a message in one function-calling request.
+
+    Replaces the Router classification call, the agent steps and the nested
+    ``create_record`` call. Answers are cached in ``llm_cache`` under ``analyze``.
+    """
+
+    def __init__(self):
+        self.stats = collections.Counter(dict.fromkeys(('calls', 'records', 'invalid', 'errors'), 0))
+
+    @staticmethod
+    def _user_prompt(text: str, previous_text: str | None) -> str:
+        if previous_text:
+            return f'Предыдущее сообщение: {previous_text}\nСообщение: {text}'
+        return f'Сообщение: {text}'
+
+    async def _call(self, prompt: str) -> str:
+        from langchain.schema import HumanMessage, SystemMessage
+
+        self.stats['calls'] += 1
+        message = await get_llm(temperature=0).apredict_messages(
+            [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=prompt)],
+            functions=[ANALYZE_FUNCTION],
+            function_call={'name': ANALYZE_FUNCTION['name']},
+        )
+        function_call = message.additional_kwargs.get('function_call')
+        if not function_call:
+            # обычный текст вместо вызова функции не кэшируем
+            raise ValueError(f'No function call in the answer: {message.content!r}')
+        return function_call['arguments']
+
+    async def analyze(self, text: str, previous_text: str | None = None) -> Analysis | None:
+        prompt = self._user_prompt(text, previous_text)
+        with span('llm.analyze', clarification=bool(previous_text)) as current:
+            try:
+                arguments = await llm_cache.cached('analyze', prompt, lambda: self._call(prompt))
+            except Exception as error:
+                self.stats['errors'] += 1
+                logger.warning('Message analysis failed: %r', error)
+                return None
+
+            analysis = parse_analysis(arguments)
+            self.stats['records' if analysis is not None else 'invalid'] += 1
+            current.set_attribute('valid', analysis is not None)
+            return analysis
+
+    def metrics(self) -> dict:
+        return dict(self.stats)
+
+
+message_analyzer = MessageAnalyzer()
+register_stats('analyzer', message_analyzer.metrics)
@@ -1,76 +1,263 @@
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from models import FinancialRecord, Session
-from sqlalchemy import extract, func
-from datetime import datetime, date
+from analytics import ANALYTICS_MONTHS, ANALYTICS_TOP, current_month, user_analytics
+from cache import etag_matches, report_cache
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from models import AsyncSession, FinancialRecord, MonthlySummary, init, month_range
+from sqlalchemy import func, select, tuple_
+from summaries import parse_month
+from datetime import datetime
+import base64
+import contextlib
+import json
+import uuid
 
-app = FastAPI()
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    init()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 templates = Jinja2Templates(directory="templates")
 
 
+def _cached_response(request, entry):
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+async def _cache_json(key, content):
+    response = JSONResponse(content=content)
+    return await report_cache.set(key, response.body, response.media_type)
+
+
 @app.get("/record/{user_id}", response_class=HTMLResponse)
 async def read_record_html(request: Request, user_id: int):
     return templates.TemplateResponse("report.html", {"request": request, "user_id": user_id})
 
 
+def _summary_query(query, user_id, start, end):
+    query = query.where(MonthlySummary.user_id == user_id)
+    try:
+        if start is not None:
+            query = query.where(MonthlySummary.month >= parse_month(start))
+        if end is not None:
+            query = query.where(MonthlySummary.month <= parse_month(end))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Месяц должен быть в формате 'YYYY-MM'")
+    return query
+
+
 @app.get("/api/record/sum/{user_id}", response_class=JSONResponse)
-async def get_records_sum(user_id: int):
-    with Session() as session:
-        query = session.query(
-            func.sum(FinancialRecord.amount).label("total_amount"),
-            FinancialRecord.status
-        ).filter_by(user_id=user_id).group_by(FinancialRecord.status).all()
+async def get_records_sum(
+    request: Request,
+    user_id: int,
+    start: str = Query(None, description="Первый месяц периода, 'YYYY-MM'"),
+    end: str = Query(None, description="Последний месяц периода включительно, 'YYYY-MM'"),
+):
+    query = _summary_query(
+        select(func.sum(MonthlySummary.total).label("total_amount"), MonthlySummary.status),
+        user_id, start, end,
+    ).group_by(MonthlySummary.status)
+
+    key = await report_cache.key(user_id, "sum", start, end)
+    entry = await report_cache.get(key)
+    if entry is None:
+        async with AsyncSession() as session:
+            query = (await session.execute(query)).all()
+
+        sums_by_status = {status: total_amount for total_amount, status in query}
+        entry = await _cache_json(key, sums_by_status)
+    return _cached_response(request, entry)
+
+
+@app.get("/api/summary/{user_id}", response_class=JSONResponse)
+async def get_monthly_summary(
+    request: Request,
+    user_id: int,
+    start: str = Query(None, description="Первый месяц периода, 'YYYY-MM'"),
+    end: str = Query(None, description="Последний месяц периода включительно, 'YYYY-MM'"),
+):
+    query = _summary_query(select(MonthlySummary), user_id, start, end).order_by(
+        MonthlySummary.month, MonthlySummary.status
+    )
+
+    key = await report_cache.key(user_id, "summary", start, end)
+    entry = await report_cache.get(key)
+    if entry is None:
+        async with AsyncSession() as session:
+            rows = (await session.scalars(query)).all()
+
+        entry = await _cache_json(key, [
+            {"month": row.month.strftime("%Y-%m"), "status": row.status, "total": row.total, "count": row.count}
+            for row in rows
+        ])
+    return _cached_response(request, entry)
+
+
+RECORD_FIELDS = ("username", "user_message", "product", "price", "quantity", "status", "amount", "timestamp")
+RECORD_COLUMNS = [getattr(FinancialRecord, field) for field in RECORD_FIELDS]
+STREAM_BATCH_SIZE = 1000
+
+
+def _encode_cursor(ts, message_id):
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{message_id}".encode()).decode()
 
-    sums_by_status = {status: total_amount for total_amount, status in query}
-    return JSONResponse(content=sums_by_status)
+
+def _decode_cursor(cursor):
+    try:
+        ts, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), uuid.UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
+def _record_json(row):
+    return json.dumps({field: row[field] for field in RECORD_FIELDS}, ensure_ascii=False)
+
+
+async def _stream_records(session, partitions, first_partition, ndjson):
+    """Serialize rows batch by batch as a JSON array or NDJSON while the cursor is read."""
+    separator = "\n" if ndjson else ","
+    try:
+        if not ndjson:
+            yield "["
+        yield separator.join(_record_json(row._mapping) for row in first_partition)
+        async for partition in partitions:
+            yield separator + separator.join(_record_json(row._mapping) for row in partition)
+        yield "\n" if ndjson else "]"
+    finally:
+        await session.close()
+
+
+async def _cache_stream(key, chunks, media_type):
+    """Pass the stream through and cache it once complete, unless it outgrew the cache limit."""
+    body = []
+    size = 0
+    async for chunk in chunks:
+        yield chunk
+        if body is None:
+            continue
+        chunk = chunk.encode()
+        size += len(chunk)
+        if size > report_cache.max_bytes:
+            body = None
+        else:
+            body.append(chunk)
+    if body is not None:
+        await report_cache.set(key, b"".join(body), media_type)
 
 
 @app.get("/api/record/{user_id}", response_class=JSONResponse)
 async def read_record_api(
+    request: Request,
     user_id: int,
     target_date: str = Query(None, description="Целевая дата в формате 'YYYY-MM'"),
     status: str = Query(None, description="Статус записей (Expenses, Income)"),
+    limit: int = Query(None, ge=1, le=1000, description="Размер страницы, без него отдаются все записи потоком"),
+    cursor: str = Query(None, description="next_cursor из предыдущей страницы"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json-массив или NDJSON"),
 ):
-    with Session() as session:
-        query = session.query(FinancialRecord).filter_by(user_id=user_id)
+    key = await report_cache.key(user_id, "records", target_date, status, limit, cursor, format)
+    entry = await report_cache.get(key)
+    if entry is not None:
+        return _cached_response(request, entry)
+
+    query = select(*RECORD_COLUMNS, FinancialRecord.ts, FinancialRecord.message_id).where(
+        FinancialRecord.user_id == user_id
+    )
+
+    if target_date is not None:
+        target_date = datetime.strptime(target_date, "%Y-%m")
+        start, end = month_range(target_date.year, target_date.month)
+
+        query = query.where(FinancialRecord.ts >= start, FinancialRecord.ts < end)
+
+    if status is not None:
+        query = query.where(FinancialRecord.status == status)
+
+    if cursor is not None:
+        query = query.where(tuple_(FinancialRecord.ts, FinancialRecord.message_id) > _decode_cursor(cursor))
 
-        if target_date is not None:
-            target_date = datetime.strptime(target_date, "%Y-%m")
-            target_date = date(target_date.year, target_date.month, 1)
+    query = query.order_by(FinancialRecord.ts, FinancialRecord.message_id)
 
-            query = query.filter(
-                extract('year', func.to_date(FinancialRecord.timestamp, 'DD-MM-YY HH24:MI')) == target_date.year,
-                extract('month', func.to_date(FinancialRecord.timestamp, 'DD-MM-YY HH24:MI')) == target_date.month
-            )
+    if limit is not None:
+        # без ts (не прошли бэкфилл migrations.py) строка не встаёт в порядок курсора: в страницы не попадает
+        query = query.where(FinancialRecord.ts.is_not(None))
+        async with AsyncSession() as session:
+            rows = (await session.execute(query.limit(limit + 1))).all()
 
-        if status is not None:
-            query = query.filter(FinancialRecord.status.in_([status]))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1].ts, rows[-1].message_id)
 
-        financial_records = query.all()
+        entry = await _cache_json(key, {
+            "records": [{field: row._mapping[field] for field in RECORD_FIELDS} for row in rows],
+            "next_cursor": next_cursor,
+        })
+        return _cached_response(request, entry)
 
-    if not financial_records:
+    session = AsyncSession()
+    result = await session.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+    partitions = result.partitions()
+    first_partition = await anext(partitions, None)
+
+    if not first_partition:
+        await session.close()
+        period = f" за {target_date.year}-{target_date.month}" if target_date is not None else ""
         raise HTTPException(
             status_code=404,
-            detail=f"Для пользователя {user_id} не найдено финансовых записей за {target_date.year}-{target_date.month}"
+            detail=f"Для пользователя {user_id} не найдено финансовых записей{period}"
         )
 
-    records_json = [
-        {
-            "username": record.username,
-            "user_message": record.user_message,
-            "product": record.product,
-            "price": record.price,
-            "quantity": record.quantity,
-            "status": record.status,
-            "amount": record.amount,
-            "timestamp": record.timestamp,
-        }
-        for record in financial_records
-    ]
-
-    return JSONResponse(content=records_json)
+    ndjson = format == "ndjson"
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+    return StreamingResponse(
+        _cache_stream(key, _stream_records(session, partitions, first_partition, ndjson), media_type),
+        media_type=media_type,
+    )
+
+
+@app.get("/api/analytics/{user_id}", response_class=JSONResponse)
+async def get_analytics(
+    request: Request,
+    user_id: int,
+    month: str = Query(None, description="Месяц отчёта, 'YYYY-MM', по умолчанию текущий"),
+    months: int = Query(ANALYTICS_MONTHS, ge=2, le=120, description="Длина помесячного ряда"),
+    top: int = Query(ANALYTICS_TOP, ge=1, le=100),
+):
+    """Monthly series with rolling means and month-over-month deltas, daily totals and top products."""
+    try:
+        target = parse_month(month) if month is not None else current_month()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Месяц должен быть в формате 'YYYY-MM'")
+
+    # в ключе явный месяц: «текущий» не должен пережить смену месяца в кэше
+    key = await report_cache.key(user_id, "analytics", target.strftime("%Y-%m"), months, top)
+    entry = await report_cache.get(key)
+    if entry is None:
+        async with AsyncSession() as session:
+            content = await user_analytics(session, user_id, target, months, top)
+        entry = await _cache_json(key, content)
+    return _cached_response(request, entry)
+
+
+@app.get("/api/cache/stats", response_class=JSONResponse)
+async def get_cache_stats():
+    return JSONResponse(content=report_cache.metrics())
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 
 if __name__ == "__main__":
     import uvicorn
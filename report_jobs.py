@@ -0,0 +1,115 @@
+import asyncio
+import collections
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from telemetry import span
+
+load_dotenv()
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 2))
+PDF_MAX_PENDING = int(os.getenv("PDF_MAX_PENDING", 50))
+
+QUEUED_TEXT = "Готовлю отчёт, пришлю его сюда, как только он будет готов."
+DUPLICATE_TEXT = "Отчёт уже готовится, пришлю его сюда."
+BUSY_TEXT = "Сейчас слишком много запросов на отчёты, попробуйте через пару минут."
+EMPTY_TEXT = "Unable to generate the report."
+FAILED_TEXT = "Не удалось сформировать отчёт, попробуйте позже."
+
+logger = logging.getLogger(__name__)
+
+
+def render_report(user_id):
+    """Runs in a worker process: the finished PDF as bytes, or None if the user has no records."""
+    # воркер стартует через spawn: reportlab и движок БД поднимаются только в нём
+    from models import init
+    from pdf_generator import PDFGenerator
+
+    init(create_schema=False)
+    buffer = PDFGenerator.generate_pdf_report(user_id)
+    return None if buffer is None else buffer.getvalue()
+
+
+class ReportJobQueue:
+    """Background /pdf jobs rendered in a process pool.
+
+    The handler only enqueues and answers right away; the document is sent when
+    the worker finishes. One job per user at a time (repeated /pdf while it is
+    running are folded into it), at most ``workers`` renders run in parallel and
+    at most ``max_pending`` jobs are accepted at once.
+    """
+
+    def __init__(self, bot, workers: int = PDF_WORKERS, max_pending: int = PDF_MAX_PENDING, render=render_report):
+        self.bot = bot
+        self.workers = workers
+        self.max_pending = max_pending
+        self.render = render
+        self._executor = None
+        self._jobs = {}
+        self.stats = collections.Counter(dict.fromkeys(
+            ('queued', 'deduplicated', 'rejected', 'sent', 'empty', 'failed'), 0
+        ))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn: воркеры не наследуют пулы соединений и event loop родителя
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def submit(self, message):
+        user_id = message.from_user.id
+        if user_id in self._jobs:
+            self.stats['deduplicated'] += 1
+            await self.bot.reply_to(message, DUPLICATE_TEXT)
+            return False
+        if len(self._jobs) >= self.max_pending:
+            self.stats['rejected'] += 1
+            await self.bot.reply_to(message, BUSY_TEXT)
+            return False
+
+        self.stats['queued'] += 1
+        self._jobs[user_id] = asyncio.create_task(self._run(message))
+        await self.bot.reply_to(message, QUEUED_TEXT)
+        return True
+
+    async def _run(self, message):
+        user_id = message.from_user.id
+        try:
+            with span('pdf.render', pending=len(self._jobs)):
+                pdf = await asyncio.get_running_loop().run_in_executor(self.executor, self.render, user_id)
+            if pdf is None:
+                self.stats['empty'] += 1
+                await self.bot.reply_to(message, EMPTY_TEXT)
+                return
+            await self.bot.send_document(
+                message.chat.id, io.BytesIO(pdf), caption="Financial Report",
+                visible_file_name=f"financial_report_user_{user_id}.pdf",
+            )
+            self.stats['sent'] += 1
+        except Exception as error:
+            self.stats['failed'] += 1
+            logger.exception('PDF report for user %s failed: %r', user_id, error)
+            await self.bot.reply_to(message, FAILED_TEXT)
+        finally:
+            self._jobs.pop(user_id, None)
+
+    def metrics(self) -> dict:
+        return {**self.stats, 'running': len(self._jobs)}
+
+    async def shutdown(self):
+        if self._jobs:
+            await asyncio.gather(*self._jobs.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
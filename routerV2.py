@@ -1,42 +1,92 @@
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
 from app_class import MessageProcessor
+from classifier import pre_classifier
+from llm import get_llm
+from llm_cache import llm_cache
+from pipeline import LLM_PIPELINE, message_analyzer
+from scheduler import chat_scheduler
+from sessions import SessionRegistry
+from state import ConversationState, StateStore
+from telemetry import instrument_redis, span, traced
 
-import redis
-import dill as pickle
+import redis.asyncio as redis
 
 load_dotenv()
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 REDIS_HOST = os.getenv("REDIS_HOST")
 
+logger = logging.getLogger(__name__)
+
+
+def _drop_processor(user_id, processor):
+    # вопрос без ответа больше никто не ждёт; ещё идущий прогон доработает, его вопрос истечёт в диспетчере
+    if processor.awaiting_approval:
+        processor.cancel()
+
 
 class Router:
-    redis_client = redis.StrictRedis(host=REDIS_HOST, port=6379, db=0)
+    redis_client = instrument_redis(redis.StrictRedis(host=REDIS_HOST, port=6379, db=0))
+    state_store = StateStore(redis_client)
+    processors = SessionRegistry(on_evict=_drop_processor)
 
     def __init__(self, bot, user_message):
         self.bot = bot
         self.user_message = user_message
         self.is_new = None
         self.old_message = None
+        self.analysis = None
 
     @staticmethod
-    def save_processor(user_id, processor):
-        processor_data = pickle.dumps(processor)
-        Router.redis_client.setex(user_id, 600, processor_data)
+    async def save_processor(user_id, processor):
+        Router.processors.put(user_id, processor)
+        await Router.state_store.save(ConversationState.from_processor(processor))
 
-    @staticmethod
-    def get_processor(user_id):
-        processor_data = Router.redis_client.get(user_id)
-        if processor_data:
-            processor = pickle.loads(processor_data)
+    async def get_processor(self, user_id):
+        processor = Router.processors.get(user_id)
+        if processor is not None:
             return processor
-        return None
+        # после рестарта живых объектов нет, восстанавливаем из сохранённого состояния
+        state = await Router.state_store.load(user_id)
+        if state is None:
+            return None
+        return MessageProcessor(self.bot, state.to_message())
+
+    @traced('router.classify')
+    async def classify(self):
+        if self.user_message.reply_to_message:
+            self.is_new = False
+            return self.is_new
+
+        text = self.user_message.text
+        decision = pre_classifier.classify(text)
+
+        if decision.is_new is None:
+            if LLM_PIPELINE == 'single':
+                # один вызов сразу отвечает и на "новое или уточнение", и на поля записи
+                previous = await self.get_processor(self.user_message.from_user.id)
+                self.analysis = await message_analyzer.analyze(text, previous.text if previous else None)
+                if self.analysis is not None:
+                    self.is_new = self.analysis.is_new
+                    pre_classifier.record_llm(text, self.is_new)
+                    return self.is_new
+            self.is_new = await self.classify_llm(text)
+            pre_classifier.record_llm(text, self.is_new)
+        else:
+            self.is_new = decision.is_new
+            if pre_classifier.should_shadow():
+                asyncio.create_task(self._shadow_check(text, decision))
 
-    async def process(self):
+        return self.is_new
+
+    async def _shadow_check(self, text, decision):
+        pre_classifier.record_llm(text, await self.classify_llm(text), decision)
+
+    @staticmethod
+    async def classify_llm(text):
+        from langchain.prompts import PromptTemplate
 
         template = PromptTemplate.from_template("""system" "Проанализируй сообщение и определи тип сообщения. Верни 
         (false), если сообщение уточняющее. Верни (true), если сообщение полноценное (новое).У тебя 
@@ -54,35 +104,28 @@ class Router:
         Получил а не потратил. Измени количество на 20. Это общая цена. Цена за единицу товара)."
         'user message - {user_message_text}'""")
 
-        if self.user_message.reply_to_message:
-            self.is_new = False
-        else:
+        prompt = template.format(user_message_text=text)
+        with span('llm.classify'):
+            result = await llm_cache.cached('classify', text, lambda: get_llm().apredict(prompt))
 
-            prompt = template.format(user_message_text=self.user_message.text)
-            llm = ChatOpenAI(
-                model_name="gpt-4-1106-preview",
-                openai_api_key=OPENAI_API_KEY,
-                temperature=0.8,
-                verbose=True
-            )
-            result = llm.predict(prompt)
-
-            if 'true' in result:
-                self.is_new = True
-            elif 'false' in result:
-                self.is_new = False
-            else:
-                self.is_new = True
+        if 'true' in result:
+            return True
+        elif 'false' in result:
+            return False
+        return True
+
+    @traced('router.process')
+    async def process(self):
+        await self.classify()
 
-        print(f'eto is_new {self.is_new}')
+        logger.debug('Message %s is_new=%s', self.user_message.message_id, self.is_new)
 
         user_id = self.user_message.from_user.id
 
         if self.is_new:
             processor = MessageProcessor(self.bot, self.user_message)
         else:
-            # processor = MessageProcessor.instances.get(user_id)
-            processor = Router.get_processor(user_id)
+            processor = await self.get_processor(user_id)
             if processor is None:
                 processor = MessageProcessor(self.bot, self.user_message)
             else:
@@ -94,6 +137,8 @@ class Router:
                     additional_user_message=self.user_message
                 )
 
-        # MessageProcessor.instances[user_id] = processor
-        Router.save_processor(user_id, processor)
-        asyncio.create_task(processor.process())
+        if self.analysis is not None:
+            processor.analyzed_record = self.analysis.record
+        await Router.save_processor(user_id, processor)
+        # уточнение отменяет ещё идущий прогон по старому тексту, новое сообщение ждёт своей очереди
+        chat_scheduler.schedule(user_id, processor.process, supersede=not self.is_new)
@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import contextvars
+import logging
+import os
+import typing
+
+from dotenv import load_dotenv
+
+from telemetry import register_stats
+
+load_dotenv()
+
+SCHEDULER_DEBOUNCE = float(os.getenv("SCHEDULER_DEBOUNCE", 0.3))
+
+logger = logging.getLogger(__name__)
+
+# прогон, внутри которого выполняется код; наследуется задачами, которые он порождает (колбэки langchain)
+_current_run = contextvars.ContextVar('chat_scheduler_run', default=None)
+
+
+class _Run(typing.NamedTuple):
+    task: asyncio.Task
+    released: asyncio.Event
+    predecessor: '_Run | None'
+
+
+class ChatScheduler:
+    """At most one automated processing run per chat.
+
+    ``schedule(..., supersede=True)`` (a clarification) cancels the chat's current
+    run; otherwise the new run waits for it. Every run starts after ``debounce``
+    seconds, so a burst of quick follow-ups collapses into the last one before any
+    LLM call is made. A run that reaches a point where it only waits for the user
+    (the Yes button) calls ``release`` and stops blocking the chat.
+    """
+
+    def __init__(self, debounce: float = SCHEDULER_DEBOUNCE):
+        self.debounce = debounce
+        self._runs = {}
+        self.stats = collections.Counter(dict.fromkeys(
+            ('scheduled', 'started', 'coalesced', 'superseded', 'completed', 'failed'), 0
+        ))
+
+    def __len__(self):
+        return len(self._runs)
+
+    def schedule(self, key, factory: typing.Callable[[], typing.Awaitable], supersede: bool = False) -> asyncio.Task:
+        previous = self._runs.get(key)
+        if supersede and previous is not None:
+            previous.task.cancel()
+            # отменённый прогон ещё не дождался своей очереди: новый ждёт того же, чего ждал он
+            if previous.predecessor is not None and not previous.predecessor.released.is_set():
+                previous = previous.predecessor
+        released = asyncio.Event()
+        task = asyncio.create_task(self._run(key, previous, factory, released))
+        self._runs[key] = _Run(task, released, previous)
+        self.stats['scheduled'] += 1
+        return task
+
+    def release(self, key):
+        """Let the next run of the chat start; called from inside the current run or a task it spawned."""
+        run = self._runs.get(key)
+        if run is not None and run.released is _current_run.get():
+            run.released.set()
+            del self._runs[key]
+
+    def cancel(self, key):
+        run = self._runs.pop(key, None)
+        if run is not None:
+            run.task.cancel()
+
+    def metrics(self) -> dict:
+        return {**self.stats, 'running': len(self._runs)}
+
+    async def _run(self, key, previous, factory, released):
+        started = False
+        try:
+            if previous is not None:
+                await previous.released.wait()
+            await asyncio.sleep(self.debounce)
+            started = True
+            self.stats['started'] += 1
+            # у задачи своя копия контекста: значение видно только этому прогону и его дочерним задачам
+            _current_run.set(released)
+            result = await factory()
+            self.stats['completed'] += 1
+            return result
+        except asyncio.CancelledError:
+            self.stats['superseded' if started else 'coalesced'] += 1
+            raise
+        except Exception as error:
+            self.stats['failed'] += 1
+            logger.exception('Processing for chat %s failed: %r', key, error)
+        finally:
+            released.set()
+            run = self._runs.get(key)
+            if run is not None and run.released is released:
+                del self._runs[key]
+
+
+chat_scheduler = ChatScheduler()
+register_stats('scheduler', chat_scheduler.metrics)
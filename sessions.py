@@ -0,0 +1,120 @@
+import collections
+import os
+import time
+import typing
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSION_MAXSIZE = int(os.getenv("SESSION_MAXSIZE", 10000))
+SESSION_TTL = int(os.getenv("SESSION_TTL", 600))
+
+
+class SessionRegistry:
+    """In-memory per-user sessions with an idle TTL and LRU eviction.
+
+    Every ``get``/``put`` refreshes the entry, so the dict order is both the LRU
+    order and the expiry order and expired entries are always at the front.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = SESSION_MAXSIZE,
+        ttl: float = SESSION_TTL,
+        on_evict: typing.Callable[[typing.Any, typing.Any], None] | None = None,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.clock = clock
+        self._items = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _evict(self, key):
+        _, value = self._items.pop(key)
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def _evict_expired(self, now):
+        while self._items:
+            key, (expires_at, _) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            self._evict(key)
+
+    def get(self, key, default=None):
+        now = self.clock()
+        self._evict_expired(now)
+        item = self._items.get(key)
+        if item is None:
+            return default
+        self._items[key] = (now + self.ttl, item[1])
+        self._items.move_to_end(key)
+        return item[1]
+
+    def put(self, key, value):
+        """Store ``value``; a different value already stored under ``key`` is evicted."""
+        now = self.clock()
+        self._evict_expired(now)
+        previous = self._items.get(key)
+        self._items[key] = (now + self.ttl, value)
+        self._items.move_to_end(key)
+        if previous is not None and previous[1] is not value and self.on_evict is not None:
+            self.on_evict(key, previous[1])
+        while len(self._items) > self.maxsize:
+            self._evict(next(iter(self._items)))
+
+    def pop(self, key, default=None):
+        item = self._items.pop(key, None)
+        return default if item is None else item[1]
+
+
+class CallbackDispatcher:
+    """Routes callback queries to the processor that sent the buttons.
+
+    A single ``callback_query_handler`` is registered on the bot; lookups are a dict
+    access by ``(chat id, message id)`` of the question message. Unanswered questions
+    expire like sessions (``SESSION_TTL``, ``SESSION_MAXSIZE``) and their ``on_expire``
+    is called, so the code waiting for the answer can give up.
+    """
+
+    def __init__(self, maxsize: int = SESSION_MAXSIZE, ttl: float = SESSION_TTL):
+        self._handlers = SessionRegistry(maxsize=maxsize, ttl=ttl, on_evict=self._expired)
+
+    def __len__(self):
+        return len(self._handlers)
+
+    @staticmethod
+    def _key(message):
+        return message.chat.id, message.id
+
+    @staticmethod
+    def _expired(key, entry):
+        _, on_expire = entry
+        if on_expire is not None:
+            on_expire()
+
+    def register(self, message, handler: typing.Callable[[typing.Any], typing.Awaitable],
+                 on_expire: typing.Callable[[], typing.Any] | None = None):
+        self._handlers.put(self._key(message), (handler, on_expire))
+
+    def unregister(self, message):
+        if message is not None:
+            self._handlers.pop(self._key(message))
+
+    async def dispatch(self, call) -> bool:
+        entry = self._handlers.get(self._key(call.message))
+        if entry is None:
+            return False
+        await entry[0](call)
+        return True
+
+
+callback_dispatcher = CallbackDispatcher()
@@ -0,0 +1,104 @@
+import dataclasses
+import json
+import os
+import time
+import typing
+
+import telebot.types
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_VERSION = 1
+STATE_TTL = int(os.getenv("STATE_TTL", 600))
+
+
+@dataclasses.dataclass
+class ConversationState:
+    """What has to survive between a message and its clarification, and nothing else.
+
+    Stored as a flat Redis hash; nested values are JSON encoded.
+    """
+
+    chat_id: int
+    user_id: int
+    username: str | None
+    text: str
+    message_ids: typing.List[int]
+    record: typing.Any = None
+    updated_at: float = dataclasses.field(default_factory=time.time)
+    version: int = STATE_VERSION
+
+    @classmethod
+    def from_processor(cls, processor) -> 'ConversationState':
+        message = processor.full_message
+        message_ids = [message.message_id]
+        if processor.additional_user_message is not None:
+            message_ids.append(processor.additional_user_message.message_id)
+        return cls(
+            chat_id=message.chat.id,
+            user_id=message.from_user.id,
+            username=message.from_user.username,
+            text=message.text,
+            message_ids=message_ids,
+            record=processor.record or None,
+        )
+
+    def to_mapping(self) -> typing.Dict[str, str]:
+        mapping = dataclasses.asdict(self)
+        mapping['message_ids'] = json.dumps(self.message_ids)
+        mapping['record'] = json.dumps(self.record, ensure_ascii=False)
+        mapping['username'] = self.username or ''
+        return {key: str(value) for key, value in mapping.items()}
+
+    @classmethod
+    def from_mapping(cls, mapping: typing.Mapping) -> 'ConversationState | None':
+        mapping = {
+            (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+            for key, value in mapping.items()
+        }
+        if not mapping or int(mapping.get('version', 0)) != STATE_VERSION:
+            return None
+        return cls(
+            chat_id=int(mapping['chat_id']),
+            user_id=int(mapping['user_id']),
+            username=mapping['username'] or None,
+            text=mapping['text'],
+            message_ids=json.loads(mapping['message_ids']),
+            record=json.loads(mapping['record']),
+            updated_at=float(mapping['updated_at']),
+        )
+
+    def to_message(self) -> telebot.types.Message:
+        """Rebuild the original message so a processor can be restored after a restart."""
+        return telebot.types.Message.de_json({
+            'message_id': self.message_ids[0],
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': '', 'username': self.username},
+            'chat': {'id': self.chat_id, 'type': 'private'},
+            'date': int(self.updated_at),
+            'text': self.text,
+        })
+
+
+class StateStore:
+    def __init__(self, client, ttl: int = STATE_TTL, prefix: str = 'conversation:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def key(self, user_id) -> str:
+        return f'{self.prefix}{user_id}'
+
+    async def save(self, state: ConversationState):
+        key = self.key(state.user_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=state.to_mapping())
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def load(self, user_id) -> ConversationState | None:
+        return ConversationState.from_mapping(await self.client.hgetall(self.key(user_id)))
+
+    async def delete(self, user_id):
+        await self.client.delete(self.key(user_id))
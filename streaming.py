@@ -0,0 +1,119 @@
+import asyncio
+import collections
+import json
+import os
+import re
+import typing
+
+from dotenv import load_dotenv
+from telebot.asyncio_helper import ApiTelegramException
+
+from telemetry import register_stats
+
+load_dotenv()
+
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() in ("1", "true", "yes")
+# Telegram позволяет примерно одно редактирование сообщения в секунду на чат
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+STREAM_PLACEHOLDER = '⏳ Обрабатываю сообщение…'
+TELEGRAM_TEXT_LIMIT = 4096
+
+stream_stats = collections.Counter(dict.fromkeys(('messages', 'edits', 'coalesced', 'rate_limited', 'fallbacks'), 0))
+register_stats('streaming', lambda: stream_stats)
+
+# начало ответа агента в JSON-блоке: {"action": "Final Answer", "action_input": "...
+FINAL_ANSWER = re.compile(r'"action"\s*:\s*"Final Answer"\s*,\s*"action_input"\s*:\s*"((?:[^"\\]|\\.)*)', re.DOTALL)
+
+
+class MessageStream:
+    """A bot message that is sent at once and then edited in place.
+
+    ``update`` only remembers the latest text; intermediate edits go out at most
+    once per ``interval`` seconds, so a burst of tokens becomes one edit. A 429
+    from Telegram pauses the stream for ``retry_after`` seconds.
+    """
+
+    def __init__(self, bot, chat_id, reply_to_message_id=None, interval: float = STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.reply_to_message_id = reply_to_message_id
+        self.interval = interval
+        self.message = None
+        self.closed = False
+        self._text = None
+        self._shown = None
+        self._last_edit = 0.0
+        self._flush = None
+
+    async def start(self, text: str = STREAM_PLACEHOLDER) -> 'MessageStream':
+        self.message = await self.bot.send_message(
+            self.chat_id, text, reply_to_message_id=self.reply_to_message_id
+        )
+        self._shown = text
+        self._last_edit = asyncio.get_running_loop().time()
+        stream_stats['messages'] += 1
+        return self
+
+    def update(self, text: str):
+        if self.closed or self.message is None:
+            return
+        self._text = text[:TELEGRAM_TEXT_LIMIT]
+        if self._flush is None or self._flush.done():
+            self._flush = asyncio.create_task(self._flush_later())
+        else:
+            stream_stats['coalesced'] += 1
+
+    async def finish(self, text: str):
+        """Show the final text and stop updating.
+
+        The final edit is not delayed by the interval: it is one edit per stream,
+        and a 429 is still honoured. If the edit keeps failing, the text is sent
+        as a new message so it is not lost.
+        """
+        self.closed = True
+        if self._flush is not None:
+            self._flush.cancel()
+        if self.message is not None and await self._edit(text[:TELEGRAM_TEXT_LIMIT]):
+            return
+        if self.message is not None:
+            stream_stats['fallbacks'] += 1
+        await self.bot.send_message(self.chat_id, text, reply_to_message_id=self.reply_to_message_id)
+
+    async def _flush_later(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, self._last_edit + self.interval - loop.time()))
+        await self._edit(self._text)
+
+    async def _edit(self, text: str) -> bool:
+        """Edit the message; False if Telegram kept answering 429 and the text was not shown."""
+        if text == self._shown:
+            return True
+        for _ in range(2):
+            try:
+                await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message.message_id)
+            except ApiTelegramException as error:
+                if error.error_code == 429:
+                    stream_stats['rate_limited'] += 1
+                    await asyncio.sleep(error.result_json.get('parameters', {}).get('retry_after', self.interval))
+                    continue
+                if 'message is not modified' not in error.description:
+                    raise
+            break
+        else:
+            return False
+        self._shown = text
+        self._last_edit = asyncio.get_running_loop().time()
+        stream_stats['edits'] += 1
+        return True
+
+
+def final_answer_text(output: str) -> str | None:
+    """The part of a streamed agent answer the user should see, if it has started."""
+    match = FINAL_ANSWER.search(output)
+    if match is None:
+        return None
+    text = match.group(1).rstrip('\\')
+    try:
+        return json.loads(f'"{text}"')
+    except ValueError:
+        return text
@@ -0,0 +1,131 @@
+import argparse
+import collections
+import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import FinancialRecord, MonthlySummary, init, month_start
+
+UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def summary_deltas(rows):
+    """Aggregate inserted record values into per (user, month, status) increments."""
+    deltas = collections.defaultdict(lambda: [0, 0])
+    for row in rows:
+        ts = row.get('ts')
+        if ts is None or row.get('user_id') is None or row.get('status') is None:
+            continue
+        delta = deltas[(row['user_id'], month_start(ts), row.get('status'))]
+        delta[0] += row.get('amount') or 0
+        delta[1] += 1
+    return [
+        {'user_id': user_id, 'month': month, 'status': status, 'total': total, 'count': count}
+        for (user_id, month, status), (total, count) in deltas.items()
+    ]
+
+
+def upsert_summaries(dialect_name, rows):
+    """``INSERT .. ON CONFLICT DO UPDATE`` adding the rows to their summaries, or None if nothing to add.
+
+    Executed in the same transaction as the record INSERT, so the summary never
+    drifts from the records it was built from.
+    """
+    deltas = summary_deltas(rows)
+    if not deltas:
+        return None
+    stmt = UPSERT_DIALECTS[dialect_name](MonthlySummary).values(deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=[MonthlySummary.user_id, MonthlySummary.month, MonthlySummary.status],
+        set_={
+            'total': MonthlySummary.total + stmt.excluded.total,
+            'count': MonthlySummary.count + stmt.excluded.count,
+        },
+    )
+
+
+def parse_month(value):
+    """'YYYY-MM' -> first day of that month."""
+    return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+def compute_summaries(conn, user_id=None, batch_size=10000):
+    """Recompute summaries from ``financial_records``, streaming the table in batches.
+
+    Rows without ``ts`` (not backfilled yet) or without ``status`` (legacy rows; it is
+    part of the summary key) are not bucketed.
+    """
+    query = select(
+        FinancialRecord.user_id, FinancialRecord.ts, FinancialRecord.status, FinancialRecord.amount
+    ).where(FinancialRecord.ts.is_not(None), FinancialRecord.status.is_not(None))
+    if user_id is not None:
+        query = query.where(FinancialRecord.user_id == user_id)
+
+    totals = collections.defaultdict(lambda: [0, 0])
+    result = conn.execution_options(yield_per=batch_size).execute(query)
+    for partition in result.partitions():
+        for row in partition:
+            if row.user_id is None:
+                continue
+            total = totals[(row.user_id, month_start(row.ts), row.status)]
+            total[0] += row.amount or 0
+            total[1] += 1
+    return totals
+
+
+def _summary_query(user_id):
+    query = select(MonthlySummary)
+    if user_id is not None:
+        query = query.where(MonthlySummary.user_id == user_id)
+    return query
+
+
+def rebuild(user_id=None):
+    with init().begin() as conn:
+        totals = compute_summaries(conn, user_id)
+        stmt = delete(MonthlySummary)
+        if user_id is not None:
+            stmt = stmt.where(MonthlySummary.user_id == user_id)
+        conn.execute(stmt)
+        if totals:
+            conn.execute(MonthlySummary.__table__.insert(), [
+                {'user_id': user, 'month': month, 'status': status, 'total': total, 'count': count}
+                for (user, month, status), (total, count) in totals.items()
+            ])
+    print(f'rebuild: {len(totals)} summaries written')
+    return len(totals)
+
+
+def reconcile(user_id=None):
+    """Compare stored summaries with the records and print every mismatch."""
+    with init().connect() as conn:
+        expected = compute_summaries(conn, user_id)
+        stored = {
+            (row.user_id, row.month, row.status): [row.total, row.count]
+            for row in conn.execute(_summary_query(user_id))
+        }
+
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        if expected.get(key) != stored.get(key):
+            mismatches.append(key)
+            print(f'reconcile: {key} records={expected.get(key)} summary={stored.get(key)}')
+    print(f'reconcile: {len(expected)} summaries checked, {len(mismatches)} mismatched')
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance of the monthly_summaries table')
+    parser.add_argument('command', choices=('rebuild', 'reconcile'))
+    parser.add_argument('--user-id', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        rebuild(args.user_id)
+    elif reconcile(args.user_id):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import typing
+
+from dotenv import load_dotenv
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Завершённые спаны в формате OpenTelemetry JSON, по одному на строку
+TELEMETRY_TRACE_PATH = os.getenv("TELEMETRY_TRACE_PATH")
+# Отдельный порт /metrics для режима long polling, где нет FastAPI
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+SPAN_SECONDS = Histogram('jeeves_span_seconds', 'Duration of instrumented operations', ['name'],
+                         buckets=LATENCY_BUCKETS)
+SPAN_ERRORS = Counter('jeeves_span_errors_total', 'Instrumented operations that raised', ['name'])
+LLM_TOKENS = Counter('jeeves_llm_tokens_total', 'Tokens reported by the OpenAI API', ['model', 'kind'])
+DB_QUERY_SECONDS = Histogram('jeeves_db_query_seconds', 'Database statement latency', ['operation'],
+                             buckets=LATENCY_BUCKETS)
+REDIS_COMMAND_SECONDS = Histogram('jeeves_redis_command_seconds', 'Redis command latency', ['command'],
+                                  buckets=LATENCY_BUCKETS)
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'status')
+
+    def __init__(self, name: str, parent: 'Span | None', attributes: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'UNSET'
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_json(self) -> str:
+        # поля как у ConsoleSpanExporter из opentelemetry-sdk
+        return json.dumps({
+            'name': self.name,
+            'context': {'trace_id': f'0x{self.trace_id}', 'span_id': f'0x{self.span_id}'},
+            'parent_id': f'0x{self.parent_id}' if self.parent_id else None,
+            'start_time': self.start_ns,
+            'end_time': self.end_ns,
+            'status': {'status_code': self.status},
+            'attributes': self.attributes,
+        }, ensure_ascii=False, default=str)
+
+
+class FileSpanExporter:
+    """Appends finished spans to a JSON lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        line = span.to_json() + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line)
+
+
+span_exporter = FileSpanExporter(TELEMETRY_TRACE_PATH) if TELEMETRY_TRACE_PATH else None
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> typing.Iterator[Span]:
+    """Time a block: a Prometheus histogram sample, a span in the trace file and,
+    when opentelemetry is installed, a span for its configured exporter.
+
+    Spans nest through a context variable, so tasks created inside a span (the
+    scheduled processing of a message) continue its trace.
+    """
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    otel_span = (otel_trace.get_tracer(__name__).start_as_current_span(name, attributes=attributes)
+                 if otel_trace is not None else contextlib.nullcontext())
+    try:
+        with otel_span:
+            yield current
+        current.status = 'OK'
+    except BaseException as error:
+        current.status = 'ERROR'
+        current.attributes['error'] = type(error).__name__
+        SPAN_ERRORS.labels(name).inc()
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        SPAN_SECONDS.labels(name).observe(current.seconds)
+        if span_exporter is not None:
+            span_exporter.export(current)
+
+
+def traced(name: str):
+    """Decorator form of ``span`` for coroutine functions."""
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def record_llm_usage(model: str, usage: typing.Mapping[str, int] | None):
+    """Token counts from ``llm_output['token_usage']``; streamed answers carry none."""
+    if not usage:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        if usage.get(kind):
+            LLM_TOKENS.labels(model, kind.removesuffix('_tokens')).inc(usage[kind])
+    active = current_span()
+    if active is not None:
+        active.attributes.update({f'llm.{kind}': value for kind, value in usage.items()})
+
+
+def instrument_engine(engine):
+    """Statement latency of a sync engine (for an AsyncEngine pass ``engine.sync_engine``)."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'UNKNOWN'
+        DB_QUERY_SECONDS.labels(operation).observe(time.perf_counter() - started)
+
+    return engine
+
+
+def instrument_redis(client):
+    """Command latency of a ``redis.asyncio`` client, pipelines as one ``pipeline`` sample."""
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        started = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_SECONDS.labels(str(args[0]).lower()).observe(time.perf_counter() - started)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def timed_execute(*execute_args, **execute_kwargs):
+            started = time.perf_counter()
+            try:
+                return await execute(*execute_args, **execute_kwargs)
+            finally:
+                REDIS_COMMAND_SECONDS.labels('pipeline').observe(time.perf_counter() - started)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    return client
+
+
+class StatsCollector:
+    """Exposes the ``metrics()`` dicts of the bot components as Prometheus gauges."""
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, name: str, metrics: typing.Callable[[], typing.Mapping[str, typing.Any]]):
+        self._sources[name] = metrics
+
+    def collect(self):
+        for name, metrics in list(self._sources.items()):
+            try:
+                values = metrics()
+            except Exception:
+                logger.exception('Collecting %s metrics failed', name)
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f'jeeves_{name}_{key}', f'{name} {key}', value=value)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(name: str, metrics: typing.Callable[[], typing.Mapping[str, typing.Any]]):
+    stats_collector.register(name, metrics)
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    if port:
+        start_http_server(port)
+        logger.info('Prometheus metrics on :%s/metrics', port)
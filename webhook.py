@@ -0,0 +1,193 @@
+import asyncio
+import collections
+import contextlib
+import logging
+import os
+import time
+
+import telebot.types
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app import bot, report_jobs
+from llm import configure_http_pool, llm_gate, open_async_http_pool, preload_langchain
+from models import init
+from telemetry import configure_logging, register_stats, span
+from write_queue import record_write_queue
+
+load_dotenv()
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 32))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", 1000))
+# Сколько запросов может ждать свободного слота LLM, прежде чем мы начнём отвечать 429
+WEBHOOK_LLM_BACKLOG = int(os.getenv("WEBHOOK_LLM_BACKLOG", 64))
+WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", 5))
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLanes:
+    """Bounded per-chat FIFO lanes served by a fixed number of workers.
+
+    A chat is handed to at most one worker at a time, so its updates are handled
+    strictly in arrival order (a clarification waits until the original message
+    has been classified and saved) while different chats run in parallel.
+    ``offer`` refuses new work once ``max_pending`` updates are queued.
+    """
+
+    def __init__(self, handler, workers: int = WEBHOOK_WORKERS, max_pending: int = WEBHOOK_MAX_PENDING):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lanes = {}
+        self._ready = None
+        self._tasks = []
+        self._idle = None
+        self.stats = collections.Counter(dict.fromkeys(
+            ('accepted', 'rejected', 'llm_busy', 'handled', 'failed'), 0
+        ))
+        self.max_wait_seconds = 0.0
+
+    def start(self):
+        if not self._tasks:
+            self._ready = asyncio.Queue()
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Finish everything already accepted, then stop the workers."""
+        if not self._tasks:
+            return
+        await self._idle.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def offer(self, chat_id, item) -> bool:
+        if self.pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            return False
+        self.pending += 1
+        self.stats['accepted'] += 1
+        self._idle.clear()
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            self._lanes[chat_id] = collections.deque([(time.perf_counter(), item)])
+            self._ready.put_nowait(chat_id)
+        else:
+            lane.append((time.perf_counter(), item))
+        return True
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            lane = self._lanes[chat_id]
+            while lane:
+                queued_at, item = lane.popleft()
+                waited = time.perf_counter() - queued_at
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                try:
+                    with span('webhook.update', chat_id=chat_id, lane_wait_seconds=waited):
+                        await self.handler(item)
+                    self.stats['handled'] += 1
+                except Exception as error:
+                    self.stats['failed'] += 1
+                    logger.exception('Update for chat %s failed: %r', chat_id, error)
+                finally:
+                    self.pending -= 1
+            del self._lanes[chat_id]
+            if not self.pending:
+                self._idle.set()
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            'pending': self.pending,
+            'chats': len(self._lanes),
+            'max_wait_seconds': self.max_wait_seconds,
+            'llm_active': llm_gate.active,
+            'llm_waiting': llm_gate.waiting,
+        }
+
+
+async def handle_update(update):
+    await bot.process_new_updates([update])
+
+
+lanes = ChatLanes(handle_update)
+register_stats('webhook', lanes.metrics)
+_background = set()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    configure_logging()
+    init()
+    configure_http_pool()
+    http_pool = await open_async_http_pool()
+    record_write_queue.start()
+    lanes.start()
+    asyncio.get_running_loop().run_in_executor(None, preload_langchain)
+    if WEBHOOK_URL:
+        await bot.set_webhook(url=WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+    try:
+        yield
+    finally:
+        await lanes.stop()
+        await report_jobs.shutdown()
+        await record_write_queue.stop()
+        await http_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _busy():
+    return Response(status_code=429, headers={"Retry-After": str(WEBHOOK_RETRY_AFTER)})
+
+
+@app.post(WEBHOOK_PATH)
+async def receive_update(request: Request):
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return Response(status_code=403)
+
+    update = telebot.types.Update.de_json(await request.json())
+    message = update.message or update.edited_message
+    if message is None:
+        # нажатия кнопок и прочее не ждут в очереди: они разблокируют уже идущую обработку
+        task = asyncio.create_task(bot.process_new_updates([update]))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+        return Response(status_code=200)
+
+    # Telegram повторит доставку после 429, так что при перегрузке LLM просто не берём новую работу
+    if llm_gate.waiting >= WEBHOOK_LLM_BACKLOG:
+        lanes.stats['llm_busy'] += 1
+        return _busy()
+    if not lanes.offer(message.chat.id, update):
+        return _busy()
+    return Response(status_code=200)
+
+
+@app.get("/telegram/metrics")
+async def webhook_metrics():
+    return lanes.metrics()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
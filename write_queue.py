@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import insert
+
+from cache import report_cache
+from models import AsyncSession, FinancialRecord, utcnow
+from summaries import upsert_summaries
+from telemetry import register_stats, span
+
+load_dotenv()
+
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", 200))
+WRITE_QUEUE_FLUSH_INTERVAL = float(os.getenv("WRITE_QUEUE_FLUSH_INTERVAL", 0.05))
+WRITE_QUEUE_MAXSIZE = int(os.getenv("WRITE_QUEUE_MAXSIZE", 10000))
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class RecordWriteQueue:
+    """Write-behind queue for confirmed financial records.
+
+    ``submit`` returns once the record is committed, so the Telegram reply still
+    confirms a durable write. Records arriving together are flushed as one multi-row
+    INSERT in one transaction when ``batch_size`` is reached or ``flush_interval``
+    passes; the monthly summaries are updated in the same transaction and the
+    cached reports of the affected users are invalidated after the commit.
+    ``stop`` flushes everything still queued.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSession,
+        batch_size: int = WRITE_QUEUE_BATCH_SIZE,
+        flush_interval: float = WRITE_QUEUE_FLUSH_INTERVAL,
+        maxsize: int = WRITE_QUEUE_MAXSIZE,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.maxsize = maxsize
+        self._queue = None
+        self._worker = None
+        self._closed = False
+        self.stats = {
+            'flushes': 0,
+            'records': 0,
+            'failed': 0,
+            'last_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0,
+            'total_flush_seconds': 0.0,
+        }
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._worker is None:
+            self._closed = False
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._closed = True
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+    async def submit(self, values: dict):
+        if self._closed:
+            raise RuntimeError('Record write queue is stopped')
+        self.start()
+        # ts нужен до INSERT, чтобы знать месяц сводки
+        values.setdefault('ts', utcnow())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((values, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _insert(self, rows):
+        with span('db.insert_records', rows=len(rows)):
+            async with self.session_factory() as session:
+                await session.execute(insert(FinancialRecord), rows)
+                summaries = upsert_summaries(session.bind.dialect.name, rows)
+                if summaries is not None:
+                    await session.execute(summaries)
+                await session.commit()
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        written = []
+        try:
+            await self._insert([values for values, _ in batch])
+            written = batch
+        except Exception:
+            # одна плохая запись не должна ронять всю пачку: пишем по одной
+            for values, future in batch:
+                try:
+                    await self._insert([values])
+                except Exception as error:
+                    self.stats['failed'] += 1
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    written.append((values, future))
+        # сброс кэша вне повтора: повтор после успешного commit записал бы строки второй раз
+        try:
+            await report_cache.invalidate(*{values['user_id'] for values, _ in written})
+        except Exception:
+            logger.exception('Report cache invalidation failed')
+        for _, future in written:
+            if not future.done():
+                future.set_result(None)
+
+        elapsed = time.perf_counter() - started
+        self.stats['flushes'] += 1
+        self.stats['records'] += len(batch)
+        self.stats['last_flush_seconds'] = elapsed
+        self.stats['max_flush_seconds'] = max(self.stats['max_flush_seconds'], elapsed)
+        self.stats['total_flush_seconds'] += elapsed
+
+    def metrics(self) -> dict:
+        flushes = self.stats['flushes']
+        return {
+            **self.stats,
+            'depth': self.depth,
+            'avg_flush_seconds': self.stats['total_flush_seconds'] / flushes if flushes else 0.0,
+            'avg_batch_size': self.stats['records'] / flushes if flushes else 0.0,
+        }
+
+
+record_write_queue = RecordWriteQueue()
+register_stats('write_queue', record_write_queue.metrics)